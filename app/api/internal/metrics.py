@@ -0,0 +1,13 @@
+from fastapi import APIRouter, status, Depends
+from fastapi.responses import PlainTextResponse
+from app.database.db import Database
+from app.dependencies import get_db
+from app.utils.hashing_executor import get_hashing_executor
+from app.utils.metrics import METRICS
+
+router = APIRouter(prefix="/metrics", tags=['Internal'])
+
+@router.get("", status_code = status.HTTP_200_OK, response_class = PlainTextResponse)
+async def metrics_get(db: Database = Depends(get_db)):
+
+    return PlainTextResponse(METRICS.render(db.get_pool_stats(), get_hashing_executor().get_stats()), media_type = "text/plain; version=0.0.4") # Prometheus text format
@@ -0,0 +1,15 @@
+from fastapi import APIRouter, status, Depends
+from app.database.db import Database
+from app.dependencies import get_db
+
+router = APIRouter(prefix="/pool", tags=['Internal'])
+
+@router.get("/stats", status_code = status.HTTP_200_OK)
+async def pool_stats_get(db: Database = Depends(get_db)):
+
+    return db.get_pool_stats()
+
+@router.post("/stats/reset", status_code = status.HTTP_200_OK)
+async def pool_stats_reset(db: Database = Depends(get_db)):
+
+    return db.get_pool_stats(reset = True) # the statistics of the measurement window that ends; the counters then start a new one
@@ -1,11 +1,25 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 from app.api.v1 import appts, login, services, users
+from app.core.config import CONFIG
+from app.dependencies import verify_internal_token
 
-router = APIRouter()
+def create_router() -> APIRouter:
+    """
+    Builds the router of the API; called when the app is built (see app/main.py), so the config is read then rather than on import.
+    """
+    router = APIRouter()
 
-router.include_router(appts.router, prefix = '/v1')
-router.include_router(login.router, prefix = '/v1')
-router.include_router(services.router, prefix = '/v1')
-router.include_router(users.router, prefix = '/v1')
+    router.include_router(appts.router, prefix = '/v1')
+    router.include_router(login.router, prefix = '/v1')
+    router.include_router(services.router, prefix = '/v1')
+    router.include_router(users.router, prefix = '/v1')
 
-# do need to need to invalidate old api version ... e.g. with /v1, when /v2 routes are introduced, the above lines will remain
\ No newline at end of file
+    # do need to need to invalidate old api version ... e.g. with /v1, when /v2 routes are introduced, the above lines will remain
+
+    # for operators (e.g. sizing the connection pool, scraping metrics), not clients: left out of the docs, and only served when INTERNAL_API_TOKEN is set, which requests to them must send
+    if CONFIG.INTERNAL_API_ENABLED and CONFIG.INTERNAL_API_TOKEN:
+        from app.api.internal import metrics, pool # only imported when served
+        router.include_router(pool.router, prefix = '/internal', dependencies = [Depends(verify_internal_token)], include_in_schema = False)
+        if CONFIG.METRICS_ENABLED:
+            router.include_router(metrics.router, prefix = '/internal', dependencies = [Depends(verify_internal_token)], include_in_schema = False)
+    return router
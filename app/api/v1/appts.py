@@ -1,21 +1,51 @@
-from fastapi import APIRouter, status, Depends, HTTPException
+from fastapi import APIRouter, status, Depends, HTTPException, Header
 from app.schemas import oauth2 as schemas_oauth2
 from app.database.db import Database
 from app.core.oauth2 import get_current_user
 from app.schemas import appts as schemas_appts
-from app.services.appts import service_appt_create
+from app.services.appts import service_appt_create, service_appt_batch_create, service_appts_get_page
 from app.dependencies import get_db
+from app.utils.idempotency import get_idempotency_store, get_request_hash
+from app.utils.responses import FastJSONResponse, rows_response
+import datetime
 
 router = APIRouter(prefix="/appts", tags=['Appointments'])
 
 @router.post("", status_code = status.HTTP_201_CREATED, response_model = schemas_appts.ApptCreateResponse)
-async def appt_create(appt: schemas_appts.ApptCreateRequest, db: Database = Depends(get_db), payload: schemas_oauth2.TokenPayload = Depends(get_current_user)):
+async def appt_create(appt: schemas_appts.ApptCreateRequest, db: Database = Depends(get_db), payload: schemas_oauth2.TokenPayload = Depends(get_current_user), idempotency_key: str | None = Header(default = None, max_length = 255)):
       
     user_id = int(payload.user_id)
     
     if user_id is None:
         raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = "Something went wrong")  # this shouldn't happen though
     
-    created_appt = await service_appt_create(appt, db, user_id)
-    
-    return schemas_appts.ApptCreateResponse(**created_appt) # if Pydantic model is not followed, this throws error
\ No newline at end of file
+    async def create_appt():
+        created_appt = await service_appt_create(appt, db, user_id)
+        return FastJSONResponse(schemas_appts.ApptCreateResponse(**created_appt), status_code = status.HTTP_201_CREATED) # if Pydantic model is not followed, this throws error
+
+    return await get_idempotency_store().run(db, user_id, idempotency_key, "POST /appts", get_request_hash(appt), create_appt) # a retry with the same Idempotency-Key gets the response of the first request
+
+@router.post("/batch", status_code = status.HTTP_207_MULTI_STATUS, response_model = schemas_appts.ApptBatchCreateResponse)
+async def appt_batch_create(batch: schemas_appts.ApptBatchCreateRequest, db: Database = Depends(get_db), payload: schemas_oauth2.TokenPayload = Depends(get_current_user)):
+
+    user_id = int(payload.user_id)
+
+    if user_id is None:
+        raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = "Something went wrong")  # this shouldn't happen though
+
+    return FastJSONResponse(await service_appt_batch_create(batch, db, user_id), status_code = status.HTTP_207_MULTI_STATUS) # status of each appt is in the body
+
+
+@router.get("", status_code = status.HTTP_200_OK, response_model = list[schemas_appts.ApptGetResponse])
+async def appts_get(starts_from: datetime.datetime | None = None, starts_before: datetime.datetime | None = None, limit: int | None = None, cursor: str | None = None, db: Database = Depends(get_db), payload: schemas_oauth2.TokenPayload = Depends(get_current_user)):
+
+    user_id = int(payload.user_id)
+
+    if user_id is None:
+        raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = "Something went wrong")  # this shouldn't happen though
+
+    appts_from_db, next_cursor = await service_appts_get_page(limit, cursor, starts_from, starts_before, db, user_id = user_id)
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else None # pass as cursor to get the next page
+
+    return rows_response(schemas_appts.ApptGetResponse, appts_from_db, headers = headers) # rows from the database are encoded as they are, without a model per row
@@ -1,41 +1,62 @@
-from fastapi import APIRouter, status, Depends, HTTPException
+from fastapi import APIRouter, status, Depends, HTTPException, Request, Header
+from fastapi.responses import StreamingResponse
 from app.schemas import oauth2 as schemas_oauth2
 from app.database.db import Database
 from app.core.oauth2 import get_current_user
 from app.schemas import services as schemas_services
 from app.schemas import appt_types as schemas_appt_types
-from app.services.services import service_services_create, service_services_get, service_services_get_by_id, service_appt_types_create
+from app.schemas import appts as schemas_appts
+from app.services.appts import service_appts_get_page
+from app.services.services import service_services_create, service_services_import, service_services_get_page, service_services_stream, service_services_get_by_id, service_appt_types_create, service_availability_get
 from app.dependencies import get_db
+from app.utils.idempotency import get_idempotency_store, get_request_hash
+from app.utils.responses import FastJSONResponse, rows_response
+import datetime
+from typing import Literal
 
 router = APIRouter(prefix="/services", tags=['Services'])
 
 @router.post("", status_code = status.HTTP_201_CREATED, response_model = schemas_services.ServiceCreateResponse)
-async def services_create(service: schemas_services.ServiceCreateRequest, db: Database = Depends(get_db), payload: schemas_oauth2.TokenPayload = Depends(get_current_user)):
+async def services_create(service: schemas_services.ServiceCreateRequest, db: Database = Depends(get_db), payload: schemas_oauth2.TokenPayload = Depends(get_current_user), idempotency_key: str | None = Header(default = None, max_length = 255)):
       
     user_id = int(payload.user_id)
     
     if user_id is None:
         raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = "Something went wrong")  # this shouldn't happen though
 
-    service_from_db = await service_services_create(service, db, user_id)
+    async def create_service():
+        service_from_db = await service_services_create(service, db, user_id)
+        return FastJSONResponse(schemas_services.ServiceCreateResponse(**service_from_db), status_code = status.HTTP_201_CREATED) # if Pydantic model is not followed, this throws error
+
+    return await get_idempotency_store().run(db, user_id, idempotency_key, "POST /services", get_request_hash(service), create_service) # a retry with the same Idempotency-Key gets the response of the first request
+
+@router.post("/import", status_code = status.HTTP_200_OK, response_model = schemas_services.ServiceImportResponse)
+async def services_import(request: Request, import_format: Literal["csv", "ndjson"] = "csv", db: Database = Depends(get_db), payload: schemas_oauth2.TokenPayload = Depends(get_current_user)):
+
+    user_id = int(payload.user_id)
     
-    return schemas_services.ServiceCreateResponse(**service_from_db) # if Pydantic model is not followed, this throws error
+    if user_id is None:
+        raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = "Something went wrong")  # this shouldn't happen though
+
+    return FastJSONResponse(await service_services_import(request.stream(), import_format, db, user_id)) # body is the file itself, streamed rather than read whole
 
 @router.get("", status_code=status.HTTP_200_OK, response_model= list[schemas_services.ServiceGetResponse])
-async def services_get(db: Database = Depends(get_db), payload: schemas_oauth2.TokenPayload = Depends(get_current_user)):
+async def services_get(limit: int | None = None, cursor: str | None = None, db: Database = Depends(get_db), payload: schemas_oauth2.TokenPayload = Depends(get_current_user)):
 
     user_id = int(payload.user_id)
     
     if user_id is None:
         raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = "Something went wrong")  # this shouldn't happen though
     
-    services_from_db = await service_services_get(db, user_id)
-    
-    ret = list()
-    for service in services_from_db:
-        ret.append(schemas_services.ServiceGetResponse(**service))
+    # without limit, all the services (after cursor, if given) are streamed
+    if limit is None:
+        return StreamingResponse(service_services_stream(cursor, db, user_id), media_type = "application/json")
+
+    services_from_db, next_cursor = await service_services_get_page(limit, cursor, db, user_id)
 
-    return ret # if Pydantic model is not followed, this throws error
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else None # pass as cursor to get the next page
+
+    return rows_response(schemas_services.ServiceGetResponse, services_from_db, headers = headers) # rows from the database are encoded as they are, without a model per row
 
 @router.get("/{service_id}", status_code=status.HTTP_200_OK, response_model= schemas_services.ServiceGetResponse)
 async def services_get_by_id(service_id: int, db: Database = Depends(get_db), payload: schemas_oauth2.TokenPayload = Depends(get_current_user)):
@@ -47,7 +68,30 @@ async def services_get_by_id(service_id: int, db: Database = Depends(get_db), pa
     
     service_from_db = await service_services_get_by_id(service_id, db, user_id)
     
-    return schemas_services.ServiceGetResponse(**service_from_db)
+    return FastJSONResponse(schemas_services.ServiceGetResponse(**service_from_db))
+
+@router.get("/{service_id}/availability", status_code=status.HTTP_200_OK, response_model= schemas_services.ServiceAvailabilityResponse)
+async def services_get_availability(service_id: int, appt_type_name: str, start_date: datetime.date, end_date: datetime.date, slot_interval_minutes: int | None = None, db: Database = Depends(get_db), payload: schemas_oauth2.TokenPayload = Depends(get_current_user)):
+
+    availability = await service_availability_get(service_id, appt_type_name, start_date, end_date, slot_interval_minutes, db)
+
+    return FastJSONResponse(schemas_services.ServiceAvailabilityResponse(**availability))
+
+@router.get("/{service_id}/appts", status_code=status.HTTP_200_OK, response_model= list[schemas_appts.ApptGetResponse])
+async def services_get_appts(service_id: int, starts_from: datetime.datetime | None = None, starts_before: datetime.datetime | None = None, limit: int | None = None, cursor: str | None = None, db: Database = Depends(get_db), payload: schemas_oauth2.TokenPayload = Depends(get_current_user)):
+
+    user_id = int(payload.user_id)
+    
+    if user_id is None:
+        raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = "Something went wrong")  # this shouldn't happen though
+
+    await service_services_get_by_id(service_id, db, user_id) # only the host of the service can see its appts
+
+    appts_from_db, next_cursor = await service_appts_get_page(limit, cursor, starts_from, starts_before, db, service_id = service_id)
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else None # pass as cursor to get the next page
+
+    return rows_response(schemas_appts.ApptGetResponse, appts_from_db, headers = headers)
 
 @router.post("/{service_id}/appt-types", status_code = status.HTTP_201_CREATED, response_model = schemas_appt_types.ApptTypeCreateResponse)
 async def appt_types_create(service_id: int, appt_type: schemas_appt_types.ApptTypeCreateRequest, db: Database = Depends(get_db), payload: schemas_oauth2.TokenPayload = Depends(get_current_user)):
@@ -59,5 +103,5 @@ async def appt_types_create(service_id: int, appt_type: schemas_appt_types.ApptT
 
     appt_type_from_db = await service_appt_types_create(service_id, appt_type, db, user_id)
     
-    return schemas_appt_types.ApptTypeCreateResponse(**appt_type_from_db)
+    return FastJSONResponse(schemas_appt_types.ApptTypeCreateResponse(**appt_type_from_db), status_code = status.HTTP_201_CREATED)
     
\ No newline at end of file
@@ -7,6 +7,7 @@ from app.schemas import users as schemas_users
 from app.schemas import oauth2 as schemas_oauth2
 from app.services.users import service_user_create, service_user_get
 from app.dependencies import get_db
+from app.utils.responses import FastJSONResponse
 
 router = APIRouter(prefix="/users", tags=['Users'])
 
@@ -16,7 +17,7 @@ async def user_create(user: schemas_users.UserCreateRequest, db: Database = Depe
       
     user_from_db = await service_user_create(user, db)
     
-    return schemas_users.UserCreateResponse(**user_from_db) # if Pydantic model is not followed, this throws error
+    return FastJSONResponse(schemas_users.UserCreateResponse(**user_from_db), status_code = status.HTTP_201_CREATED) # if Pydantic model is not followed, this throws error
     
 @router.get("", status_code = status.HTTP_200_OK, response_model = schemas_users.UserGetResponse)
 async def user_get(db: Database = Depends(get_db), payload: schemas_oauth2.TokenPayload = Depends(get_current_user)):
@@ -25,4 +26,4 @@ async def user_get(db: Database = Depends(get_db), payload: schemas_oauth2.Token
     
     user_from_db = await service_user_get(db, user_id)
     
-    return schemas_users.UserGetResponse(**user_from_db) # if Pydantic model is not followed, this throws error
\ No newline at end of file
+    return FastJSONResponse(schemas_users.UserGetResponse(**user_from_db)) # if Pydantic model is not followed, this throws error
\ No newline at end of file
@@ -7,10 +7,13 @@ class Config(BaseSettings):
     PASSWORD_MIN_LENGTH: int
     PASSWORD_MAX_LENGTH: int
     PASSWORD_SALT_ROUNDS: int
+    PASSWORD_HASHING_MAX_WORKERS: int = 4
+    PASSWORD_HASHING_MAX_QUEUE_DEPTH: int = 64
 
     OAUTH2_SECRET_KEY: str
     OAUTH2_ALGORITHM: str
     OAUTH2_ACCESS_TOKEN_LIFE_MINUTES: int
+    OAUTH2_TOKEN_CACHE_MAX_SIZE: int = 10000
 
     DATABASE_HOSTNAME: str
     DATABASE_PORT: int
@@ -31,6 +34,45 @@ class Config(BaseSettings):
     DATABASE_TEST_DB_NAME: str
 
     DATABASE_MIGRATIONS_RELATIVE_PATH: str
+    DATABASE_MIGRATIONS_LOCK_TIMEOUT_MS: int = 5000
+
+    DATABASE_POOL_MIN_SIZE: int = 5
+    DATABASE_POOL_MAX_SIZE: int = 10
+    DATABASE_POOL_TIMEOUT_SECONDS: float = 30.0
+    DATABASE_POOL_MAX_WAITING: int = 0
+    DATABASE_POOL_MAX_IDLE_SECONDS: float = 600.0
+    DATABASE_POOL_MAX_LIFETIME_SECONDS: float = 3600.0
+    DATABASE_POOL_RECONNECT_TIMEOUT_SECONDS: float = 300.0
+    DATABASE_POOL_CHECK_CONNECTIONS: bool = True
+    DATABASE_POOL_RESERVED_CONNECTIONS: int = 5
+
+    DATABASE_REPLICA_HOSTNAME: str | None = None
+    DATABASE_REPLICA_PORT: int | None = None
+    DATABASE_REPLICA_USERNAME: str | None = None
+    DATABASE_REPLICA_PASSWORD: str | None = None
+    DATABASE_REPLICA_NAME: str | None = None
+    DATABASE_REPLICA_MAX_LAG_SECONDS: float = 5.0
+    DATABASE_REPLICA_CHECK_INTERVAL_SECONDS: float = 1.0
+
+    DATABASE_PREPARED_STATEMENTS: bool = False
+    DATABASE_PIPELINE: bool = False
+    DATABASE_STREAM_ITERSIZE: int = 500
+
+    DATABASE_SLOW_QUERY_THRESHOLD_MS: float = 250.0
+    DATABASE_SLOW_QUERY_LOG_PATH: str = "logs/slow_queries.log"
+    DATABASE_SLOW_QUERY_LOG_PER_PROCESS: bool = False # set by app.server for its workers
+    DATABASE_SLOW_QUERY_LOG_MAX_BYTES: int = 10_000_000
+    DATABASE_SLOW_QUERY_LOG_BACKUP_COUNT: int = 5
+    DATABASE_SLOW_QUERY_EXPLAIN_SAMPLE_RATE: float = 0.1
+    DATABASE_SLOW_QUERY_EXPLAIN_MAX_PER_MINUTE: int = 6
+    DATABASE_SLOW_QUERY_EXPLAIN_TIMEOUT_MS: int = 5000
+
+    DATABASE_CACHE_ENABLED: bool = True
+    DATABASE_CACHE_MAX_SIZE: int = 10000
+    DATABASE_CACHE_SERVICES_TTL_SECONDS: int = 300
+    DATABASE_CACHE_APPT_TYPES_TTL_SECONDS: int = 300
+    DATABASE_CACHE_USERS_TTL_SECONDS: int = 300
+    DATABASE_CACHE_NEGATIVE_TTL_SECONDS: int = 5
 
     DT_DATETIME_FORMAT: str
     DT_TIME_FORMAT: str
@@ -39,9 +81,61 @@ class Config(BaseSettings):
     SERVICE_DEFAULT_CLOSE_TIME: str
     SERVICE_MIN_TIME: str
     SERVICE_MAX_TIME: str
+    SERVICE_AVAILABILITY_MAX_DAYS: int = 31
+    SERVICE_SCHEDULE_CACHE_MAX_SIZE: int = 10000
+    SERVICE_IMPORT_BATCH_SIZE: int = 5000
+    SERVICES_PAGE_MAX_LIMIT: int = 1000
+
+    APPT_BOOKING_SINGLE_ROUND_TRIP: bool = True
+    APPT_BATCH_MAX_SIZE: int = 500
+    APPTS_PAGE_DEFAULT_LIMIT: int = 100
+    APPTS_PAGE_MAX_LIMIT: int = 1000
+
+    RESPONSE_VALIDATE_DB_ROWS: bool = False
+
+    INTERNAL_API_ENABLED: bool = True
+    INTERNAL_API_TOKEN: str = ""
+
+    METRICS_ENABLED: bool = True
+
+    SERVER_HOST: str = "127.0.0.1"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 1
+    SERVER_LOOP: str = "auto"
+    SERVER_HTTP: str = "auto"
+    SERVER_BACKLOG: int = 2048
+    SERVER_TIMEOUT_KEEP_ALIVE_SECONDS: int = 5
+    SERVER_TIMEOUT_GRACEFUL_SHUTDOWN_SECONDS: int = 30
+    SERVER_PROXY_HEADERS: bool = False
+    SERVER_FORWARDED_ALLOW_IPS: str = "127.0.0.1"
+
+    IDEMPOTENCY_KEY_TTL_SECONDS: int = 86400 # how long a retry with the same Idempotency-Key gets the stored response
+    IDEMPOTENCY_IN_PROGRESS_TIMEOUT_SECONDS: float = 60.0 # a key in progress for longer (e.g. its worker died) is claimed again; keep above the longest request
+    IDEMPOTENCY_WAIT_TIMEOUT_SECONDS: float = 10.0 # how long a duplicate waits for the request in progress before getting 409
+    IDEMPOTENCY_POLL_INTERVAL_SECONDS: float = 0.05 # how often a duplicate checks a key in progress in another worker
+    IDEMPOTENCY_CACHE_MAX_SIZE: int = 10000
+    IDEMPOTENCY_PURGE_INTERVAL_SECONDS: int = 3600 # how often expired keys are deleted
+
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json" # or "text"
+    LOG_QUEUE_MAX_SIZE: int = 10_000 # records waiting to be written; more are dropped
+    LOG_ERROR_DEDUP_WINDOW_SECONDS: float = 60.0
+    LOG_ERROR_DEDUP_MAX_PER_WINDOW: int = 5 # records of each kind of error logged per window
+    LOG_ERROR_SAMPLE_RATE: float = 0.01 # share of those over LOG_ERROR_DEDUP_MAX_PER_WINDOW logged anyway
 
     # CONFIG OF CLASS
     model_config = SettingsConfigDict(env_file=".env")
 
-# SINGLETON OBJECT FOR USE THROUGHOUT PROJECT
-CONFIG = Config()
\ No newline at end of file
+class LazyConfig:
+    """
+    Stands in for the Config singleton until an attribute is first read: only then is .env read and validated.
+    The fields are then copied onto this object, so reading them later is a plain attribute lookup.
+    """
+
+    def __getattr__(self, name: str):
+        config = Config()
+        vars(self).update(config) # (field name, value) pairs
+        return getattr(config, name)
+
+# SINGLETON OBJECT FOR USE THROUGHOUT PROJECT (loaded on first use)
+CONFIG = LazyConfig()
\ No newline at end of file
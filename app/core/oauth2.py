@@ -6,28 +6,57 @@ from app.schemas import oauth2 as schemas_oauth2
 from fastapi import Depends, status, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from app.core.config import CONFIG
+from app.utils.lru_cache import LRUCache, MISSING
+import hashlib
 
-SECRET_KEY = CONFIG.OAUTH2_SECRET_KEY # openssl rand -hex 32
-ALGORITHM = CONFIG.OAUTH2_ALGORITHM
-ACCESS_TOKEN_EXPIRE_MINUTES = CONFIG.OAUTH2_ACCESS_TOKEN_LIFE_MINUTES
+# the key (OAUTH2_SECRET_KEY, e.g. from openssl rand -hex 32), algorithm and token life are read from CONFIG when used, so importing this module does not load the config
 OAUTH2_SCHEME = OAuth2PasswordBearer(tokenUrl="login") # this parameter is route where the user logins to receive a token
 
+_token_cache = None
+
+def get_token_cache() -> LRUCache:
+    """
+    Gets the cache of verified tokens, keyed by the sha256 digest of the token (so raw tokens are not kept in memory), each expiring at the token's expires_at; built on first use.
+    """
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = LRUCache(max_size = CONFIG.OAUTH2_TOKEN_CACHE_MAX_SIZE)
+    return _token_cache
+
 def create_access_token(data: dict) -> schemas_oauth2.Token:
     to_encode = data.copy()
-    expires_at = datetime.now(timezone.utc) + timedelta(minutes = ACCESS_TOKEN_EXPIRE_MINUTES) # need UTC here
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes = CONFIG.OAUTH2_ACCESS_TOKEN_LIFE_MINUTES) # need UTC here
     if "expires_at" in to_encode:
         raise Exception("Could not generate token due to \"exp\" field in data")
     to_encode["expires_at"] = str(expires_at)
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, CONFIG.OAUTH2_SECRET_KEY, algorithm=CONFIG.OAUTH2_ALGORITHM)
     return schemas_oauth2.Token(access_token=encoded_jwt, token_type = "Bearer")
 
+def get_token_expires_at(payload: dict) -> float | None:
+    """
+    Gets the expires_at of a decoded token as a unix timestamp, or None if it is missing or malformed.
+    """
+    try:
+        return datetime.fromisoformat(payload["expires_at"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
 def verify_access_token(token: str, credentials_exception):
+    token_digest = hashlib.sha256(token.encode("utf-8")).digest()
+    token_cache = get_token_cache()
+    token_data = token_cache.get(token_digest)
+    if token_data is not MISSING: # already verified and not yet expired
+        return token_data
+    
     try:
-        payload = jwt.decode(token, SECRET_KEY, [ALGORITHM]) # function accepts a sequence of ALGORITHMs
+        payload = jwt.decode(token, CONFIG.OAUTH2_SECRET_KEY, [CONFIG.OAUTH2_ALGORITHM]) # function accepts a sequence of ALGORITHMs
         user_id = int(payload.get("user_id"))
         if user_id is None:
             raise credentials_exception
         token_data = schemas_oauth2.TokenPayload(user_id = user_id)
+        expires_at = get_token_expires_at(payload)
+        if expires_at is not None:
+            token_cache.set(token_digest, token_data, expires_at)
         return token_data
     except InvalidTokenError:
         raise credentials_exception
@@ -0,0 +1,83 @@
+import functools
+import inspect
+import time
+from app.core.config import CONFIG
+from app.utils.lru_cache import LRUCache, MISSING
+
+class ReadThroughCache:
+    """
+    Cache in front of the Database methods that read rows which almost never change (services, appt types, users).
+    Each entity has its own LRUCache and TTL; a row that was not found (None) is cached too, with the shorter negative TTL, so repeated 404s also skip the database.
+    The cache is per process, so invalidation from the insert paths only reaches the process that did the insert; keep the negative TTL short when running several workers.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds_by_entity: dict, negative_ttl_seconds: int):
+        self.ttl_seconds_by_entity = dict(ttl_seconds_by_entity)
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._caches = {entity: LRUCache(max_size) for entity in ttl_seconds_by_entity}
+
+    @classmethod
+    def from_config(cls) -> "ReadThroughCache":
+        return cls(
+            max_size = CONFIG.DATABASE_CACHE_MAX_SIZE,
+            ttl_seconds_by_entity = {
+                "services": CONFIG.DATABASE_CACHE_SERVICES_TTL_SECONDS,
+                "appt_types": CONFIG.DATABASE_CACHE_APPT_TYPES_TTL_SECONDS,
+                "users": CONFIG.DATABASE_CACHE_USERS_TTL_SECONDS,
+            },
+            negative_ttl_seconds = CONFIG.DATABASE_CACHE_NEGATIVE_TTL_SECONDS,
+        )
+
+    def get(self, entity: str, key: tuple):
+        """
+        :return: a copy of the cached row, None if cached as not found, or MISSING if not cached
+        """
+        cache = self._caches.get(entity)
+        if cache is None:
+            return MISSING
+        value = cache.get(key)
+        if value is MISSING or value is None:
+            return value
+        return dict(value) # callers may modify the row they get back
+
+    def set(self, entity: str, key: tuple, value: dict | None) -> None:
+        cache = self._caches.get(entity)
+        if cache is None:
+            return
+        ttl_seconds = self.ttl_seconds_by_entity[entity] if value is not None else self.negative_ttl_seconds
+        if ttl_seconds > 0:
+            cache.set(key, dict(value) if value is not None else None, time.time() + ttl_seconds)
+
+    def invalidate(self, entity: str, key: tuple) -> None:
+        cache = self._caches.get(entity)
+        if cache is not None:
+            cache.delete(key)
+
+    def clear(self) -> None:
+        for cache in self._caches.values():
+            cache.clear()
+
+    def get_stats(self) -> dict:
+        return {entity: cache.get_stats() for (entity, cache) in self._caches.items()}
+
+def read_through(entity: str):
+    """
+    Decorator for a Database method that gets one row of entity; the arguments of the method (other than self) form the cache key.
+    The method is called as is if the Database has no cache.
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            if self.cache is None:
+                return await method(self, *args, **kwargs)
+            key = tuple(signature.bind(self, *args, **kwargs).arguments.values())[1:]
+            value = self.cache.get(entity, key)
+            if value is MISSING:
+                value = await method(self, *args, **kwargs)
+                self.cache.set(entity, key, value)
+            return value
+
+        return wrapper
+    return decorator
@@ -1,51 +1,317 @@
 import psycopg
 from psycopg_pool import AsyncConnectionPool
 from psycopg.rows import dict_row
+from psycopg import sql
 import re
-import traceback
+import contextlib
+import datetime
+import asyncio
 from app.core.config import CONFIG
+from app.database.cache import ReadThroughCache, read_through
+from app.database.replica import REPLICA_LAG_QUERY, reads_replica, writes_primary, is_reading_from_primary
+from app.database.slow_queries import SlowQueryLog
+from app.utils.log import get_logger
+from app.utils.lru_cache import MISSING
+from app.utils.metrics import METRICS, instrument_methods
 
+LOGGER = get_logger(__name__)
+
+# default of the replica_* parameters of Database, read from the config; distinct from None, which means no replica (replica_host) or the same as the primary
+_FROM_CONFIG = object()
+
+# queries that run on (almost) every request; these are the ones prepared server-side when prepared_statements is on
+HOT_QUERIES = frozenset({
+    "get_user_by_email",
+    "get_user_by_user_id",
+    "get_service_by_service_id",
+    "get_appt_type_by_service_id_and_appt_type_name",
+    "get_service_and_appt_type",
+    "get_conflicting_appt",
+    "insert_appt",
+    "book_appt",
+})
+
+# methods that only read (no writes, no volatile functions such as book_appt); only their slow statements are run again under EXPLAIN ANALYZE by the slow query log
+READ_ONLY_METHODS = frozenset({
+    "get_user_by_email",
+    "get_user_by_user_id",
+    "get_services_by_host_id",
+    "get_services_by_host_id_page",
+    "stream_services_by_host_id",
+    "get_service_by_service_id",
+    "get_service_and_appt_type",
+    "get_services_and_appt_types",
+    "get_appt_type_by_service_id_and_appt_type_name",
+    "get_conflicting_appt",
+    "get_appts_by_service_id_and_appt_type_name_in_range",
+    "get_conflicting_appts",
+    "get_appts_page",
+})
+
+# columns of services that are provided on insert, in the order of the parameters of insert_service
+SERVICE_INSERT_COLUMNS = (
+    "host_id", "service_name", "street_address", "city", "state", "zip_code", "phone_number",
+    "is_open_mo", "open_time_mo", "close_time_mo",
+    "is_open_tu", "open_time_tu", "close_time_tu",
+    "is_open_we", "open_time_we", "close_time_we",
+    "is_open_th", "open_time_th", "close_time_th",
+    "is_open_fr", "open_time_fr", "close_time_fr",
+    "is_open_sa", "open_time_sa", "close_time_sa",
+    "is_open_su", "open_time_su", "close_time_su",
+)
+
+@instrument_methods(METRICS) # latency, rows and errors of each method, see GET /api/internal/metrics
 class Database:
 
     pool = None
     dbname = None
+    prepared_statements = False
+    prepared_queries = HOT_QUERIES
+    pipeline = False
+    cache = None
+    slow_query_log = None
+    replica_pool = None
+    replica_max_lag_seconds = None
+    replica_check_interval_seconds = None
+    replica_is_healthy = False
+    replica_lag_seconds = None
+    replica_error = None
+    _replica_monitor = None
     
     def __init__(self, 
-                 dbname: str = CONFIG.DATABASE_NAME, 
-                 user: str = CONFIG.DATABASE_USERNAME, 
-                 password: str = CONFIG.DATABASE_PASSWORD, 
-                 host: str = CONFIG.DATABASE_HOSTNAME, 
-                 port: int = CONFIG.DATABASE_PORT
+                 dbname: str | None = None, 
+                 user: str | None = None, 
+                 password: str | None = None, 
+                 host: str | None = None, 
+                 port: int | None = None,
+                 prepared_statements: bool | None = None,
+                 prepared_queries: frozenset = HOT_QUERIES,
+                 pipeline: bool | None = None,
+                 cache: ReadThroughCache | None = None,
+                 pool_min_size: int | None = None,
+                 pool_max_size: int | None = None,
+                 pool_timeout: float | None = None,
+                 pool_max_waiting: int | None = None,
+                 pool_max_idle: float | None = None,
+                 pool_max_lifetime: float | None = None,
+                 pool_reconnect_timeout: float | None = None,
+                 pool_check_connections: bool | None = None,
+                 replica_host: str | None = _FROM_CONFIG,
+                 replica_port: int | None = _FROM_CONFIG,
+                 replica_user: str | None = _FROM_CONFIG,
+                 replica_password: str | None = _FROM_CONFIG,
+                 replica_dbname: str | None = _FROM_CONFIG,
+                 replica_max_lag_seconds: float | None = None,
+                 replica_check_interval_seconds: float | None = None,
+                 slow_query_log: SlowQueryLog | None = None
                  ):
+        """
+        :param bool prepared_statements: if True, the queries named in prepared_queries are prepared server-side on first use on each pooled connection (opt-in, since e.g. pgbouncer in transaction mode does not support it)
+        :param frozenset prepared_queries: names of the methods whose query should be prepared (per-query toggle)
+        :param bool pipeline: if True, methods that run several queries (e.g. get_service_and_appt_type) send them in one batch using pipeline mode
+        :param ReadThroughCache cache: if given, services, appt types and users are read through this cache
+        :param int pool_min_size: connections kept open by the pool
+        :param int pool_max_size: connections the pool can grow to under load
+        :param float pool_timeout: seconds a request waits to check out a connection before failing with PoolTimeout
+        :param int pool_max_waiting: requests that can wait for a connection before new ones fail right away with TooManyRequests (0 for no limit)
+        :param float pool_max_idle: seconds a connection above pool_min_size can stay unused before it is closed
+        :param float pool_max_lifetime: seconds after which a connection is replaced (e.g. to rebalance after a failover)
+        :param float pool_reconnect_timeout: seconds the pool keeps trying to reconnect (with backoff) after losing connections, before giving up on them
+        :param bool pool_check_connections: if True, a connection is checked (one round trip) before being handed out, so one dropped by the server is replaced instead of failing the request
+        :param str replica_host: if given, a second (read-only) pool connects to this replica, and the methods decorated with reads_replica read from it while it is healthy; None for no replica.
+            Defaults to DATABASE_REPLICA_HOSTNAME, with the other replica_* parameters defaulting to the other DATABASE_REPLICA_* settings; when given, they default to those of the primary
+        :param float replica_max_lag_seconds: the replica is not read from while it lags the primary by more than this
+        :param float replica_check_interval_seconds: how often the health and lag of the replica are checked
+        :param SlowQueryLog slow_query_log: if given, the statements (on both pools) taking longer than its threshold are logged to it, some with their EXPLAIN
+        """
+        # the defaults are read from the config here rather than in the signature, so importing this module does not load the config
+        dbname = dbname if dbname is not None else CONFIG.DATABASE_NAME
+        user = user if user is not None else CONFIG.DATABASE_USERNAME
+        password = password if password is not None else CONFIG.DATABASE_PASSWORD
+        host = host if host is not None else CONFIG.DATABASE_HOSTNAME
+        port = port if port is not None else CONFIG.DATABASE_PORT
+        prepared_statements = prepared_statements if prepared_statements is not None else CONFIG.DATABASE_PREPARED_STATEMENTS
+        pipeline = pipeline if pipeline is not None else CONFIG.DATABASE_PIPELINE
+        pool_min_size = pool_min_size if pool_min_size is not None else CONFIG.DATABASE_POOL_MIN_SIZE
+        pool_max_size = pool_max_size if pool_max_size is not None else CONFIG.DATABASE_POOL_MAX_SIZE
+        pool_timeout = pool_timeout if pool_timeout is not None else CONFIG.DATABASE_POOL_TIMEOUT_SECONDS
+        pool_max_waiting = pool_max_waiting if pool_max_waiting is not None else CONFIG.DATABASE_POOL_MAX_WAITING
+        pool_max_idle = pool_max_idle if pool_max_idle is not None else CONFIG.DATABASE_POOL_MAX_IDLE_SECONDS
+        pool_max_lifetime = pool_max_lifetime if pool_max_lifetime is not None else CONFIG.DATABASE_POOL_MAX_LIFETIME_SECONDS
+        pool_reconnect_timeout = pool_reconnect_timeout if pool_reconnect_timeout is not None else CONFIG.DATABASE_POOL_RECONNECT_TIMEOUT_SECONDS
+        pool_check_connections = pool_check_connections if pool_check_connections is not None else CONFIG.DATABASE_POOL_CHECK_CONNECTIONS
+        if replica_host is _FROM_CONFIG:
+            replica_host = CONFIG.DATABASE_REPLICA_HOSTNAME
+            replica_port = replica_port if replica_port is not _FROM_CONFIG else CONFIG.DATABASE_REPLICA_PORT
+            replica_user = replica_user if replica_user is not _FROM_CONFIG else CONFIG.DATABASE_REPLICA_USERNAME
+            replica_password = replica_password if replica_password is not _FROM_CONFIG else CONFIG.DATABASE_REPLICA_PASSWORD
+            replica_dbname = replica_dbname if replica_dbname is not _FROM_CONFIG else CONFIG.DATABASE_REPLICA_NAME
+        else: # a replica given here (or none) does not take the settings of the configured one
+            replica_port = replica_port if replica_port is not _FROM_CONFIG else None
+            replica_user = replica_user if replica_user is not _FROM_CONFIG else None
+            replica_password = replica_password if replica_password is not _FROM_CONFIG else None
+            replica_dbname = replica_dbname if replica_dbname is not _FROM_CONFIG else None
+        replica_max_lag_seconds = replica_max_lag_seconds if replica_max_lag_seconds is not None else CONFIG.DATABASE_REPLICA_MAX_LAG_SECONDS
+        replica_check_interval_seconds = replica_check_interval_seconds if replica_check_interval_seconds is not None else CONFIG.DATABASE_REPLICA_CHECK_INTERVAL_SECONDS
+        self.prepared_statements = prepared_statements
+        self.prepared_queries = frozenset(prepared_queries)
+        self.pipeline = pipeline
+        self.cache = cache
+        self.slow_query_log = slow_query_log
         try:
             self.pool = AsyncConnectionPool(
                                         conninfo = f"postgres://{user}:{password}@{host}:{port}/{dbname}",
-                                        min_size = 5,
-                                        max_size = 10,
+                                        min_size = pool_min_size,
+                                        max_size = pool_max_size,
+                                        timeout = pool_timeout,
+                                        max_waiting = pool_max_waiting,
+                                        max_idle = pool_max_idle,
+                                        max_lifetime = pool_max_lifetime,
+                                        reconnect_timeout = pool_reconnect_timeout,
+                                        reconnect_failed = self._on_reconnect_failed,
+                                        check = AsyncConnectionPool.check_connection if pool_check_connections else None,
+                                        name = dbname,
+                                        kwargs = {"cursor_factory": slow_query_log.make_cursor_class(lambda: self.pool, READ_ONLY_METHODS)} if slow_query_log is not None else None,
                                         open = False # set as False b/c to be opened in db_open()
                                         )
             self.dbname = dbname
+            if replica_host is not None:
+                replica_dbname = replica_dbname if replica_dbname is not None else dbname
+                self.replica_pool = AsyncConnectionPool(
+                                        conninfo = f"postgres://{replica_user if replica_user is not None else user}:{replica_password if replica_password is not None else password}@{replica_host}:{replica_port if replica_port is not None else port}/{replica_dbname}",
+                                        min_size = pool_min_size,
+                                        max_size = pool_max_size,
+                                        timeout = pool_timeout,
+                                        max_waiting = pool_max_waiting,
+                                        max_idle = pool_max_idle,
+                                        max_lifetime = pool_max_lifetime,
+                                        reconnect_timeout = pool_reconnect_timeout,
+                                        reconnect_failed = self._on_reconnect_failed,
+                                        check = AsyncConnectionPool.check_connection if pool_check_connections else None,
+                                        name = f"{replica_dbname}@{replica_host} (replica)",
+                                        kwargs = {"cursor_factory": slow_query_log.make_cursor_class(lambda: self.replica_pool, READ_ONLY_METHODS)} if slow_query_log is not None else None,
+                                        open = False
+                                        )
+                self.replica_max_lag_seconds = replica_max_lag_seconds
+                self.replica_check_interval_seconds = replica_check_interval_seconds
         except psycopg.OperationalError as e:            
             if re.search(r"database.*does not exist", e.args[0]): # regex ".*" matches any characters
-                print(f'{dbname} does not exist; see db init file')    
-            traceback.print_exc()
+                LOGGER.error("%s does not exist; see db init file", dbname)
+            LOGGER.exception("Could not create the connection pool")
             raise e
         
     async def db_open(self):
         try:
             await self.pool.open()
             await self.pool.wait()
+            if self.replica_pool is not None: # the app starts even if the replica is down; reads go to the primary until it is healthy
+                await self.replica_pool.open(wait = False)
+                await self.check_replica()
+                self._replica_monitor = asyncio.create_task(self._monitor_replica())
         except Exception as e:
-            traceback.print_exc()
+            LOGGER.exception("db_open failed")
             raise e
 
     async def db_close(self):
         try:
+            if self._replica_monitor is not None:
+                self._replica_monitor.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await self._replica_monitor
+                self._replica_monitor = None
+            if self.slow_query_log is not None:
+                await self.slow_query_log.wait_for_explain()
+            if self.replica_pool is not None:
+                await self.replica_pool.close()
             await self.pool.close()
         except Exception as e:
-            traceback.print_exc()
+            LOGGER.exception("db_close failed")
             raise e
+
+    def get_read_pool(self) -> AsyncConnectionPool:
+        """
+        Gets the pool to read from: the replica, unless there is none, it is unhealthy or lagging, or the current request has written (read-your-writes; see replica.read_from_primary).
+        """
+        if self.replica_pool is None or not self.replica_is_healthy or is_reading_from_primary():
+            return self.pool
+        return self.replica_pool
+
+    def set_replica_health(self, is_healthy: bool, error: str | None = None) -> None:
+        if is_healthy != self.replica_is_healthy:
+            if is_healthy:
+                LOGGER.info("%s: reading from the replica", self.replica_pool.name)
+            else:
+                LOGGER.warning("%s: reading from the primary instead (%s)", self.replica_pool.name, error)
+        self.replica_is_healthy = is_healthy
+        self.replica_error = error
+
+    async def check_replica(self) -> bool:
+        """
+        Checks that the replica is up and does not lag the primary by more than replica_max_lag_seconds, and routes reads accordingly.
+
+        :return: whether the replica is healthy
+        :rtype: bool
+        """
+        try:
+            async with self.replica_pool.connection(timeout = self.replica_check_interval_seconds) as conn:
+                async with conn.cursor(row_factory = dict_row) as cursor:
+                    await cursor.execute(REPLICA_LAG_QUERY)
+                    lag_seconds = (await cursor.fetchone())["lag_seconds"]
+        except psycopg.Error as e: # includes PoolTimeout
+            self.replica_lag_seconds = None
+            self.set_replica_health(False, f"{type(e).__name__}: {e}")
+            return False
+        self.replica_lag_seconds = float(lag_seconds) if lag_seconds is not None else None
+        if self.replica_lag_seconds is None or self.replica_lag_seconds > self.replica_max_lag_seconds:
+            self.set_replica_health(False, f"lag of {self.replica_lag_seconds} seconds")
+            return False
+        self.set_replica_health(True)
+        return True
+
+    async def _monitor_replica(self) -> None:
+        while True:
+            await asyncio.sleep(self.replica_check_interval_seconds)
+            await self.check_replica()
+
+    def _on_reconnect_failed(self, pool: AsyncConnectionPool) -> None:
+        LOGGER.error("%s: could not reconnect to the database within %s seconds; will retry when a connection is requested", pool.name, pool.reconnect_timeout)
+
+    def get_pool_stats(self, reset: bool = False) -> dict:
+        """
+        Gets statistics of the connection pool, to size it from data.
+        Gauges (e.g. pool_size, requests_waiting) are current values; counters (e.g. requests_num, requests_wait_ms, connections_errors) add up since the pool was opened, or since the last reset.
+
+        :param bool reset: if True, the counters are reset after being read
+        :return: psycopg_pool statistics of each pool by name ("primary", and "replica" if any, with its health and lag), plus requests_wait_ms_mean (mean checkout wait of the requests that had to wait)
+        :rtype: dict
+        """
+        pools = {"primary": self.pool}
+        if self.replica_pool is not None:
+            pools["replica"] = self.replica_pool
+        pool_stats = dict()
+        for (name, pool) in pools.items():
+            stats = pool.pop_stats() if reset else pool.get_stats()
+            requests_queued = stats.get("requests_queued", 0)
+            stats["requests_wait_ms_mean"] = stats.get("requests_wait_ms", 0) / requests_queued if requests_queued else 0.0
+            pool_stats[name] = stats
+        if self.replica_pool is not None:
+            pool_stats["replica"].update(is_healthy = self.replica_is_healthy, lag_seconds = self.replica_lag_seconds, error = self.replica_error)
+        return pool_stats
+
+    def _prepare(self, query_name: str) -> bool | None:
+        """
+        Gets the prepare argument for cursor.execute of a query.
+        None leaves it to psycopg, which prepares a query by itself once it has run prepare_threshold times on a connection.
+
+        :param str query_name: name of the method running the query
+        :return: True if the query should be prepared server-side right away, else None
+        :rtype: bool | None
+        """
+        if self.prepared_statements and query_name in self.prepared_queries:
+            return True
+        return None
         
+    @writes_primary
     async def insert_user(self,
                     email: str, 
                     password: str
@@ -58,12 +324,15 @@ class Database:
                         """
                             INSERT INTO users(email, password) VALUES (%s, %s) RETURNING *;
                         """,
-                        (email, password,)
+                        (email, password,),
+                        prepare = self._prepare("insert_user")
                     )
                     res = await cursor.fetchone()
+                    if self.cache is not None and res is not None:
+                        self.cache.invalidate("users", (res["user_id"], )) # could have been cached as not found
                     return res
         except Exception as e:
-            traceback.print_exc()
+            LOGGER.exception("insert_user failed")
             raise e
         
     async def get_user_by_email(self,
@@ -77,33 +346,38 @@ class Database:
                         """
                             SELECT * FROM users WHERE email=%s;
                         """,
-                        (email, )
+                        (email, ),
+                        prepare = self._prepare("get_user_by_email")
                     )
                     res = await cursor.fetchone()
                     return res
         except Exception as e:
-            traceback.print_exc()
+            LOGGER.exception("get_user_by_email failed")
             raise e
 
+    @read_through("users")
+    @reads_replica(retry_on_none = True)
     async def get_user_by_user_id(self,
                           user_id: int
                           ) -> dict:
         try:
-            async with self.pool.connection() as conn:
+            async with self.get_read_pool().connection() as conn:
                 conn.row_factory = dict_row
                 async with conn.cursor() as cursor:
                     await cursor.execute(
                         """
                             SELECT * FROM users WHERE user_id=%s;
                         """,
-                        (user_id, )
+                        (user_id, ),
+                        prepare = self._prepare("get_user_by_user_id")
                     )
                     res = await cursor.fetchone()
                     return res
         except Exception as e:
-            traceback.print_exc()
+            LOGGER.exception("get_user_by_user_id failed")
             raise e
     
+    @writes_primary
     async def insert_service(self, 
                        host_id: int,
                        service_name: str, 
@@ -162,50 +436,272 @@ class Database:
                         is_open_fr, open_time_fr, close_time_fr,
                         is_open_sa, open_time_sa, close_time_sa,
                         is_open_su, open_time_su, close_time_su,
-                        )
+                        ),
+                        prepare = self._prepare("insert_service")
                     )
                     res = await cursor.fetchone()
+                    if self.cache is not None and res is not None:
+                        self.cache.invalidate("services", (res["service_id"], )) # could have been cached as not found
                     return res
         except Exception as e:
-            traceback.print_exc()
+            LOGGER.exception("insert_service failed")
             raise e
         
+    @writes_primary
+    async def copy_services(self,
+                            services: list,
+                            appt_types: list
+                            ) -> tuple:
+        """
+        Bulk inserts services and their appointment types in one transaction: the rows are streamed with COPY into temporary tables, and inserted from there with one INSERT ... SELECT per table.
+        A service whose phone_number already exists is skipped (ON CONFLICT DO NOTHING), along with its appointment types.
+
+        :param list services: dicts with the SERVICE_INSERT_COLUMNS of each service
+        :param list appt_types: (phone_number, appt_type_name, appt_duration_minutes) tuples, phone_number identifying the service among services
+        :return: service_id and phone_number of each inserted service, and the number of inserted appointment types
+        :rtype: tuple[list, int]
+        """
+        columns = sql.SQL(", ").join(map(sql.Identifier, SERVICE_INSERT_COLUMNS))
+        try:
+            async with self.pool.connection() as conn:
+                conn.row_factory = dict_row
+                async with conn.transaction():
+                    async with conn.cursor() as cursor:
+                        await cursor.execute(sql.SQL(
+                            """
+                                CREATE TEMP TABLE services_import ON COMMIT DROP AS SELECT {columns} FROM services WITH NO DATA;
+                                CREATE TEMP TABLE appt_types_import (phone_number TEXT, appt_type_name TEXT, appt_duration_minutes INTEGER) ON COMMIT DROP;
+                            """).format(columns = columns)
+                        )
+                        async with cursor.copy(sql.SQL("COPY services_import ({columns}) FROM STDIN").format(columns = columns)) as copy:
+                            for service in services:
+                                await copy.write_row(tuple(service[column] for column in SERVICE_INSERT_COLUMNS))
+                        async with cursor.copy("COPY appt_types_import (phone_number, appt_type_name, appt_duration_minutes) FROM STDIN") as copy:
+                            for appt_type in appt_types:
+                                await copy.write_row(appt_type)
+
+                        await cursor.execute(sql.SQL(
+                            """
+                                INSERT INTO services ({columns})
+                                SELECT {columns} FROM services_import
+                                ON CONFLICT (phone_number) DO NOTHING
+                                RETURNING service_id, phone_number;
+                            """).format(columns = columns)
+                        )
+                        inserted_services = await cursor.fetchall()
+
+                        await cursor.execute(
+                            """
+                                INSERT INTO appt_types (service_id, appt_type_name, appt_duration_minutes)
+                                SELECT s.service_id, a.appt_type_name, a.appt_duration_minutes
+                                FROM appt_types_import a
+                                JOIN services s ON s.phone_number = a.phone_number
+                                WHERE s.service_id = ANY(%s::INTEGER[]); -- only the services inserted here
+                            """,
+                            ([service["service_id"] for service in inserted_services], ),
+                        )
+                        inserted_appt_types_count = cursor.rowcount
+            if self.cache is not None:
+                for service in inserted_services:
+                    self.cache.invalidate("services", (service["service_id"], )) # could have been cached as not found
+            return inserted_services, inserted_appt_types_count
+        except Exception as e:
+            LOGGER.exception("copy_services failed")
+            raise e
+
+    @reads_replica()
     async def get_services_by_host_id(self,
                                 host_id: int):
         try:
-            async with self.pool.connection() as conn:
+            async with self.get_read_pool().connection() as conn:
                 conn.row_factory = dict_row
                 async with conn.cursor() as cursor:
                     await cursor.execute(
                         """
                             SELECT * FROM services WHERE host_id=%s;
                         """,
-                        (host_id, )
+                        (host_id, ),
+                        prepare = self._prepare("get_services_by_host_id")
                     )
                     res = await cursor.fetchall()
                     return res
         except Exception as e:
-            traceback.print_exc()
+            LOGGER.exception("get_services_by_host_id failed")
             raise e
     
+    @reads_replica()
+    async def get_services_by_host_id_page(self,
+                                           host_id: int,
+                                           limit: int,
+                                           after_service_id: int | None = None):
+        """
+        Gets one page of the services of a host in service_id order (keyset pagination, using services_host_id_service_id_idx).
+
+        :param int host_id: user_id of the host
+        :param int limit: maximum number of services to get
+        :param int after_service_id: service_id of the last service of the previous page; None for the first page
+        :return: data of the services
+        :rtype: list
+        """
+        try:
+            async with self.get_read_pool().connection() as conn:
+                conn.row_factory = dict_row
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        """
+                            SELECT * FROM services
+                            WHERE host_id = %s AND service_id > %s
+                            ORDER BY service_id
+                            LIMIT %s;
+                        """,
+                        (host_id, after_service_id if after_service_id is not None else 0, limit, ),
+                        prepare = self._prepare("get_services_by_host_id_page")
+                    )
+                    res = await cursor.fetchall()
+                    return res
+        except Exception as e:
+            LOGGER.exception("get_services_by_host_id_page failed")
+            raise e
+
+    async def stream_services_by_host_id(self,
+                                         host_id: int,
+                                         after_service_id: int | None = None,
+                                         itersize: int | None = None):
+        """
+        Yields the services of a host in service_id order, reading them from a server-side cursor itersize rows at a time, so they are never all in memory at once.
+        The pooled connection is held until the iteration finishes (or the generator is closed).
+
+        :param int host_id: user_id of the host
+        :param int after_service_id: only services after this service_id; None for all
+        :param int itersize: number of rows fetched from the server-side cursor at a time; defaults to DATABASE_STREAM_ITERSIZE
+        :return: async iterator of the data of the services
+        """
+        try:
+            async with self.get_read_pool().connection() as conn:
+                conn.row_factory = dict_row
+                async with conn.cursor(name = "stream_services_by_host_id") as cursor: # named, so server-side
+                    cursor.itersize = itersize if itersize is not None else CONFIG.DATABASE_STREAM_ITERSIZE
+                    await cursor.execute(
+                        """
+                            SELECT * FROM services
+                            WHERE host_id = %s AND service_id > %s
+                            ORDER BY service_id;
+                        """,
+                        (host_id, after_service_id if after_service_id is not None else 0, ),
+                    )
+                    async for row in cursor:
+                        yield row
+        except Exception as e:
+            LOGGER.exception("stream_services_by_host_id failed")
+            raise e
+
+    @read_through("services")
+    @reads_replica(retry_on_none = True)
     async def get_service_by_service_id(self,
                                 service_id: int):
         try:
-            async with self.pool.connection() as conn:
+            async with self.get_read_pool().connection() as conn:
                 conn.row_factory = dict_row
                 async with conn.cursor() as cursor:
                     await cursor.execute(
                         """
                             SELECT * FROM services WHERE service_id=%s;
                         """,
-                        (service_id, )
+                        (service_id, ),
+                        prepare = self._prepare("get_service_by_service_id")
                     )
                     res = await cursor.fetchone()
                     return res
         except Exception as e:
-            traceback.print_exc()
+            LOGGER.exception("get_service_by_service_id failed")
             raise e
         
+    async def get_service_and_appt_type(self,
+                                        service_id: int,
+                                        appt_type_name: str):
+        """
+        Gets the service and the appointment type using one pooled connection; if pipeline is on, both queries are sent before waiting for either result (one round trip).
+
+        :param int service_id: service_id
+        :param str appt_type_name: appt_type_name
+        :return: data of the service and data of the appointment type (each None if not found)
+        :rtype: tuple[dict | None, dict | None]
+        """
+        if self.cache is not None:
+            service = self.cache.get("services", (service_id, ))
+            appt_type = self.cache.get("appt_types", (service_id, appt_type_name, ))
+            if service is not MISSING and appt_type is not MISSING:
+                return service, appt_type
+
+        try:
+            async with self.pool.connection() as conn:
+                conn.row_factory = dict_row
+                async with conn.pipeline() if self.pipeline else contextlib.nullcontext():
+                    async with conn.cursor() as service_cursor, conn.cursor() as appt_type_cursor:
+                        await service_cursor.execute(
+                            """
+                                SELECT * FROM services WHERE service_id=%s;
+                            """,
+                            (service_id, ),
+                            prepare = self._prepare("get_service_and_appt_type")
+                        )
+                        await appt_type_cursor.execute(
+                            """
+                                SELECT * FROM appt_types WHERE service_id=%s AND appt_type_name=%s;
+                            """,
+                            (service_id, appt_type_name, ),
+                            prepare = self._prepare("get_service_and_appt_type")
+                        )
+                        service = await service_cursor.fetchone()
+                        appt_type = await appt_type_cursor.fetchone()
+                        if self.cache is not None:
+                            self.cache.set("services", (service_id, ), service)
+                            self.cache.set("appt_types", (service_id, appt_type_name, ), appt_type)
+                        return service, appt_type
+        except Exception as e:
+            LOGGER.exception("get_service_and_appt_type failed")
+            raise e
+
+    async def get_services_and_appt_types(self,
+                                          service_ids: list,
+                                          appt_type_keys: list):
+        """
+        Gets many services and appointment types using one pooled connection (one query each, or one round trip if pipeline is on), e.g. for a batch of appointments.
+
+        :param list service_ids: service_ids
+        :param list appt_type_keys: (service_id, appt_type_name) tuples
+        :return: mapping of service_id to data of the service, and mapping of (service_id, appt_type_name) to data of the appointment type (missing keys were not found)
+        :rtype: tuple[dict, dict]
+        """
+        try:
+            async with self.pool.connection() as conn:
+                conn.row_factory = dict_row
+                async with conn.pipeline() if self.pipeline else contextlib.nullcontext():
+                    async with conn.cursor() as service_cursor, conn.cursor() as appt_type_cursor:
+                        await service_cursor.execute(
+                            """
+                                SELECT * FROM services WHERE service_id = ANY(%s::INTEGER[]);
+                            """,
+                            (list(service_ids), ),
+                        )
+                        await appt_type_cursor.execute(
+                            """
+                                SELECT * FROM appt_types
+                                WHERE (service_id, appt_type_name) IN (SELECT * FROM unnest(%s::INTEGER[], %s::TEXT[]));
+                            """,
+                            ([key[0] for key in appt_type_keys], [key[1] for key in appt_type_keys], ),
+                        )
+                        services = await service_cursor.fetchall()
+                        appt_types = await appt_type_cursor.fetchall()
+                        return (
+                            {service["service_id"]: service for service in services},
+                            {(appt_type["service_id"], appt_type["appt_type_name"]): appt_type for appt_type in appt_types},
+                        )
+        except Exception as e:
+            LOGGER.exception("get_services_and_appt_types failed")
+            raise e
+
+    @writes_primary
     async def insert_appt_type(self,
                     service_id: int, 
                     appt_type_name: str, 
@@ -219,14 +715,18 @@ class Database:
                         """
                             INSERT INTO appt_types (service_id, appt_type_name, appt_duration_minutes) VALUES (%s, %s, %s) RETURNING *;
                         """, 
-                        (service_id, appt_type_name, appt_duration_minutes)
+                        (service_id, appt_type_name, appt_duration_minutes),
+                        prepare = self._prepare("insert_appt_type")
                     )
                     res = await cursor.fetchone()
+                    if self.cache is not None and res is not None:
+                        self.cache.invalidate("appt_types", (res["service_id"], res["appt_type_name"], )) # could have been cached as not found
                     return res
         except Exception as e:
-            traceback.print_exc()
+            LOGGER.exception("insert_appt_type failed")
             raise e
     
+    @read_through("appt_types")
     async def get_appt_type_by_service_id_and_appt_type_name(self, 
                                                        service_id: int,
                                                        appt_type_name: str):
@@ -238,12 +738,13 @@ class Database:
                         """
                             SELECT * FROM appt_types WHERE service_id=%s AND appt_type_name=%s;
                         """,
-                        (service_id, appt_type_name, )
+                        (service_id, appt_type_name, ),
+                        prepare = self._prepare("get_appt_type_by_service_id_and_appt_type_name")
                     )
                     res = await cursor.fetchone()
                     return res
         except Exception as e:
-            traceback.print_exc()
+            LOGGER.exception("get_appt_type_by_service_id_and_appt_type_name failed")
             raise e
         
     async def get_conflicting_appt(self, 
@@ -253,8 +754,10 @@ class Database:
                               appt_ends_at: str):
         """
         Checks if there exists any appointment that conflicts with the time slot provided in the arguments. Returns None if no conflict.
+        Uses the GiST index of the appts_no_overlap exclusion constraint; note that insert_appt already enforces this atomically, so this is not needed before an insert.
 
         :param int service_id: service_id
+        :param str appt_type_name: appt_type_name
         :param str appt_starts_at: timestamp of when the appointment should start
         :param str appt_ends_at: timestamp of when the appointment should end
         :return: data of the existing conflicting appointment
@@ -270,23 +773,60 @@ class Database:
                             FROM appts
                             WHERE service_id = %s -- service_id
                             AND appt_type_name = %s
-                            AND (
-                                (%s >= appt_starts_at AND %s < appt_ends_at) -- appt_starts_at, appt_starts_at
-                                OR 
-                                (%s > appt_starts_at AND %s <= appt_ends_at) -- appt_ends_at, appt_ends_at
-                            ) 
+                            AND appt_during && tsrange(%s, %s, '[)') -- appt_starts_at, appt_ends_at
+                            LIMIT 1;
                         """,
                         (service_id,
                         appt_type_name,
-                        appt_starts_at, appt_starts_at, 
-                        appt_ends_at, appt_ends_at,)
+                        appt_starts_at, appt_ends_at,),
+                        prepare = self._prepare("get_conflicting_appt")
                     )
                     res = await cursor.fetchone()
                     return res
         except Exception as e:
-            traceback.print_exc()
+            LOGGER.exception("get_conflicting_appt failed")
             raise e
     
+    async def get_appts_by_service_id_and_appt_type_name_in_range(self,
+                                                                 service_id: int,
+                                                                 appt_type_name: str,
+                                                                 range_starts_at: str,
+                                                                 range_ends_at: str):
+        """
+        Gets all appointments of the appointment type that overlap with the range provided in the arguments, in a single query.
+
+        :param int service_id: service_id
+        :param str appt_type_name: appt_type_name
+        :param str range_starts_at: timestamp of when the range starts
+        :param str range_ends_at: timestamp of when the range ends
+        :return: appointments ordered by appt_starts_at
+        :rtype: list[dict]
+        """
+        try:
+            async with self.pool.connection() as conn:
+                conn.row_factory = dict_row
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        """
+                            SELECT appt_id, appt_starts_at, appt_ends_at
+                            FROM appts
+                            WHERE service_id = %s
+                            AND appt_type_name = %s
+                            AND appt_during && tsrange(%s, %s, '[)') -- range_starts_at, range_ends_at
+                            ORDER BY appt_starts_at;
+                        """,
+                        (service_id,
+                        appt_type_name,
+                        range_starts_at, range_ends_at,),
+                        prepare = self._prepare("get_appts_by_service_id_and_appt_type_name_in_range")
+                    )
+                    res = await cursor.fetchall()
+                    return res
+        except Exception as e:
+            LOGGER.exception("get_appts_by_service_id_and_appt_type_name_in_range failed")
+            raise e
+
+    @writes_primary
     async def insert_appt(self,
                     user_id: int,
                     service_id: int,
@@ -294,6 +834,9 @@ class Database:
                     appt_starts_at: str,
                     appt_ends_at: str
                     ):
+        """
+        Inserts an appointment. Raises psycopg.errors.ExclusionViolation if it conflicts with an existing appointment (appts_no_overlap constraint).
+        """
         try:
             async with self.pool.connection() as conn:
                 conn.row_factory = dict_row
@@ -302,15 +845,294 @@ class Database:
                         """
                             INSERT INTO appts (user_id, service_id, appt_type_name, appt_starts_at, appt_ends_at) VALUES (%s, %s, %s, %s, %s) RETURNING *;
                         """, 
-                        (user_id, service_id, appt_type_name, appt_starts_at, appt_ends_at,)
+                        (user_id, service_id, appt_type_name, appt_starts_at, appt_ends_at,),
+                        prepare = self._prepare("insert_appt")
                     )
                     res = await cursor.fetchone()
                     return res
         except Exception as e:
-            traceback.print_exc()
+            LOGGER.exception("insert_appt failed")
             raise e
         
+    async def get_conflicting_appts(self, appts: list) -> list:
+        """
+        Checks set-wise (one query) which of the given time slots conflict with an existing appointment.
+
+        :param list appts: (service_id, appt_type_name, appt_starts_at, appt_ends_at) tuples
+        :return: rows with batch_index, the position in appts of each time slot that has a conflict
+        :rtype: list
+        """
+        try:
+            async with self.pool.connection() as conn:
+                conn.row_factory = dict_row
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        """
+                            SELECT (b.ord - 1)::INTEGER AS batch_index
+                            FROM unnest(%s::INTEGER[], %s::TEXT[], %s::TIMESTAMP[], %s::TIMESTAMP[]) WITH ORDINALITY AS b(service_id, appt_type_name, appt_starts_at, appt_ends_at, ord)
+                            WHERE EXISTS (
+                                SELECT 1 FROM appts a
+                                WHERE a.service_id = b.service_id
+                                AND a.appt_type_name = b.appt_type_name
+                                AND a.appt_during && tsrange(b.appt_starts_at, b.appt_ends_at, '[)')
+                            )
+                            ORDER BY b.ord;
+                        """,
+                        tuple(list(column) for column in zip(*appts)) if appts else ([], [], [], [], ),
+                    )
+                    res = await cursor.fetchall()
+                    return res
+        except Exception as e:
+            LOGGER.exception("get_conflicting_appts failed")
+            raise e
+
+    @writes_primary
+    async def insert_appts(self, appts: list, all_or_nothing: bool = False) -> list | None:
+        """
+        Inserts many appointments with a single multi-row INSERT. The appointments must not conflict with each other.
+        An appointment that conflicts with an existing one is skipped rather than failing the statement: the set-wise NOT EXISTS check skips committed conflicts, and ON CONFLICT DO NOTHING (appts_no_overlap) skips ones inserted concurrently.
+
+        :param list appts: (user_id, service_id, appt_type_name, appt_starts_at, appt_ends_at) tuples
+        :param bool all_or_nothing: if True, nothing is inserted if any of the appointments is skipped
+        :return: data of the inserted appointments, or None if all_or_nothing and nothing was inserted because of a conflict
+        :rtype: list | None
+        """
+        try:
+            async with self.pool.connection() as conn:
+                conn.row_factory = dict_row
+                async with conn.transaction():
+                    async with conn.cursor() as cursor:
+                        await cursor.execute(
+                            """
+                                INSERT INTO appts (user_id, service_id, appt_type_name, appt_starts_at, appt_ends_at)
+                                SELECT b.user_id, b.service_id, b.appt_type_name, b.appt_starts_at, b.appt_ends_at
+                                FROM unnest(%s::INTEGER[], %s::INTEGER[], %s::TEXT[], %s::TIMESTAMP[], %s::TIMESTAMP[]) AS b(user_id, service_id, appt_type_name, appt_starts_at, appt_ends_at)
+                                WHERE NOT EXISTS (
+                                    SELECT 1 FROM appts a
+                                    WHERE a.service_id = b.service_id
+                                    AND a.appt_type_name = b.appt_type_name
+                                    AND a.appt_during && tsrange(b.appt_starts_at, b.appt_ends_at, '[)')
+                                )
+                                ON CONFLICT DO NOTHING
+                                RETURNING *;
+                            """,
+                            tuple(list(column) for column in zip(*appts)) if appts else ([], [], [], [], [], ),
+                        )
+                        res = await cursor.fetchall()
+                        if all_or_nothing and len(res) < len(appts):
+                            raise psycopg.Rollback() # exits the transaction block, undoing the insert
+                        return res
+                return None
+        except Exception as e:
+            LOGGER.exception("insert_appts failed")
+            raise e
+
+    @reads_replica()
+    async def get_appts_page(self,
+                             limit: int,
+                             user_id: int | None = None,
+                             service_id: int | None = None,
+                             starts_from: datetime.datetime | None = None,
+                             starts_before: datetime.datetime | None = None,
+                             after: tuple | None = None):
+        """
+        Gets one page of the appointments of a patron (user_id) or of a service (service_id) in (appt_starts_at, appt_id) order (keyset pagination).
+        Only the columns in the covering indexes appts_user_id_appt_starts_at_idx and appts_service_id_appt_starts_at_idx are selected, so this is an index-only scan.
+
+        :param int limit: maximum number of appointments to get
+        :param int user_id: user_id of the patron (exactly one of user_id and service_id must be given)
+        :param int service_id: service_id of the service
+        :param datetime starts_from: only appointments starting at or after this time
+        :param datetime starts_before: only appointments starting before this time
+        :param tuple after: (appt_starts_at, appt_id) of the last appointment of the previous page; None for the first page
+        :return: data of the appointments
+        :rtype: list
+        """
+        if (user_id is None) == (service_id is None):
+            raise ValueError("Exactly one of user_id and service_id must be given")
+        conditions = [sql.SQL("user_id = %s") if user_id is not None else sql.SQL("service_id = %s")]
+        params = [user_id if user_id is not None else service_id]
+        if starts_from is not None:
+            conditions.append(sql.SQL("appt_starts_at >= %s"))
+            params.append(starts_from)
+        if starts_before is not None:
+            conditions.append(sql.SQL("appt_starts_at < %s"))
+            params.append(starts_before)
+        if after is not None:
+            conditions.append(sql.SQL("(appt_starts_at, appt_id) > (%s, %s)"))
+            params.extend(after)
+        params.append(limit)
+        try:
+            async with self.get_read_pool().connection() as conn:
+                conn.row_factory = dict_row
+                async with conn.cursor() as cursor:
+                    await cursor.execute(sql.SQL(
+                        """
+                            SELECT appt_id, user_id, service_id, appt_type_name, appt_starts_at, appt_ends_at, created_at, updated_at
+                            FROM appts
+                            WHERE {conditions}
+                            ORDER BY appt_starts_at, appt_id
+                            LIMIT %s;
+                        """).format(conditions = sql.SQL(" AND ").join(conditions)),
+                        tuple(params),
+                    )
+                    res = await cursor.fetchall()
+                    return res
+        except Exception as e:
+            LOGGER.exception("get_appts_page failed")
+            raise e
+
+    @writes_primary
+    async def book_appt(self,
+                        user_id: int,
+                        service_id: int,
+                        appt_type_name: str,
+                        appt_starts_at: str
+                        ) -> dict:
+        """
+        Books an appointment in a single round trip (service lookup, duration lookup, opening hours check, conflict check and insert happen in the book_appt SQL function).
+
+        :param int user_id: user_id of the patron
+        :param int service_id: service_id
+        :param str appt_type_name: appt_type_name
+        :param str appt_starts_at: timestamp of when the appointment should start
+        :return: booking_status (booked, service_not_found, appt_type_not_found, invalid_time or conflict), and the data of the appointment if booked
+        :rtype: dict
+        """
+        try:
+            async with self.pool.connection() as conn:
+                conn.row_factory = dict_row
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        """
+                            SELECT * FROM book_appt(%s, %s, %s, %s);
+                        """,
+                        (user_id, service_id, appt_type_name, appt_starts_at,),
+                        prepare = self._prepare("book_appt")
+                    )
+                    res = await cursor.fetchone()
+                    return res
+        except Exception as e:
+            LOGGER.exception("book_appt failed")
+            raise e
+
+    async def claim_idempotency_key(self,
+                                    user_id: int,
+                                    idempotency_key: str,
+                                    route: str,
+                                    request_hash: str,
+                                    in_progress_timeout_seconds: float | None = None,
+                                    ttl_seconds: float | None = None
+                                    ) -> dict | None:
+        """
+        Claims an idempotency key for a request, on the primary: the request that inserts the key runs, and the others with the key get its stored response (or wait for it).
+        A key left in progress for more than in_progress_timeout_seconds (e.g. its worker died) or created more than ttl_seconds ago is claimed again.
+
+        :return: the idempotency_keys row, with is_claimed True if the key was claimed for this request; None if the key was released in between (claim again)
+        :rtype: dict | None
+        """
+        try:
+            async with self.pool.connection() as conn:
+                conn.row_factory = dict_row
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        """
+                            INSERT INTO idempotency_keys AS k (user_id, idempotency_key, route, request_hash) VALUES (%s, %s, %s, %s)
+                            ON CONFLICT (user_id, idempotency_key) DO UPDATE
+                                SET route = EXCLUDED.route, request_hash = EXCLUDED.request_hash, response_status_code = NULL, response_body = NULL, created_at = EXCLUDED.created_at, completed_at = NULL
+                                WHERE (k.response_status_code IS NULL AND k.created_at < EXCLUDED.created_at - make_interval(secs => %s))
+                                    OR k.created_at < EXCLUDED.created_at - make_interval(secs => %s)
+                            RETURNING TRUE AS is_claimed, k.*;
+                        """,
+                        (user_id, idempotency_key, route, request_hash,
+                         in_progress_timeout_seconds if in_progress_timeout_seconds is not None else CONFIG.IDEMPOTENCY_IN_PROGRESS_TIMEOUT_SECONDS,
+                         ttl_seconds if ttl_seconds is not None else CONFIG.IDEMPOTENCY_KEY_TTL_SECONDS,)
+                    )
+                    res = await cursor.fetchone()
+                    if res is not None:
+                        return res
+                    await cursor.execute(
+                        """
+                            SELECT FALSE AS is_claimed, * FROM idempotency_keys WHERE user_id=%s AND idempotency_key=%s;
+                        """,
+                        (user_id, idempotency_key,)
+                    )
+                    res = await cursor.fetchone()
+                    return res
+        except Exception as e:
+            LOGGER.exception("claim_idempotency_key failed")
+            raise e
+
+    async def complete_idempotency_key(self,
+                                       user_id: int,
+                                       idempotency_key: str,
+                                       response_status_code: int,
+                                       response_body: bytes
+                                       ) -> None:
+        """
+        Stores the response of the request that claimed an idempotency key.
+        """
+        try:
+            async with self.pool.connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        """
+                            UPDATE idempotency_keys SET response_status_code=%s, response_body=%s, completed_at=(now() at time zone 'utc')
+                            WHERE user_id=%s AND idempotency_key=%s;
+                        """,
+                        (response_status_code, response_body, user_id, idempotency_key,)
+                    )
+                    return
+        except Exception as e:
+            LOGGER.exception("complete_idempotency_key failed")
+            raise e
+
+    async def release_idempotency_key(self,
+                                      user_id: int,
+                                      idempotency_key: str
+                                      ) -> None:
+        """
+        Releases an idempotency key whose request failed without a response worth storing (e.g. a 500), so that a retry runs again.
+        """
+        try:
+            async with self.pool.connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        """
+                            DELETE FROM idempotency_keys WHERE user_id=%s AND idempotency_key=%s AND response_status_code IS NULL;
+                        """,
+                        (user_id, idempotency_key,)
+                    )
+                    return
+        except Exception as e:
+            LOGGER.exception("release_idempotency_key failed")
+            raise e
+
+    async def delete_expired_idempotency_keys(self,
+                                              ttl_seconds: float | None = None
+                                              ) -> int:
+        """
+        :return: the number of idempotency keys deleted, those created more than ttl_seconds ago
+        :rtype: int
+        """
+        try:
+            async with self.pool.connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        """
+                            DELETE FROM idempotency_keys WHERE created_at < (now() at time zone 'utc') - make_interval(secs => %s);
+                        """,
+                        (ttl_seconds if ttl_seconds is not None else CONFIG.IDEMPOTENCY_KEY_TTL_SECONDS,)
+                    )
+                    return cursor.rowcount
+        except Exception as e:
+            LOGGER.exception("delete_expired_idempotency_keys failed")
+            raise e
+
+    @writes_primary
     async def reset_db(self) -> None: # only for use in tests
+        if self.cache is not None:
+            self.cache.clear()
         try:
             async with self.pool.connection() as conn:
                 conn.row_factory = dict_row
@@ -322,8 +1144,25 @@ class Database:
                     )
                     return
         except Exception as e:
-            traceback.print_exc()
+            LOGGER.exception("reset_db failed")
             raise e
 
         
-db = Database()
\ No newline at end of file
+_db = None
+
+def get_database() -> Database:
+    """
+    Gets the Database of the app, built on first use (see dependencies.get_db), so importing this module (e.g. from the tests or the CLI tools) does not build one.
+    """
+    global _db
+    if _db is None:
+        _db = Database(
+            cache = ReadThroughCache.from_config() if CONFIG.DATABASE_CACHE_ENABLED else None,
+            slow_query_log = SlowQueryLog.from_config() if CONFIG.DATABASE_SLOW_QUERY_THRESHOLD_MS > 0 else None,
+        )
+    return _db
+
+def __getattr__(name: str):
+    if name == "db": # module attribute built on import before get_database
+        return get_database()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,60 @@
+import os
+import asyncio
+if os.name == 'nt':
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+import argparse
+import sys
+from pathlib import Path
+from app.core.config import CONFIG
+from app.database.db import Database
+from app.utils.service_import import import_services, iter_lines, SERVICE_IMPORT_FORMATS
+from app.utils.log import get_logger, setup_logging, shutdown_logging
+
+LOGGER = get_logger(__name__)
+
+# bulk imports services (and their appt types) for one host from a CSV or NDJSON file, e.g.
+# python -m app.database.db_import prod 1 services.csv
+# python -m app.database.db_import test 1 services.ndjson --format ndjson
+
+async def iter_file_chunks(path: Path, chunk_size: int = 1 << 20):
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+async def main(args) -> int:
+    if args.env == "prod":
+        db = Database(dbname = CONFIG.DATABASE_NAME, user = CONFIG.DATABASE_USERNAME, password = CONFIG.DATABASE_PASSWORD, host = CONFIG.DATABASE_HOSTNAME, port = CONFIG.DATABASE_PORT)
+    else:
+        db = Database(dbname = CONFIG.DATABASE_TEST_DB_NAME, user = CONFIG.DATABASE_TEST_DB_USERNAME, password = CONFIG.DATABASE_TEST_DB_PASSWORD, host = CONFIG.DATABASE_TEST_DB_HOSTNAME, port = CONFIG.DATABASE_TEST_DB_PORT, replica_host = None)
+
+    path = Path(args.path)
+    import_format = args.format or ("ndjson" if path.suffix in (".ndjson", ".jsonl") else "csv")
+
+    await db.db_open()
+    try:
+        if await db.get_user_by_user_id(args.host_id) is None:
+            print(f"User {args.host_id} not found")
+            return 1
+        result = await import_services(db, args.host_id, iter_lines(iter_file_chunks(path)), import_format, args.batch_size)
+    finally:
+        await db.db_close()
+
+    print(result.model_dump_json(indent = 2))
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Bulk import services (and their appt types) with COPY")
+    parser.add_argument("env", choices = ("prod", "test"))
+    parser.add_argument("host_id", type = int, help = "user_id of the host of the services")
+    parser.add_argument("path", help = "CSV (with header) or NDJSON file")
+    parser.add_argument("--format", choices = SERVICE_IMPORT_FORMATS, help = "defaults to ndjson for .ndjson/.jsonl files, else csv")
+    parser.add_argument("--batch-size", type = int, default = CONFIG.SERVICE_IMPORT_BATCH_SIZE, help = "rows per COPY")
+    setup_logging(log_format = "text")
+    try:
+        sys.exit(asyncio.run(main(parser.parse_args())))
+    except Exception as e:
+        LOGGER.exception("Import failed")
+        sys.exit(1)
+    finally:
+        shutdown_logging()
@@ -1,16 +1,19 @@
 import psycopg
 from app.core.config import CONFIG
-import traceback
 from psycopg.rows import dict_row
 from psycopg import sql
-from pathlib import Path
+from app.database.migrate import MigrationRunner
+from app.utils.log import get_logger, setup_logging, shutdown_logging
 import sys
 
+LOGGER = get_logger(__name__)
+
 def drop_database(dbname: str) -> None:
     
     if dbname == CONFIG.DATABASE_MAINT_DB_NAME:
         raise Exception(f"Tried to drop maintenance database: {CONFIG.DATABASE_MAINT_DB_NAME}")
     
+    conn = None
     try:
         conn = psycopg.connect(dbname = CONFIG.DATABASE_MAINT_DB_NAME, 
                                 user = CONFIG.DATABASE_MAINT_DB_USERNAME, 
@@ -29,7 +32,7 @@ def drop_database(dbname: str) -> None:
     except Exception as e:
         if conn:
             conn.close()
-        traceback.print_exc()
+        LOGGER.exception("Could not drop %s", dbname)
         raise e
     
 
@@ -66,36 +69,17 @@ def init_database(dbname: str,
                                 port = port,
                                 row_factory = dict_row
                                 )
-        with conn:
-            cur = conn.cursor()
-            
-            dir = Path(CONFIG.DATABASE_MIGRATIONS_RELATIVE_PATH)
-            f_list = list()
-            
-            # iterate through the files in the migrations directory, and store the filenames
-            for f in dir.iterdir():
-                if f.name.endswith(".up.sql"): # convention is that up-migrations end with up.sql, and down-migrations end with down.sql
-                    f_list.append(f.name)
-            
-            # want to run scripts in order
-            f_list.sort()
-            print(f_list)
-            
-            # execute each script
-            for f_name in f_list:
-                f_path = dir / f_name
-                with open(f_path, "r") as f:
-                    cur.execute(f.read())
-                    print(f"Executed {str(f_path)}")
-
-            cur.close()
+        # apply every migration, recording them in schema_migrations so that later ones can be applied incrementally with app/database/migrate.py
+        with conn, MigrationRunner(conn) as runner:
+            runner.upgrade()
     except Exception as e:
         if conn:
             conn.close() # if database did not set up correctly, do not want to continue
-        traceback.print_exc()
+        LOGGER.exception("Could not create %s", dbname)
         exit(1)
 
 if __name__ == "__main__":
+    setup_logging(log_format = "text")
     try:
         if sys.argv[1] == "prod":
             dbname = CONFIG.DATABASE_NAME
@@ -110,13 +94,14 @@ if __name__ == "__main__":
             host = CONFIG.DATABASE_TEST_DB_HOSTNAME
             port = CONFIG.DATABASE_TEST_DB_PORT
         else:
-            print("arg should only be prod or test")
+            LOGGER.error("arg should only be prod or test")
+            sys.exit(1)
 
-        drop_database(dbname= dbname)
-        print(f"Dropped {CONFIG.DATABASE_NAME}")
-        init_database(CONFIG.DATABASE_NAME)
-        print(f"Created {CONFIG.DATABASE_NAME}")    
-    except psycopg.Error as e:
-        traceback.print_exc()
+        drop_database(dbname = dbname)
+        LOGGER.info("Dropped %s", dbname)
+        init_database(dbname, user, password, host, port)
+        LOGGER.info("Created %s", dbname)
     except Exception as e:
-        traceback.print_exc()
\ No newline at end of file
+        LOGGER.exception("Could not initialize the database")
+    finally:
+        shutdown_logging()
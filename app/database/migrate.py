@@ -0,0 +1,289 @@
+import argparse
+import hashlib
+import re
+import sys
+from pathlib import Path
+import psycopg
+from psycopg import sql
+from psycopg.rows import dict_row
+from app.core.config import CONFIG
+from app.utils.log import get_logger, setup_logging, shutdown_logging
+
+LOGGER = get_logger(__name__)
+
+# migrations are files named _<version>_<name>.up.sql (and .down.sql to revert), applied in version order
+MIGRATION_FILE_NAME_PATTERN = re.compile(r"^_(?P<version>\d+)_(?P<name>.+)\.up\.sql$")
+
+# a migration starting with this line is run outside of a transaction, one statement at a time (needed e.g. for CREATE INDEX CONCURRENTLY)
+NO_TRANSACTION_DIRECTIVE = "-- migrate:no-transaction"
+
+# key of the advisory lock that keeps two runners from migrating the same database at once
+MIGRATION_ADVISORY_LOCK_KEY = 7_410_263_001
+
+class MigrationError(Exception):
+    pass
+
+class Migration:
+    __slots__ = ("version", "name", "up_path", "down_path", "up_sql", "checksum", "is_transactional")
+
+    def __init__(self, version: str, name: str, up_path: Path, down_path: Path | None):
+        self.version = version
+        self.name = name
+        self.up_path = up_path
+        self.down_path = down_path
+        self.up_sql = up_path.read_text()
+        self.checksum = hashlib.sha256(self.up_sql.encode("utf-8")).hexdigest()
+        self.is_transactional = not self.up_sql.lstrip().startswith(NO_TRANSACTION_DIRECTIVE)
+
+    def __repr__(self) -> str:
+        return f"{self.version}_{self.name}"
+
+def get_migrations(dir: Path | None = None) -> list:
+    """
+    :param Path dir: directory with the migration files; defaults to DATABASE_MIGRATIONS_RELATIVE_PATH
+    :return: the migrations, in version order
+    :rtype: list[Migration]
+    """
+    dir = dir if dir is not None else Path(CONFIG.DATABASE_MIGRATIONS_RELATIVE_PATH)
+    migrations = list()
+    for f in dir.iterdir():
+        match = MIGRATION_FILE_NAME_PATTERN.match(f.name)
+        if match is None:
+            continue
+        down_path = f.with_name(f.name[:-len(".up.sql")] + ".down.sql")
+        migrations.append(Migration(match.group("version"), match.group("name"), f, down_path if down_path.exists() else None))
+    migrations.sort(key = lambda migration: int(migration.version))
+    for (previous, migration) in zip(migrations, migrations[1:]):
+        if int(previous.version) == int(migration.version):
+            raise MigrationError(f"Migrations {previous} and {migration} have the same version")
+    return migrations
+
+def split_sql_statements(script: str) -> list:
+    """
+    Splits a SQL script into its statements, on semicolons outside of comments, quotes and dollar-quoted bodies.
+    Needed for non-transactional migrations, since a multi-statement query string is run by the server as one implicit transaction.
+
+    :param str script: SQL script
+    :return: the statements, without the trailing semicolons
+    :rtype: list[str]
+    """
+    statements = list()
+    start = 0
+    i = 0
+    n = len(script)
+    while i < n:
+        if script.startswith("--", i): # line comment
+            end = script.find("\n", i)
+            i = n if end == -1 else end + 1
+        elif script.startswith("/*", i): # block comment
+            end = script.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+        elif script[i] in ("'", '"'): # quoted literal or identifier; doubled quotes escape themselves, so skipping to the next quote works
+            end = script.find(script[i], i + 1)
+            i = n if end == -1 else end + 1
+        elif script[i] == "$" and (match := re.match(r"\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$", script[i:])): # dollar quote
+            end = script.find(match.group(0), i + len(match.group(0)))
+            i = n if end == -1 else end + len(match.group(0))
+        elif script[i] == ";":
+            statements.append(script[start:i])
+            i += 1
+            start = i
+        else:
+            i += 1
+    statements.append(script[start:])
+    # drop what is only whitespace and comments
+    return [statement.strip() for statement in statements if re.sub(r"--[^\n]*", "", statement).strip()]
+
+class MigrationRunner:
+    """
+    Applies and reverts migrations on a database, recording the applied ones (with the checksum of their .up.sql) in schema_migrations.
+    Transactional migrations run in one transaction each, together with their schema_migrations row, so a failure leaves nothing half applied.
+    Migrations starting with NO_TRANSACTION_DIRECTIVE run one statement at a time in autocommit, so they can build indexes with CREATE INDEX CONCURRENTLY (which does not block writes to the table); if one fails partway, it must be written so it can simply be run again (IF NOT EXISTS / IF EXISTS), noting that a failed CREATE INDEX CONCURRENTLY leaves an INVALID index to drop first.
+    """
+
+    def __init__(self, conn: psycopg.Connection, migrations: list | None = None, lock_timeout_ms: int | None = None, out = print):
+        """
+        :param Connection conn: connection to the database to migrate; switched to autocommit
+        :param list migrations: the migrations; defaults to those in DATABASE_MIGRATIONS_RELATIVE_PATH
+        :param int lock_timeout_ms: lock_timeout of the statements of the migrations, so that a migration waiting for a lock fails instead of blocking the queries queued behind it; 0 for no timeout; defaults to DATABASE_MIGRATIONS_LOCK_TIMEOUT_MS
+        :param out: function called with each line of output
+        """
+        self.conn = conn
+        self.conn.autocommit = True
+        self.conn.row_factory = dict_row
+        self.migrations = migrations if migrations is not None else get_migrations()
+        self.lock_timeout_ms = lock_timeout_ms if lock_timeout_ms is not None else CONFIG.DATABASE_MIGRATIONS_LOCK_TIMEOUT_MS
+        self.out = out
+
+    def __enter__(self) -> "MigrationRunner":
+        self.conn.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_ADVISORY_LOCK_KEY, ))
+        self.conn.execute(sql.SQL("SET lock_timeout = {lock_timeout};").format(lock_timeout = sql.Literal(f"{int(self.lock_timeout_ms)}ms")))
+        self.conn.execute(
+            """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    checksum TEXT NOT NULL,
+                    applied_at TIMESTAMP NOT NULL DEFAULT (now() at time zone 'utc')
+                );
+            """
+        )
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.conn.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_ADVISORY_LOCK_KEY, ))
+
+    def get_applied(self) -> dict:
+        """
+        :return: mapping of version to schema_migrations row of each applied migration
+        :rtype: dict
+        """
+        rows = self.conn.execute("SELECT * FROM schema_migrations ORDER BY version;").fetchall()
+        return {row["version"]: row for row in rows}
+
+    def _get_migration(self, version: str) -> Migration:
+        for migration in self.migrations:
+            if int(migration.version) == int(version):
+                return migration
+        raise MigrationError(f"Unknown migration version {version}")
+
+    def verify(self) -> None:
+        """
+        Raises MigrationError if an applied migration is missing or its .up.sql changed since it was applied.
+        """
+        migrations_by_version = {migration.version: migration for migration in self.migrations}
+        for (version, row) in self.get_applied().items():
+            migration = migrations_by_version.get(version)
+            if migration is None:
+                raise MigrationError(f"Applied migration {version}_{row['name']} has no file")
+            if migration.checksum != row["checksum"]:
+                raise MigrationError(f"Checksum of {migration} changed since it was applied; add a new migration instead of editing it")
+
+    def get_status(self) -> list:
+        """
+        :return: (migration, applied_at or None) for each migration
+        :rtype: list[tuple]
+        """
+        applied = self.get_applied()
+        return [(migration, applied[migration.version]["applied_at"] if migration.version in applied else None) for migration in self.migrations]
+
+    def _run(self, script: str, is_transactional: bool, record_query: str, record_params: tuple) -> None:
+        """
+        Runs a migration script, and the query that records it in schema_migrations (in the same transaction, if transactional).
+        """
+        if is_transactional:
+            with self.conn.transaction():
+                self.conn.execute(script)
+                self.conn.execute(record_query, record_params)
+        else:
+            for statement in split_sql_statements(script):
+                self.conn.execute(statement)
+            self.conn.execute(record_query, record_params)
+
+    def upgrade(self, target: str | None = None, dry_run: bool = False) -> list:
+        """
+        Applies the pending migrations up to and including target, in version order.
+
+        :param str target: version to migrate up to; None for the latest
+        :param bool dry_run: if True, only prints what would be applied
+        :return: the migrations applied (or that would be applied)
+        :rtype: list[Migration]
+        """
+        self.verify()
+        applied = self.get_applied()
+        target_version = int(self._get_migration(target).version) if target is not None else None
+        pending = [migration for migration in self.migrations if migration.version not in applied and (target_version is None or int(migration.version) <= target_version)]
+
+        for migration in pending:
+            self.out(f"{'Would apply' if dry_run else 'Applying'} {migration}{'' if migration.is_transactional else ' (no transaction)'}")
+            if dry_run:
+                continue
+            self._run(
+                migration.up_sql,
+                migration.is_transactional,
+                "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s);",
+                (migration.version, migration.name, migration.checksum, )
+            )
+        return pending
+
+    def downgrade(self, target: str, dry_run: bool = False) -> list:
+        """
+        Reverts the applied migrations after target with their .down.sql, in reverse version order.
+
+        :param str target: version to migrate down to (it stays applied); "0" to revert all
+        :param bool dry_run: if True, only prints what would be reverted
+        :return: the migrations reverted (or that would be reverted)
+        :rtype: list[Migration]
+        """
+        self.verify()
+        applied = self.get_applied()
+        to_revert = [migration for migration in reversed(self.migrations) if migration.version in applied and int(migration.version) > int(target)]
+
+        for migration in to_revert:
+            if migration.down_path is None:
+                raise MigrationError(f"{migration} has no .down.sql")
+            down_sql = migration.down_path.read_text()
+            is_transactional = not down_sql.lstrip().startswith(NO_TRANSACTION_DIRECTIVE)
+            self.out(f"{'Would revert' if dry_run else 'Reverting'} {migration}{'' if is_transactional else ' (no transaction)'}")
+            if dry_run:
+                continue
+            self._run(
+                down_sql,
+                is_transactional,
+                "DELETE FROM schema_migrations WHERE version = %s;",
+                (migration.version, )
+            )
+        return to_revert
+
+    def baseline(self, target: str) -> list:
+        """
+        Records the migrations up to and including target as applied without running them, for a database whose schema was set up before schema_migrations existed.
+
+        :param str target: last version already in the database
+        :return: the migrations recorded
+        :rtype: list[Migration]
+        """
+        applied = self.get_applied()
+        target_version = int(self._get_migration(target).version)
+        to_record = [migration for migration in self.migrations if migration.version not in applied and int(migration.version) <= target_version]
+        with self.conn.transaction():
+            for migration in to_record:
+                self.out(f"Recording {migration} as applied")
+                self.conn.execute(
+                    "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s);",
+                    (migration.version, migration.name, migration.checksum, )
+                )
+        return to_record
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Apply or revert migrations, recorded in schema_migrations")
+    parser.add_argument("env", choices = ("prod", "test"))
+    parser.add_argument("command", choices = ("status", "up", "down", "baseline"))
+    parser.add_argument("--target", help = "version to migrate to (required for down and baseline; down keeps the target applied, 0 reverts all)")
+    parser.add_argument("--dry-run", action = "store_true", help = "only print what would be applied or reverted")
+    args = parser.parse_args()
+
+    if args.env == "prod":
+        conninfo = {"dbname": CONFIG.DATABASE_NAME, "user": CONFIG.DATABASE_USERNAME, "password": CONFIG.DATABASE_PASSWORD, "host": CONFIG.DATABASE_HOSTNAME, "port": CONFIG.DATABASE_PORT}
+    else:
+        conninfo = {"dbname": CONFIG.DATABASE_TEST_DB_NAME, "user": CONFIG.DATABASE_TEST_DB_USERNAME, "password": CONFIG.DATABASE_TEST_DB_PASSWORD, "host": CONFIG.DATABASE_TEST_DB_HOSTNAME, "port": CONFIG.DATABASE_TEST_DB_PORT}
+    if args.command in ("down", "baseline") and args.target is None:
+        parser.error(f"{args.command} requires --target")
+
+    setup_logging(log_format = "text")
+    try:
+        with psycopg.connect(**conninfo) as conn, MigrationRunner(conn) as runner:
+            if args.command == "status":
+                for (migration, applied_at) in runner.get_status():
+                    print(f"{migration}: {applied_at if applied_at is not None else 'pending'}")
+            elif args.command == "up":
+                runner.upgrade(args.target, dry_run = args.dry_run)
+            elif args.command == "down":
+                runner.downgrade(args.target, dry_run = args.dry_run)
+            else:
+                runner.baseline(args.target)
+    except Exception as e:
+        LOGGER.exception("Migration failed")
+        sys.exit(1)
+    finally:
+        shutdown_logging()
@@ -0,0 +1,8 @@
+-- Revert table appts to text appointment times
+ALTER TABLE appts DROP CONSTRAINT IF EXISTS appts_no_overlap;
+
+ALTER TABLE appts DROP COLUMN IF EXISTS appt_during;
+
+ALTER TABLE appts
+    ALTER COLUMN appt_starts_at TYPE TEXT USING appt_starts_at::TEXT,
+    ALTER COLUMN appt_ends_at TYPE TEXT USING appt_ends_at::TEXT;
\ No newline at end of file
@@ -0,0 +1,32 @@
+-- Alter table appts to store appointment times as timestamps, with a range column and an exclusion constraint so that conflicting appointments cannot be inserted
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+ALTER TABLE appts
+    ALTER COLUMN appt_starts_at TYPE TIMESTAMP USING appt_starts_at::TIMESTAMP,
+    ALTER COLUMN appt_ends_at TYPE TIMESTAMP USING appt_ends_at::TIMESTAMP;
+
+ALTER TABLE appts
+    ADD COLUMN appt_during TSRANGE GENERATED ALWAYS AS (tsrange(appt_starts_at, appt_ends_at, '[)')) STORED;
+
+-- Check that no existing appointments overlap (same service and appt type, overlapping times), since adding the exclusion constraint would abort on them:
+-- if some do, the migration fails listing their appt_id pairs (up to 100), to be resolved (e.g. cancel or move one of each pair) before running it again
+DO $$
+DECLARE
+    overlap_count INTEGER;
+    overlap_pairs TEXT;
+BEGIN
+    SELECT count(*), string_agg(format('(%s, %s)', first_appt_id, second_appt_id), ', ' ORDER BY first_appt_id, second_appt_id) FILTER (WHERE pair_number <= 100)
+    INTO overlap_count, overlap_pairs
+    FROM (
+        SELECT a.appt_id AS first_appt_id, b.appt_id AS second_appt_id, row_number() OVER (ORDER BY a.appt_id, b.appt_id) AS pair_number
+        FROM appts a
+        JOIN appts b ON b.service_id = a.service_id AND b.appt_type_name = a.appt_type_name AND b.appt_id > a.appt_id AND b.appt_during && a.appt_during
+    ) overlapping_appts;
+    IF overlap_count > 0 THEN
+        RAISE EXCEPTION 'Cannot add constraint appts_no_overlap: % pairs of appointments overlap', overlap_count
+            USING DETAIL = format('Overlapping (appt_id, appt_id) pairs: %s', overlap_pairs), HINT = 'Cancel or move one appointment of each pair, then run the migration again.';
+    END IF;
+END $$;
+
+ALTER TABLE appts
+    ADD CONSTRAINT appts_no_overlap EXCLUDE USING gist (service_id WITH =, appt_type_name WITH =, appt_during WITH &&);
\ No newline at end of file
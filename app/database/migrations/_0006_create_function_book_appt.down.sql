@@ -0,0 +1,4 @@
+-- Drop functions book_appt, is_within_service_hours and service_hours_on_isodow
+DROP FUNCTION IF EXISTS book_appt(INTEGER, INTEGER, TEXT, TIMESTAMP);
+DROP FUNCTION IF EXISTS is_within_service_hours(services, TIMESTAMP, TIMESTAMP);
+DROP FUNCTION IF EXISTS service_hours_on_isodow(services, INTEGER);
\ No newline at end of file
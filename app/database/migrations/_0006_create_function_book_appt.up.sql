@@ -0,0 +1,102 @@
+-- Create function service_hours_on_isodow, which gets the opening hours of a service on a weekday (1 = Monday, 7 = Sunday)
+CREATE OR REPLACE FUNCTION service_hours_on_isodow(s services, p_isodow INTEGER, OUT is_open INTEGER, OUT open_time TIME, OUT close_time TIME)
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT
+        CASE p_isodow WHEN 1 THEN s.is_open_mo WHEN 2 THEN s.is_open_tu WHEN 3 THEN s.is_open_we WHEN 4 THEN s.is_open_th WHEN 5 THEN s.is_open_fr WHEN 6 THEN s.is_open_sa WHEN 7 THEN s.is_open_su END,
+        (CASE p_isodow WHEN 1 THEN s.open_time_mo WHEN 2 THEN s.open_time_tu WHEN 3 THEN s.open_time_we WHEN 4 THEN s.open_time_th WHEN 5 THEN s.open_time_fr WHEN 6 THEN s.open_time_sa WHEN 7 THEN s.open_time_su END)::TIME,
+        (CASE p_isodow WHEN 1 THEN s.close_time_mo WHEN 2 THEN s.close_time_tu WHEN 3 THEN s.close_time_we WHEN 4 THEN s.close_time_th WHEN 5 THEN s.close_time_fr WHEN 6 THEN s.close_time_sa WHEN 7 THEN s.close_time_su END)::TIME;
+$$;
+
+-- Create function is_within_service_hours, which mirrors the opening hours check of service_appt_create
+CREATE OR REPLACE FUNCTION is_within_service_hours(s services, p_appt_starts_at TIMESTAMP, p_appt_ends_at TIMESTAMP)
+RETURNS BOOLEAN
+LANGUAGE plpgsql IMMUTABLE AS $$
+DECLARE
+    h RECORD;
+    d DATE;
+BEGIN
+    -- start day
+    h := service_hours_on_isodow(s, EXTRACT(ISODOW FROM p_appt_starts_at)::INTEGER);
+    IF h.is_open = 0 OR p_appt_starts_at::TIME < h.open_time OR p_appt_starts_at::TIME > h.close_time THEN
+        RETURN FALSE;
+    END IF;
+
+    -- inbetween days must be open the whole day; only the first 7 need checking since weekdays repeat
+    d := p_appt_starts_at::DATE + 1;
+    WHILE d < p_appt_ends_at::DATE AND d <= p_appt_starts_at::DATE + 7 LOOP
+        h := service_hours_on_isodow(s, EXTRACT(ISODOW FROM d)::INTEGER);
+        IF h.is_open = 0 OR h.open_time <> '00:00:00' OR h.close_time <> '23:59:59' THEN
+            RETURN FALSE;
+        END IF;
+        d := d + 1;
+    END LOOP;
+
+    -- last day
+    h := service_hours_on_isodow(s, EXTRACT(ISODOW FROM p_appt_ends_at)::INTEGER);
+    IF h.is_open = 0 OR p_appt_ends_at::TIME < h.open_time OR p_appt_ends_at::TIME > h.close_time THEN
+        RETURN FALSE;
+    END IF;
+
+    RETURN TRUE;
+END;
+$$;
+
+-- Create function book_appt, which does the service lookup, duration lookup, opening hours check, conflict check and insert in one round trip
+-- booking_status is one of: booked, service_not_found, appt_type_not_found, invalid_time, conflict (the appt columns are only set when booked)
+CREATE OR REPLACE FUNCTION book_appt(p_user_id INTEGER, p_service_id INTEGER, p_appt_type_name TEXT, p_appt_starts_at TIMESTAMP)
+RETURNS TABLE (
+    booking_status TEXT,
+    appt_id INTEGER,
+    user_id INTEGER,
+    service_id INTEGER,
+    appt_type_name TEXT,
+    appt_starts_at TIMESTAMP,
+    appt_ends_at TIMESTAMP,
+    created_at TIMESTAMP,
+    updated_at TIMESTAMP
+)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_service services%ROWTYPE;
+    v_appt_duration_minutes INTEGER;
+    v_appt_ends_at TIMESTAMP;
+BEGIN
+    SELECT * INTO v_service FROM services WHERE services.service_id = p_service_id;
+    IF NOT FOUND THEN
+        booking_status := 'service_not_found';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    SELECT appt_types.appt_duration_minutes INTO v_appt_duration_minutes
+    FROM appt_types
+    WHERE appt_types.service_id = p_service_id AND appt_types.appt_type_name = p_appt_type_name;
+    IF NOT FOUND THEN
+        booking_status := 'appt_type_not_found';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    v_appt_ends_at := p_appt_starts_at + make_interval(mins => v_appt_duration_minutes);
+    IF NOT is_within_service_hours(v_service, p_appt_starts_at, v_appt_ends_at) THEN
+        booking_status := 'invalid_time';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    BEGIN
+        INSERT INTO appts AS a (user_id, service_id, appt_type_name, appt_starts_at, appt_ends_at)
+        VALUES (p_user_id, p_service_id, p_appt_type_name, p_appt_starts_at, v_appt_ends_at)
+        RETURNING a.appt_id, a.user_id, a.service_id, a.appt_type_name, a.appt_starts_at, a.appt_ends_at, a.created_at, a.updated_at
+        INTO appt_id, user_id, service_id, appt_type_name, appt_starts_at, appt_ends_at, created_at, updated_at;
+    EXCEPTION WHEN exclusion_violation THEN -- appts_no_overlap
+        booking_status := 'conflict';
+        RETURN NEXT;
+        RETURN;
+    END;
+
+    booking_status := 'booked';
+    RETURN NEXT;
+END;
+$$;
\ No newline at end of file
@@ -0,0 +1,3 @@
+-- migrate:no-transaction
+-- Drop index on services for listing the services of a host
+DROP INDEX CONCURRENTLY IF EXISTS services_host_id_service_id_idx;
\ No newline at end of file
@@ -0,0 +1,3 @@
+-- migrate:no-transaction
+-- Create index on services for listing the services of a host in service_id order (keyset pagination); CONCURRENTLY, so that services stays writable while it builds
+CREATE INDEX CONCURRENTLY IF NOT EXISTS services_host_id_service_id_idx ON services (host_id, service_id);
\ No newline at end of file
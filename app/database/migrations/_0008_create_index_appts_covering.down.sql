@@ -0,0 +1,5 @@
+-- migrate:no-transaction
+-- Drop covering indexes on appts
+DROP INDEX CONCURRENTLY IF EXISTS appts_user_id_appt_starts_at_idx;
+
+DROP INDEX CONCURRENTLY IF EXISTS appts_service_id_appt_starts_at_idx;
\ No newline at end of file
@@ -0,0 +1,5 @@
+-- migrate:no-transaction
+-- Create covering indexes on appts for listing the appointments of a patron or of a service in time order, so that they are index-only scans; CONCURRENTLY, so that appts stays writable while they build
+CREATE INDEX CONCURRENTLY IF NOT EXISTS appts_user_id_appt_starts_at_idx ON appts (user_id, appt_starts_at, appt_id) INCLUDE (service_id, appt_type_name, appt_ends_at, created_at, updated_at);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS appts_service_id_appt_starts_at_idx ON appts (service_id, appt_starts_at, appt_id) INCLUDE (user_id, appt_type_name, appt_ends_at, created_at, updated_at);
\ No newline at end of file
@@ -0,0 +1,29 @@
+-- Drop functions is_within_service_hours (TSRANGE) and is_service_open_at
+DROP FUNCTION IF EXISTS is_within_service_hours(services, TSRANGE);
+DROP FUNCTION IF EXISTS is_service_open_at(services, TIMESTAMP);
+
+-- Alter table services, storing the opening and closing times as TEXT again
+ALTER TABLE services
+    ALTER COLUMN open_time_mo TYPE TEXT USING to_char(open_time_mo, 'HH24:MI:SS'),
+    ALTER COLUMN close_time_mo TYPE TEXT USING to_char(close_time_mo, 'HH24:MI:SS'),
+    ALTER COLUMN open_time_tu TYPE TEXT USING to_char(open_time_tu, 'HH24:MI:SS'),
+    ALTER COLUMN close_time_tu TYPE TEXT USING to_char(close_time_tu, 'HH24:MI:SS'),
+    ALTER COLUMN open_time_we TYPE TEXT USING to_char(open_time_we, 'HH24:MI:SS'),
+    ALTER COLUMN close_time_we TYPE TEXT USING to_char(close_time_we, 'HH24:MI:SS'),
+    ALTER COLUMN open_time_th TYPE TEXT USING to_char(open_time_th, 'HH24:MI:SS'),
+    ALTER COLUMN close_time_th TYPE TEXT USING to_char(close_time_th, 'HH24:MI:SS'),
+    ALTER COLUMN open_time_fr TYPE TEXT USING to_char(open_time_fr, 'HH24:MI:SS'),
+    ALTER COLUMN close_time_fr TYPE TEXT USING to_char(close_time_fr, 'HH24:MI:SS'),
+    ALTER COLUMN open_time_sa TYPE TEXT USING to_char(open_time_sa, 'HH24:MI:SS'),
+    ALTER COLUMN close_time_sa TYPE TEXT USING to_char(close_time_sa, 'HH24:MI:SS'),
+    ALTER COLUMN open_time_su TYPE TEXT USING to_char(open_time_su, 'HH24:MI:SS'),
+    ALTER COLUMN close_time_su TYPE TEXT USING to_char(close_time_su, 'HH24:MI:SS');
+
+-- Replace function service_hours_on_isodow, which casts the times again
+CREATE OR REPLACE FUNCTION service_hours_on_isodow(s services, p_isodow INTEGER, OUT is_open INTEGER, OUT open_time TIME, OUT close_time TIME)
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT
+        CASE p_isodow WHEN 1 THEN s.is_open_mo WHEN 2 THEN s.is_open_tu WHEN 3 THEN s.is_open_we WHEN 4 THEN s.is_open_th WHEN 5 THEN s.is_open_fr WHEN 6 THEN s.is_open_sa WHEN 7 THEN s.is_open_su END,
+        (CASE p_isodow WHEN 1 THEN s.open_time_mo WHEN 2 THEN s.open_time_tu WHEN 3 THEN s.open_time_we WHEN 4 THEN s.open_time_th WHEN 5 THEN s.open_time_fr WHEN 6 THEN s.open_time_sa WHEN 7 THEN s.open_time_su END)::TIME,
+        (CASE p_isodow WHEN 1 THEN s.close_time_mo WHEN 2 THEN s.close_time_tu WHEN 3 THEN s.close_time_we WHEN 4 THEN s.close_time_th WHEN 5 THEN s.close_time_fr WHEN 6 THEN s.close_time_sa WHEN 7 THEN s.close_time_su END)::TIME;
+$$;
\ No newline at end of file
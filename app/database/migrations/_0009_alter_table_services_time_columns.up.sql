@@ -0,0 +1,40 @@
+-- Alter table services, storing the opening and closing times as TIME (checked and parsed once on write) instead of TEXT
+ALTER TABLE services
+    ALTER COLUMN open_time_mo TYPE TIME USING open_time_mo::TIME,
+    ALTER COLUMN close_time_mo TYPE TIME USING close_time_mo::TIME,
+    ALTER COLUMN open_time_tu TYPE TIME USING open_time_tu::TIME,
+    ALTER COLUMN close_time_tu TYPE TIME USING close_time_tu::TIME,
+    ALTER COLUMN open_time_we TYPE TIME USING open_time_we::TIME,
+    ALTER COLUMN close_time_we TYPE TIME USING close_time_we::TIME,
+    ALTER COLUMN open_time_th TYPE TIME USING open_time_th::TIME,
+    ALTER COLUMN close_time_th TYPE TIME USING close_time_th::TIME,
+    ALTER COLUMN open_time_fr TYPE TIME USING open_time_fr::TIME,
+    ALTER COLUMN close_time_fr TYPE TIME USING close_time_fr::TIME,
+    ALTER COLUMN open_time_sa TYPE TIME USING open_time_sa::TIME,
+    ALTER COLUMN close_time_sa TYPE TIME USING close_time_sa::TIME,
+    ALTER COLUMN open_time_su TYPE TIME USING open_time_su::TIME,
+    ALTER COLUMN close_time_su TYPE TIME USING close_time_su::TIME;
+
+-- Replace function service_hours_on_isodow, which no longer needs to cast the times
+CREATE OR REPLACE FUNCTION service_hours_on_isodow(s services, p_isodow INTEGER, OUT is_open INTEGER, OUT open_time TIME, OUT close_time TIME)
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT
+        CASE p_isodow WHEN 1 THEN s.is_open_mo WHEN 2 THEN s.is_open_tu WHEN 3 THEN s.is_open_we WHEN 4 THEN s.is_open_th WHEN 5 THEN s.is_open_fr WHEN 6 THEN s.is_open_sa WHEN 7 THEN s.is_open_su END,
+        CASE p_isodow WHEN 1 THEN s.open_time_mo WHEN 2 THEN s.open_time_tu WHEN 3 THEN s.open_time_we WHEN 4 THEN s.open_time_th WHEN 5 THEN s.open_time_fr WHEN 6 THEN s.open_time_sa WHEN 7 THEN s.open_time_su END,
+        CASE p_isodow WHEN 1 THEN s.close_time_mo WHEN 2 THEN s.close_time_tu WHEN 3 THEN s.close_time_we WHEN 4 THEN s.close_time_th WHEN 5 THEN s.close_time_fr WHEN 6 THEN s.close_time_sa WHEN 7 THEN s.close_time_su END;
+$$;
+
+-- Create function is_service_open_at, which checks whether a service is open at a timestamp (e.g. WHERE is_service_open_at(s, now() at time zone 'utc'))
+CREATE OR REPLACE FUNCTION is_service_open_at(s services, p_at TIMESTAMP)
+RETURNS BOOLEAN
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT h.is_open = 1 AND p_at::TIME BETWEEN h.open_time AND h.close_time
+    FROM service_hours_on_isodow(s, EXTRACT(ISODOW FROM p_at)::INTEGER) h;
+$$;
+
+-- Create function is_within_service_hours for an appointment interval as a TSRANGE (e.g. appts.appt_during)
+CREATE OR REPLACE FUNCTION is_within_service_hours(s services, p_appt_during TSRANGE)
+RETURNS BOOLEAN
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT is_within_service_hours(s, lower(p_appt_during), upper(p_appt_during));
+$$;
\ No newline at end of file
@@ -0,0 +1,2 @@
+-- Drop table idempotency_keys
+DROP TABLE IF EXISTS idempotency_keys;
\ No newline at end of file
@@ -0,0 +1,17 @@
+-- Create table idempotency_keys, which stores the response of each create request sent with an Idempotency-Key header, so that a retry gets it again instead of creating twice
+-- response_status_code is NULL while the first request with the key is in progress
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    user_id INTEGER NOT NULL,
+    idempotency_key TEXT NOT NULL,
+    route TEXT NOT NULL,
+    request_hash TEXT NOT NULL,
+    response_status_code INTEGER,
+    response_body BYTEA,
+    created_at TIMESTAMP NOT NULL DEFAULT (now() at time zone 'utc'),
+    completed_at TIMESTAMP,
+    PRIMARY KEY (user_id, idempotency_key),
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+-- Create index on idempotency_keys for deleting the expired keys
+CREATE INDEX IF NOT EXISTS idempotency_keys_created_at_idx ON idempotency_keys (created_at);
\ No newline at end of file
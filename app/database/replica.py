@@ -0,0 +1,71 @@
+import contextlib
+import contextvars
+import functools
+import inspect
+import psycopg
+
+# lag of a replica behind its primary; 0 when it has replayed everything it received (an idle primary does not make it lag), and when it is not a standby at all
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END AS lag_seconds;
+"""
+
+# set once the current request (asyncio context) has written, so its later reads see its own writes
+_USE_PRIMARY = contextvars.ContextVar("use_primary", default = False)
+
+@contextlib.contextmanager
+def read_from_primary():
+    """
+    Routes the reads in the block (in the current asyncio context) to the primary, e.g. right after a write made through another Database.
+    """
+    token = _USE_PRIMARY.set(True)
+    try:
+        yield
+    finally:
+        _USE_PRIMARY.reset(token)
+
+def is_reading_from_primary() -> bool:
+    return _USE_PRIMARY.get()
+
+def writes_primary(method):
+    """
+    Decorator for a Database method that writes: the later reads of the current request (asyncio context) go to the primary (read-your-writes).
+    """
+    if inspect.isasyncgenfunction(method):
+        raise TypeError("writes_primary does not support async generators")
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        _USE_PRIMARY.set(True)
+        return await method(self, *args, **kwargs)
+    return wrapper
+
+def reads_replica(retry_on_none: bool = False):
+    """
+    Decorator for a Database method that only reads, and gets its pool from Database.get_read_pool: the replica when it is usable, else the primary.
+    If the replica fails (e.g. it went down since the last health check), it is marked unhealthy and the method is retried on the primary.
+    An async generator cannot be retried once it has yielded, so it only gets the routing.
+
+    :param bool retry_on_none: if True, a None result from the replica (e.g. a row inserted by another request, not replicated yet) is retried on the primary
+    """
+    def decorator(method):
+        if inspect.isasyncgenfunction(method):
+            return method
+
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            if self.get_read_pool() is self.pool:
+                return await method(self, *args, **kwargs)
+            try:
+                res = await method(self, *args, **kwargs)
+            except psycopg.OperationalError as e: # includes PoolTimeout
+                self.set_replica_health(False, f"{type(e).__name__}: {e}")
+            else:
+                if not (retry_on_none and res is None):
+                    return res
+            with read_from_primary():
+                return await method(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,3 +1,6 @@
+-- Requires extension btree_gist (for the exclusion constraint on appts)
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
 -- Create table users
 CREATE TABLE users (
     user_id SERIAL PRIMARY KEY,
@@ -19,26 +22,26 @@ CREATE TABLE IF NOT EXISTS services (
     zip_code TEXT NOT NULL,
     phone_number TEXT NOT NULL,
     is_open_mo INTEGER NOT NULL DEFAULT 0,
-    open_time_mo TEXT NOT NULL,
-    close_time_mo TEXT NOT NULL,
+    open_time_mo TIME NOT NULL,
+    close_time_mo TIME NOT NULL,
     is_open_tu INTEGER NOT NULL DEFAULT 0,
-    open_time_tu TEXT NOT NULL,
-    close_time_tu TEXT NOT NULL,
+    open_time_tu TIME NOT NULL,
+    close_time_tu TIME NOT NULL,
     is_open_we INTEGER NOT NULL DEFAULT 0,
-    open_time_we TEXT NOT NULL,
-    close_time_we TEXT NOT NULL,
+    open_time_we TIME NOT NULL,
+    close_time_we TIME NOT NULL,
     is_open_th INTEGER NOT NULL DEFAULT 0,
-    open_time_th TEXT NOT NULL,
-    close_time_th TEXT NOT NULL,
+    open_time_th TIME NOT NULL,
+    close_time_th TIME NOT NULL,
     is_open_fr INTEGER NOT NULL DEFAULT 0,
-    open_time_fr TEXT NOT NULL,
-    close_time_fr TEXT NOT NULL,
+    open_time_fr TIME NOT NULL,
+    close_time_fr TIME NOT NULL,
     is_open_sa INTEGER NOT NULL DEFAULT 0,
-    open_time_sa TEXT NOT NULL,
-    close_time_sa TEXT NOT NULL,
+    open_time_sa TIME NOT NULL,
+    close_time_sa TIME NOT NULL,
     is_open_su INTEGER NOT NULL DEFAULT 0,
-    open_time_su TEXT NOT NULL,
-    close_time_su TEXT NOT NULL,
+    open_time_su TIME NOT NULL,
+    close_time_su TIME NOT NULL,
     created_at TIMESTAMP NOT NULL DEFAULT (now() at time zone 'utc'),
     updated_at TIMESTAMP NOT NULL DEFAULT (now() at time zone 'utc'),
     UNIQUE (phone_number),
@@ -64,11 +67,157 @@ CREATE TABLE IF NOT EXISTS appts (
     user_id INTEGER NOT NULL,
     service_id INTEGER NOT NULL,
     appt_type_name TEXT NOT NULL,
-    appt_starts_at TEXT NOT NULL,
-    appt_ends_at TEXT NOT NULL,
+    appt_starts_at TIMESTAMP NOT NULL,
+    appt_ends_at TIMESTAMP NOT NULL,
+    appt_during TSRANGE GENERATED ALWAYS AS (tsrange(appt_starts_at, appt_ends_at, '[)')) STORED,
     created_at TIMESTAMP NOT NULL DEFAULT (now() at time zone 'utc'),
     updated_at TIMESTAMP NOT NULL DEFAULT (now() at time zone 'utc'),
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
     FOREIGN KEY (service_id) REFERENCES services(service_id) ON DELETE CASCADE,
-    FOREIGN KEY (service_id, appt_type_name) REFERENCES appt_types(service_id, appt_type_name) ON DELETE CASCADE
-);
\ No newline at end of file
+    FOREIGN KEY (service_id, appt_type_name) REFERENCES appt_types(service_id, appt_type_name) ON DELETE CASCADE,
+    CONSTRAINT appts_no_overlap EXCLUDE USING gist (service_id WITH =, appt_type_name WITH =, appt_during WITH &&)
+);
+
+-- Create function service_hours_on_isodow, which gets the opening hours of a service on a weekday (1 = Monday, 7 = Sunday)
+CREATE OR REPLACE FUNCTION service_hours_on_isodow(s services, p_isodow INTEGER, OUT is_open INTEGER, OUT open_time TIME, OUT close_time TIME)
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT
+        CASE p_isodow WHEN 1 THEN s.is_open_mo WHEN 2 THEN s.is_open_tu WHEN 3 THEN s.is_open_we WHEN 4 THEN s.is_open_th WHEN 5 THEN s.is_open_fr WHEN 6 THEN s.is_open_sa WHEN 7 THEN s.is_open_su END,
+        CASE p_isodow WHEN 1 THEN s.open_time_mo WHEN 2 THEN s.open_time_tu WHEN 3 THEN s.open_time_we WHEN 4 THEN s.open_time_th WHEN 5 THEN s.open_time_fr WHEN 6 THEN s.open_time_sa WHEN 7 THEN s.open_time_su END,
+        CASE p_isodow WHEN 1 THEN s.close_time_mo WHEN 2 THEN s.close_time_tu WHEN 3 THEN s.close_time_we WHEN 4 THEN s.close_time_th WHEN 5 THEN s.close_time_fr WHEN 6 THEN s.close_time_sa WHEN 7 THEN s.close_time_su END;
+$$;
+
+-- Create function is_within_service_hours, which mirrors the opening hours check of service_appt_create
+CREATE OR REPLACE FUNCTION is_within_service_hours(s services, p_appt_starts_at TIMESTAMP, p_appt_ends_at TIMESTAMP)
+RETURNS BOOLEAN
+LANGUAGE plpgsql IMMUTABLE AS $$
+DECLARE
+    h RECORD;
+    d DATE;
+BEGIN
+    -- start day
+    h := service_hours_on_isodow(s, EXTRACT(ISODOW FROM p_appt_starts_at)::INTEGER);
+    IF h.is_open = 0 OR p_appt_starts_at::TIME < h.open_time OR p_appt_starts_at::TIME > h.close_time THEN
+        RETURN FALSE;
+    END IF;
+
+    -- inbetween days must be open the whole day; only the first 7 need checking since weekdays repeat
+    d := p_appt_starts_at::DATE + 1;
+    WHILE d < p_appt_ends_at::DATE AND d <= p_appt_starts_at::DATE + 7 LOOP
+        h := service_hours_on_isodow(s, EXTRACT(ISODOW FROM d)::INTEGER);
+        IF h.is_open = 0 OR h.open_time <> '00:00:00' OR h.close_time <> '23:59:59' THEN
+            RETURN FALSE;
+        END IF;
+        d := d + 1;
+    END LOOP;
+
+    -- last day
+    h := service_hours_on_isodow(s, EXTRACT(ISODOW FROM p_appt_ends_at)::INTEGER);
+    IF h.is_open = 0 OR p_appt_ends_at::TIME < h.open_time OR p_appt_ends_at::TIME > h.close_time THEN
+        RETURN FALSE;
+    END IF;
+
+    RETURN TRUE;
+END;
+$$;
+
+-- Create function is_service_open_at, which checks whether a service is open at a timestamp (e.g. WHERE is_service_open_at(s, now() at time zone 'utc'))
+CREATE OR REPLACE FUNCTION is_service_open_at(s services, p_at TIMESTAMP)
+RETURNS BOOLEAN
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT h.is_open = 1 AND p_at::TIME BETWEEN h.open_time AND h.close_time
+    FROM service_hours_on_isodow(s, EXTRACT(ISODOW FROM p_at)::INTEGER) h;
+$$;
+
+-- Create function is_within_service_hours for an appointment interval as a TSRANGE (e.g. appts.appt_during)
+CREATE OR REPLACE FUNCTION is_within_service_hours(s services, p_appt_during TSRANGE)
+RETURNS BOOLEAN
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT is_within_service_hours(s, lower(p_appt_during), upper(p_appt_during));
+$$;
+
+-- Create function book_appt, which does the service lookup, duration lookup, opening hours check, conflict check and insert in one round trip
+-- booking_status is one of: booked, service_not_found, appt_type_not_found, invalid_time, conflict (the appt columns are only set when booked)
+CREATE OR REPLACE FUNCTION book_appt(p_user_id INTEGER, p_service_id INTEGER, p_appt_type_name TEXT, p_appt_starts_at TIMESTAMP)
+RETURNS TABLE (
+    booking_status TEXT,
+    appt_id INTEGER,
+    user_id INTEGER,
+    service_id INTEGER,
+    appt_type_name TEXT,
+    appt_starts_at TIMESTAMP,
+    appt_ends_at TIMESTAMP,
+    created_at TIMESTAMP,
+    updated_at TIMESTAMP
+)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_service services%ROWTYPE;
+    v_appt_duration_minutes INTEGER;
+    v_appt_ends_at TIMESTAMP;
+BEGIN
+    SELECT * INTO v_service FROM services WHERE services.service_id = p_service_id;
+    IF NOT FOUND THEN
+        booking_status := 'service_not_found';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    SELECT appt_types.appt_duration_minutes INTO v_appt_duration_minutes
+    FROM appt_types
+    WHERE appt_types.service_id = p_service_id AND appt_types.appt_type_name = p_appt_type_name;
+    IF NOT FOUND THEN
+        booking_status := 'appt_type_not_found';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    v_appt_ends_at := p_appt_starts_at + make_interval(mins => v_appt_duration_minutes);
+    IF NOT is_within_service_hours(v_service, p_appt_starts_at, v_appt_ends_at) THEN
+        booking_status := 'invalid_time';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    BEGIN
+        INSERT INTO appts AS a (user_id, service_id, appt_type_name, appt_starts_at, appt_ends_at)
+        VALUES (p_user_id, p_service_id, p_appt_type_name, p_appt_starts_at, v_appt_ends_at)
+        RETURNING a.appt_id, a.user_id, a.service_id, a.appt_type_name, a.appt_starts_at, a.appt_ends_at, a.created_at, a.updated_at
+        INTO appt_id, user_id, service_id, appt_type_name, appt_starts_at, appt_ends_at, created_at, updated_at;
+    EXCEPTION WHEN exclusion_violation THEN -- appts_no_overlap
+        booking_status := 'conflict';
+        RETURN NEXT;
+        RETURN;
+    END;
+
+    booking_status := 'booked';
+    RETURN NEXT;
+END;
+$$;
+
+-- Create index on services for listing the services of a host in service_id order (keyset pagination)
+CREATE INDEX IF NOT EXISTS services_host_id_service_id_idx ON services (host_id, service_id);
+
+-- Create covering indexes on appts for listing the appointments of a patron or of a service in time order, so that they are index-only scans
+CREATE INDEX IF NOT EXISTS appts_user_id_appt_starts_at_idx ON appts (user_id, appt_starts_at, appt_id) INCLUDE (service_id, appt_type_name, appt_ends_at, created_at, updated_at);
+
+CREATE INDEX IF NOT EXISTS appts_service_id_appt_starts_at_idx ON appts (service_id, appt_starts_at, appt_id) INCLUDE (user_id, appt_type_name, appt_ends_at, created_at, updated_at);
+
+-- Create table idempotency_keys, which stores the response of each create request sent with an Idempotency-Key header, so that a retry gets it again instead of creating twice
+-- response_status_code is NULL while the first request with the key is in progress
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    user_id INTEGER NOT NULL,
+    idempotency_key TEXT NOT NULL,
+    route TEXT NOT NULL,
+    request_hash TEXT NOT NULL,
+    response_status_code INTEGER,
+    response_body BYTEA,
+    created_at TIMESTAMP NOT NULL DEFAULT (now() at time zone 'utc'),
+    completed_at TIMESTAMP,
+    PRIMARY KEY (user_id, idempotency_key),
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+-- Create index on idempotency_keys for deleting the expired keys
+CREATE INDEX IF NOT EXISTS idempotency_keys_created_at_idx ON idempotency_keys (created_at);
\ No newline at end of file
@@ -0,0 +1,232 @@
+import asyncio
+import collections
+import contextvars
+import datetime
+import decimal
+import itertools
+import logging
+import logging.handlers
+import os
+import random
+import re
+import time
+import orjson
+import psycopg
+from psycopg import sql
+from psycopg.rows import tuple_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from app.core.config import CONFIG
+from app.utils.log import REQUEST_ID, get_logger
+from app.utils.metrics import CURRENT_DB_METHOD
+
+LOGGER = get_logger(__name__)
+
+# statements that EXPLAIN accepts; anything else (e.g. CREATE TEMP TABLE, multiple statements) is logged without a plan
+EXPLAINABLE_STATEMENT_REGEX = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH|VALUES)\b", re.IGNORECASE)
+# statements that EXPLAIN ANALYZE may run again, if issued by a read-only method (see make_cursor_class): a SELECT can still write, e.g. SELECT * FROM book_appt(...), so the statement alone does not tell
+ANALYZABLE_STATEMENT_REGEX = re.compile(r"^\s*(SELECT|WITH|VALUES)\b", re.IGNORECASE)
+# the plan of a statement shows the values of its parameters, e.g. Index Cond: (email = 'someone@email.com'::text)
+PLAN_STRING_LITERAL_REGEX = re.compile(r"'(?:[^']|'')*'")
+
+# set in the task running an EXPLAIN, so the EXPLAIN itself (which runs the statement again) is not logged as slow
+_IS_EXPLAINING = contextvars.ContextVar("is_explaining", default = False)
+
+def redact_params(params) -> list | dict | None:
+    """
+    Replaces each query parameter by its type, so the log shows the shape of a call but no emails, password hashes or other user data.
+    """
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {name: _redact_value(value) for (name, value) in params.items()}
+    return [_redact_value(value) for value in params]
+
+def _redact_value(value) -> str:
+    if value is None or isinstance(value, (bool, int, float, decimal.Decimal, datetime.date, datetime.time, datetime.timedelta)):
+        return f"<{type(value).__name__}>"
+    if isinstance(value, (list, tuple)):
+        return f"<{type(value).__name__} of {len(value)}>"
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__} of length {len(value)}>"
+    return f"<{type(value).__name__}>"
+
+def _collapse_whitespace(query_text: str) -> str:
+    return " ".join(query_text.split())
+
+def get_process_path(path: str) -> str:
+    """
+    Adds the pid of this process to a log path, before its extension: a RotatingFileHandler renames the file it rotates, so processes sharing a file would lose or interleave each other's lines.
+    """
+    root, extension = os.path.splitext(path)
+    return f"{root}.{os.getpid()}{extension}"
+
+class SlowQueryLog:
+    """
+    Logs the statements that take longer than a threshold to a rotating file, one JSON object per line, with their parameters redacted.
+    A sample of them (at most explain_max_per_minute, one at a time) also gets an EXPLAIN (ANALYZE, BUFFERS) of the same statement and parameters (only EXPLAIN for statements of methods not listed as read-only, e.g. writes, and for failed statements),
+    run in the background on another connection of the same pool, in a transaction that is always rolled back.
+    Statements are timed by the cursor class of the pool (see make_cursor_class), so time spent waiting for a connection is not counted; the pool statistics logged with each statement show whether the pool was starved at the time.
+    """
+
+    def __init__(self,
+                 threshold_ms: float,
+                 path: str,
+                 max_bytes: int = 10_000_000,
+                 backup_count: int = 5,
+                 explain_sample_rate: float = 0.1,
+                 explain_max_per_minute: int = 6,
+                 explain_timeout_ms: int = 5000,
+                 per_process: bool = False
+                 ):
+        """
+        :param float threshold_ms: statements taking at least this long are logged
+        :param str path: file the log is written to; rotated once it reaches max_bytes, keeping backup_count older files
+        :param float explain_sample_rate: fraction of the logged statements that get an EXPLAIN
+        :param int explain_max_per_minute: at most this many EXPLAINs are run per minute (EXPLAIN ANALYZE runs the statement again, so a burst of slow queries must not double the load)
+        :param int explain_timeout_ms: statement timeout of an EXPLAIN
+        :param bool per_process: if True, the pid of this process is added to path (logs/slow_queries.log becomes logs/slow_queries.<pid>.log), so that several processes logging slow queries each write (and rotate) their own file
+        """
+        self.threshold_seconds = threshold_ms / 1000
+        self.path = get_process_path(path) if per_process else path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.explain_sample_rate = explain_sample_rate
+        self.explain_max_per_minute = explain_max_per_minute
+        self.explain_timeout_ms = explain_timeout_ms
+        self._entry_ids = itertools.count(1)
+        self._explained_at = collections.deque() # start times of the EXPLAINs of the last minute
+        self._explain_task = None
+        self._logger = None
+
+    @classmethod
+    def from_config(cls) -> "SlowQueryLog":
+        return cls(
+            threshold_ms = CONFIG.DATABASE_SLOW_QUERY_THRESHOLD_MS,
+            path = CONFIG.DATABASE_SLOW_QUERY_LOG_PATH,
+            max_bytes = CONFIG.DATABASE_SLOW_QUERY_LOG_MAX_BYTES,
+            backup_count = CONFIG.DATABASE_SLOW_QUERY_LOG_BACKUP_COUNT,
+            explain_sample_rate = CONFIG.DATABASE_SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+            explain_max_per_minute = CONFIG.DATABASE_SLOW_QUERY_EXPLAIN_MAX_PER_MINUTE,
+            explain_timeout_ms = CONFIG.DATABASE_SLOW_QUERY_EXPLAIN_TIMEOUT_MS,
+            per_process = CONFIG.DATABASE_SLOW_QUERY_LOG_PER_PROCESS,
+        )
+
+    def make_cursor_class(self, get_pool, analyzed_methods: frozenset = frozenset()) -> type:
+        """
+        Makes the cursor class to pass as the cursor_factory of the connections of a pool.
+
+        :param get_pool: callable returning the pool, which is where the EXPLAINs of its statements run
+        :param frozenset analyzed_methods: names of the Database methods that only read, whose statements may be run again by EXPLAIN ANALYZE; the others only get EXPLAIN
+        :return: an AsyncCursor subclass that times execute
+        :rtype: type
+        """
+        return type("SlowQueryCursor", (SlowQueryCursor, ), {"slow_query_log": self, "get_pool": staticmethod(get_pool), "analyzed_methods": frozenset(analyzed_methods)})
+
+    def _get_logger(self) -> logging.Logger:
+        if self._logger is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok = True)
+            handler = logging.handlers.RotatingFileHandler(self.path, maxBytes = self.max_bytes, backupCount = self.backup_count, encoding = "utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.Logger("app.slow_queries") # not registered with logging, so each SlowQueryLog writes only to its own file
+            logger.addHandler(handler)
+            self._logger = logger
+        return self._logger
+
+    def _write(self, entry: dict) -> None:
+        entry = {"logged_at": datetime.datetime.now(datetime.timezone.utc).isoformat(), **entry}
+        self._get_logger().warning(orjson.dumps(entry, default = str).decode())
+
+    def _should_explain(self) -> bool:
+        if self._explain_task is not None and not self._explain_task.done():
+            return False
+        if random.random() >= self.explain_sample_rate:
+            return False
+        now = time.monotonic()
+        while self._explained_at and now - self._explained_at[0] >= 60:
+            self._explained_at.popleft()
+        if len(self._explained_at) >= self.explain_max_per_minute:
+            return False
+        self._explained_at.append(now)
+        return True
+
+    def record(self, query_text: str, params, duration_seconds: float, pool: AsyncConnectionPool | None, error: BaseException | None = None, analyzed_methods: frozenset = frozenset()) -> None:
+        """
+        Logs a slow statement, and starts its EXPLAIN if it is sampled.
+
+        :param frozenset analyzed_methods: see make_cursor_class
+        """
+        method = CURRENT_DB_METHOD.get()
+        if not query_text.strip(): # e.g. the pool checking a connection
+            return
+        entry_id = f"{os.getpid()}-{next(self._entry_ids)}"
+        pool_stats = pool.get_stats() if pool is not None else dict()
+        self._write({
+            "kind": "slow_query",
+            "id": entry_id,
+            "method": method,
+            "request_id": REQUEST_ID.get(),
+            "pool": pool.name if pool is not None else None,
+            "duration_ms": round(duration_seconds * 1000, 3),
+            "query": _collapse_whitespace(query_text),
+            "params": redact_params(params),
+            "error": type(error).__name__ if error is not None else None,
+            "pool_stats": {name: pool_stats.get(name) for name in ("pool_size", "pool_available", "requests_waiting")},
+        })
+        if pool is None or not EXPLAINABLE_STATEMENT_REGEX.match(query_text) or not self._should_explain():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        is_analyzed = error is None and method in analyzed_methods and ANALYZABLE_STATEMENT_REGEX.match(query_text) is not None # a statement that failed (e.g. timed out) would likely fail again
+        self._explain_task = loop.create_task(self._explain(entry_id, query_text, params, pool, is_analyzed), context = contextvars.Context())
+
+    async def _explain(self, entry_id: str, query_text: str, params, pool: AsyncConnectionPool, is_analyzed: bool) -> None:
+        _IS_EXPLAINING.set(True)
+        entry = {"kind": "explain", "id": entry_id, "analyze": is_analyzed}
+        try:
+            async with pool.connection(timeout = 1.0) as conn: # give up rather than add to a starved pool
+                async with conn.transaction(force_rollback = True): # e.g. a function called by a SELECT may write
+                    async with conn.cursor(row_factory = tuple_row) as cursor: # the Database methods leave dict_row on the pooled connections
+                        await cursor.execute(sql.SQL("SET LOCAL statement_timeout = {}").format(self.explain_timeout_ms))
+                        await cursor.execute(("EXPLAIN (ANALYZE, BUFFERS) " if is_analyzed else "EXPLAIN ") + query_text.strip().rstrip(";"), params)
+                        entry["plan"] = [PLAN_STRING_LITERAL_REGEX.sub("'<redacted>'", row[0]) for row in await cursor.fetchall()]
+        except PoolTimeout:
+            entry["error"] = "no connection available"
+        except psycopg.Error as e: # e.g. the statement used a temporary table of its own connection
+            entry["error"] = f"{type(e).__name__}: {e.diag.message_primary}" # not the detail, which can show the values of the row
+        self._write(entry)
+
+    async def wait_for_explain(self) -> None:
+        """
+        Waits for the EXPLAIN in progress, if any (e.g. before closing the pool).
+        """
+        if self._explain_task is not None:
+            await asyncio.gather(self._explain_task, return_exceptions = True)
+
+class SlowQueryCursor(psycopg.AsyncCursor):
+    """
+    Cursor that hands the statements taking longer than the threshold of its SlowQueryLog to it; see SlowQueryLog.make_cursor_class.
+    """
+    slow_query_log = None
+    get_pool = None
+    analyzed_methods = frozenset()
+
+    async def execute(self, query, params = None, **kwargs):
+        started_at = time.perf_counter()
+        error = None
+        try:
+            return await super().execute(query, params, **kwargs)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            duration_seconds = time.perf_counter() - started_at
+            if duration_seconds >= self.slow_query_log.threshold_seconds and not _IS_EXPLAINING.get():
+                try:
+                    query_text = query.as_string(self.connection) if isinstance(query, sql.Composable) else (query.decode() if isinstance(query, bytes) else query)
+                    self.slow_query_log.record(query_text, params, duration_seconds, self.get_pool(), error, self.analyzed_methods)
+                except Exception:
+                    LOGGER.exception("Could not log a slow query") # failing to log must not fail the query
@@ -1,4 +1,20 @@
-from app.database.db import Database, db
+from fastapi import Header, HTTPException, status
+from app.core.config import CONFIG
+from app.database.db import Database, get_database
+import hmac
 
 async def get_db() -> Database:
-    return db
\ No newline at end of file
+    return get_database()
+
+async def verify_internal_token(x_internal_token: str | None = Header(default = None), authorization: str | None = Header(default = None)) -> None:
+    """
+    Guards the internal endpoints (e.g. pool statistics) with the X-Internal-Token header, or an Authorization: Bearer header (e.g. from a Prometheus scrape config), which must match INTERNAL_API_TOKEN.
+    With no INTERNAL_API_TOKEN set, every request is refused (and the internal endpoints are not served, see app/api/router.py).
+    """
+    if not CONFIG.INTERNAL_API_TOKEN:
+        raise HTTPException(status_code = status.HTTP_401_UNAUTHORIZED, detail = "Invalid internal token")
+    token = x_internal_token
+    if token is None and authorization is not None and authorization.lower().startswith("bearer "):
+        token = authorization[len("bearer "):]
+    if not hmac.compare_digest(token or "", CONFIG.INTERNAL_API_TOKEN):
+        raise HTTPException(status_code = status.HTTP_401_UNAUTHORIZED, detail = "Invalid internal token")
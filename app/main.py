@@ -6,33 +6,58 @@ if os.name == 'nt':
 from fastapi import FastAPI, Depends, status
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import PlainTextResponse
-from app.api.router import router
+from app.api.router import create_router
 from contextlib import asynccontextmanager
 from app.dependencies import get_db
+from app.utils.hashing_executor import get_hashing_executor
+from app.utils.log import RequestIdMiddleware, setup_logging, shutdown_logging
+from app.utils.metrics import METRICS, MetricsMiddleware
+from app.core.config import CONFIG
 
 import json
 
 # to make available the database and connection pool before the app is up and running
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    setup_logging() # here rather than on import, so each worker process starts its own log writer thread
     db = await get_db()
     await db.db_open()
     yield # this hands off control to the FastAPI app, and returns to run the below statements when the app is shut down
     await db.db_close()
-
-
-app = FastAPI(lifespan = lifespan)
-app.include_router(router, prefix = '/api')
-
+    get_hashing_executor().shutdown()
+    shutdown_logging()
 
 
 # RequestValidationError is for when Pydantic throws an error
-@app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request, exc):
     return PlainTextResponse(json.dumps({"success": False, "data": str(exc)}), status_code= status.HTTP_422_UNPROCESSABLE_ENTITY) # str(exc.errors())}
 
 
-import uvicorn
+def create_app() -> FastAPI:
+    """
+    Builds the app, reading the config (.env); app below is built with it on first use, so importing this module does not load the config.
+    """
+    app = FastAPI(lifespan = lifespan)
+    app.include_router(create_router(), prefix = '/api')
+    METRICS.enabled = CONFIG.METRICS_ENABLED
+    if CONFIG.METRICS_ENABLED:
+        app.add_middleware(MetricsMiddleware, metrics = METRICS) # latency and status codes by route, see GET /api/internal/metrics
+    app.add_middleware(RequestIdMiddleware) # added last so it wraps the others; sets the request id of the log records, see app/utils/log.py
+    app.add_exception_handler(RequestValidationError, validation_exception_handler)
+    return app
+
+_app = None
+
+def __getattr__(name: str):
+    # app.main:app (e.g. for uvicorn, or from app.main import app) is built on first access
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == '__main__':
-    uvicorn.run(app, host = "127.0.0.1", port = 8000, reload = False) # had to do this instead of CLI uvicorn b/c of this on windows affecting asyncio
\ No newline at end of file
+    import uvicorn # only needed to run the app this way; app.server runs it in production
+    uvicorn.run(create_app(), host = CONFIG.SERVER_HOST, port = CONFIG.SERVER_PORT, reload = False) # had to do this instead of CLI uvicorn b/c of this on windows affecting asyncio; single process for development, see app/server.py for production
\ No newline at end of file
@@ -20,4 +20,34 @@ class ApptCreateResponse(BaseModel):
     appt_starts_at: datetime
     appt_ends_at: datetime
     created_at: datetime
-    updated_at: datetime
\ No newline at end of file
+    updated_at: datetime
+
+class ApptGetResponse(BaseModel):
+    appt_id: int
+    user_id: int
+    service_id: int
+    appt_type_name: str
+    appt_starts_at: datetime
+    appt_ends_at: datetime
+    created_at: datetime
+    updated_at: datetime
+
+class ApptBatchCreateRequest(BaseModel):
+    appts: list[ApptCreateRequest]
+    all_or_nothing: bool = False # if True, no appointment is created unless all of them can be
+
+    @field_validator("appts")
+    def validate_appts(cls, appts):
+        if not (1 <= len(appts) <= CONFIG.APPT_BATCH_MAX_SIZE):
+            raise ValueError(f"appts must have between 1 and {CONFIG.APPT_BATCH_MAX_SIZE} items")
+        return appts
+
+class ApptBatchCreateItemResponse(BaseModel):
+    index: int # position of the item in the request
+    status_code: int # what POST /appts would have returned for the item
+    detail: str | None = None
+    appt: ApptCreateResponse | None = None
+
+class ApptBatchCreateResponse(BaseModel):
+    appts: list[ApptBatchCreateItemResponse]
+    created_count: int
@@ -1,6 +1,32 @@
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
 from app.core.config import CONFIG
-from datetime import datetime
+from datetime import datetime, time
+from app.utils.util_funcs import get_formatted_time
+from app.schemas.appt_types import ApptTypeCreateRequest
+import orjson
+
+# default opening and closing times, read from the config when a model is built rather than when this module is imported
+def get_default_open_time() -> str:
+    return CONFIG.SERVICE_DEFAULT_OPEN_TIME
+
+def get_default_close_time() -> str:
+    return CONFIG.SERVICE_DEFAULT_CLOSE_TIME
+
+def validate_service_time(service_time) -> str:
+    """
+    Opening and closing times are strings in DT_TIME_FORMAT in the API, and TIME in the database.
+
+    :param service_time: time as a string (from the request) or time (from the database)
+    :return: time as a string in DT_TIME_FORMAT
+    :rtype: str
+    """
+    if isinstance(service_time, time):
+        return service_time.strftime(CONFIG.DT_TIME_FORMAT)
+    try:
+        get_formatted_time(service_time)
+    except ValueError:
+        raise ValueError(f"open_time_* and close_time_* must be in the format {CONFIG.DT_TIME_FORMAT}")
+    return service_time
 
 class ServiceCreateRequest(BaseModel):
     service_name: str
@@ -16,26 +42,30 @@ class ServiceCreateRequest(BaseModel):
     is_open_fr: int = 0
     is_open_sa: int = 0
     is_open_su: int = 0
-    open_time_mo: str = CONFIG.SERVICE_DEFAULT_OPEN_TIME
-    open_time_tu: str = CONFIG.SERVICE_DEFAULT_OPEN_TIME
-    open_time_we: str = CONFIG.SERVICE_DEFAULT_OPEN_TIME
-    open_time_th: str = CONFIG.SERVICE_DEFAULT_OPEN_TIME
-    open_time_fr: str = CONFIG.SERVICE_DEFAULT_OPEN_TIME
-    open_time_sa: str = CONFIG.SERVICE_DEFAULT_OPEN_TIME
-    open_time_su: str = CONFIG.SERVICE_DEFAULT_OPEN_TIME
-    close_time_mo: str = CONFIG.SERVICE_DEFAULT_CLOSE_TIME
-    close_time_tu: str = CONFIG.SERVICE_DEFAULT_CLOSE_TIME
-    close_time_we: str = CONFIG.SERVICE_DEFAULT_CLOSE_TIME
-    close_time_th: str = CONFIG.SERVICE_DEFAULT_CLOSE_TIME
-    close_time_fr: str = CONFIG.SERVICE_DEFAULT_CLOSE_TIME
-    close_time_sa: str = CONFIG.SERVICE_DEFAULT_CLOSE_TIME
-    close_time_su: str = CONFIG.SERVICE_DEFAULT_CLOSE_TIME
+    open_time_mo: str = Field(default_factory = get_default_open_time)
+    open_time_tu: str = Field(default_factory = get_default_open_time)
+    open_time_we: str = Field(default_factory = get_default_open_time)
+    open_time_th: str = Field(default_factory = get_default_open_time)
+    open_time_fr: str = Field(default_factory = get_default_open_time)
+    open_time_sa: str = Field(default_factory = get_default_open_time)
+    open_time_su: str = Field(default_factory = get_default_open_time)
+    close_time_mo: str = Field(default_factory = get_default_close_time)
+    close_time_tu: str = Field(default_factory = get_default_close_time)
+    close_time_we: str = Field(default_factory = get_default_close_time)
+    close_time_th: str = Field(default_factory = get_default_close_time)
+    close_time_fr: str = Field(default_factory = get_default_close_time)
+    close_time_sa: str = Field(default_factory = get_default_close_time)
+    close_time_su: str = Field(default_factory = get_default_close_time)
 
     @field_validator("is_open_mo","is_open_tu","is_open_we","is_open_th","is_open_fr","is_open_sa","is_open_su")
     def validate_is_open(cls, is_open):
         if is_open not in (0, 1):
             raise ValueError("is_open_* must be 0 or 1")
         return is_open
+
+    @field_validator("open_time_mo","open_time_tu","open_time_we","open_time_th","open_time_fr","open_time_sa","open_time_su","close_time_mo","close_time_tu","close_time_we","close_time_th","close_time_fr","close_time_sa","close_time_su", mode = "before")
+    def validate_service_time(cls, service_time):
+        return validate_service_time(service_time)
         
 class ServiceCreateResponse(ServiceCreateRequest):
     host_id: int
@@ -57,20 +87,65 @@ class ServiceGetResponse(BaseModel):
     is_open_fr: int = 0
     is_open_sa: int = 0
     is_open_su: int = 0
-    open_time_mo: str = CONFIG.SERVICE_DEFAULT_OPEN_TIME
-    open_time_tu: str = CONFIG.SERVICE_DEFAULT_OPEN_TIME
-    open_time_we: str = CONFIG.SERVICE_DEFAULT_OPEN_TIME
-    open_time_th: str = CONFIG.SERVICE_DEFAULT_OPEN_TIME
-    open_time_fr: str = CONFIG.SERVICE_DEFAULT_OPEN_TIME
-    open_time_sa: str = CONFIG.SERVICE_DEFAULT_OPEN_TIME
-    open_time_su: str = CONFIG.SERVICE_DEFAULT_OPEN_TIME
-    close_time_mo: str = CONFIG.SERVICE_DEFAULT_CLOSE_TIME
-    close_time_tu: str = CONFIG.SERVICE_DEFAULT_CLOSE_TIME
-    close_time_we: str = CONFIG.SERVICE_DEFAULT_CLOSE_TIME
-    close_time_th: str = CONFIG.SERVICE_DEFAULT_CLOSE_TIME
-    close_time_fr: str = CONFIG.SERVICE_DEFAULT_CLOSE_TIME
-    close_time_sa: str = CONFIG.SERVICE_DEFAULT_CLOSE_TIME
-    close_time_su: str = CONFIG.SERVICE_DEFAULT_CLOSE_TIME
+    open_time_mo: str = Field(default_factory = get_default_open_time)
+    open_time_tu: str = Field(default_factory = get_default_open_time)
+    open_time_we: str = Field(default_factory = get_default_open_time)
+    open_time_th: str = Field(default_factory = get_default_open_time)
+    open_time_fr: str = Field(default_factory = get_default_open_time)
+    open_time_sa: str = Field(default_factory = get_default_open_time)
+    open_time_su: str = Field(default_factory = get_default_open_time)
+    close_time_mo: str = Field(default_factory = get_default_close_time)
+    close_time_tu: str = Field(default_factory = get_default_close_time)
+    close_time_we: str = Field(default_factory = get_default_close_time)
+    close_time_th: str = Field(default_factory = get_default_close_time)
+    close_time_fr: str = Field(default_factory = get_default_close_time)
+    close_time_sa: str = Field(default_factory = get_default_close_time)
+    close_time_su: str = Field(default_factory = get_default_close_time)
     host_id: int
     created_at: datetime
-    updated_at: datetime
\ No newline at end of file
+    updated_at: datetime
+
+    @field_validator("open_time_mo","open_time_tu","open_time_we","open_time_th","open_time_fr","open_time_sa","open_time_su","close_time_mo","close_time_tu","close_time_we","close_time_th","close_time_fr","close_time_sa","close_time_su", mode = "before")
+    def validate_service_time(cls, service_time):
+        return validate_service_time(service_time)
+
+class ServiceAvailabilitySlot(BaseModel):
+    appt_starts_at: datetime
+    appt_ends_at: datetime
+
+class ServiceAvailabilityResponse(BaseModel):
+    service_id: int
+    appt_type_name: str
+    appt_duration_minutes: int
+    slots: list[ServiceAvailabilitySlot]
+
+
+class ServiceImportRow(ServiceCreateRequest):
+    appt_types: list[ApptTypeCreateRequest] = []
+
+    @field_validator("appt_types", mode = "before")
+    def parse_appt_types(cls, appt_types):
+        if isinstance(appt_types, str): # in CSV, the column holds a JSON array
+            return orjson.loads(appt_types) if appt_types.strip() else []
+        return appt_types
+
+    @field_validator("appt_types")
+    def validate_appt_types(cls, appt_types):
+        appt_type_names = set()
+        for appt_type in appt_types:
+            if appt_type.appt_duration_minutes <= 0:
+                raise ValueError("appt_duration_minutes must be greater than 0")
+            if appt_type.appt_type_name in appt_type_names:
+                raise ValueError(f"appt_type_name {appt_type.appt_type_name} is repeated")
+            appt_type_names.add(appt_type.appt_type_name)
+        return appt_types
+
+class ServiceImportError(BaseModel):
+    line_number: int # line of the file, counting from 1 (so the CSV header is line 1)
+    detail: str
+
+class ServiceImportResponse(BaseModel):
+    imported_count: int
+    appt_types_imported_count: int
+    rejected_count: int
+    errors: list[ServiceImportError]
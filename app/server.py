@@ -0,0 +1,104 @@
+"""
+Production launcher: serves app.main:app from SERVER_WORKERS pre-forked worker processes on SERVER_HOST:SERVER_PORT.
+
+Each worker runs the lifespan of the app, so it opens (and on shutdown closes) its own connection pool.
+DATABASE_POOL_MIN_SIZE and DATABASE_POOL_MAX_SIZE are the totals for the whole server here: they are divided across the workers, and capped so that all the workers together stay within the max_connections of Postgres (less DATABASE_POOL_RESERVED_CONNECTIONS, kept free for migrations, psql and monitoring).
+Each worker also writes its own slow query log, DATABASE_SLOW_QUERY_LOG_PATH with its pid added (e.g. logs/slow_queries.<pid>.log), since rotating one file from several processes would lose or interleave lines.
+Send SIGHUP to the launcher to restart the workers one at a time (e.g. after a deploy), each finishing its requests in flight within SERVER_TIMEOUT_GRACEFUL_SHUTDOWN seconds.
+
+Usage: python -m app.server
+"""
+import os
+import asyncio
+if os.name == 'nt':
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+import psycopg
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+from app.core.config import CONFIG
+
+# connections Postgres lets non-superusers open; reserved_connections only exists since Postgres 16
+AVAILABLE_CONNECTIONS_QUERY = """
+    SELECT current_setting('max_connections')::int
+        - current_setting('superuser_reserved_connections')::int
+        - COALESCE(current_setting('reserved_connections', true)::int, 0) AS available_connections;
+"""
+
+def get_available_connections(dbname: str | None = None,
+                              user: str | None = None,
+                              password: str | None = None,
+                              host: str | None = None,
+                              port: int | None = None
+                              ) -> int | None:
+    """
+    The connection parameters default to those of the database of the app (DATABASE_*).
+
+    :return: the connections the app can open on the database server, or None if the server could not be reached
+    :rtype: int | None
+    """
+    dbname = dbname if dbname is not None else CONFIG.DATABASE_NAME
+    user = user if user is not None else CONFIG.DATABASE_USERNAME
+    password = password if password is not None else CONFIG.DATABASE_PASSWORD
+    host = host if host is not None else CONFIG.DATABASE_HOSTNAME
+    port = port if port is not None else CONFIG.DATABASE_PORT
+    try:
+        with psycopg.connect(dbname = dbname, user = user, password = password, host = host, port = port, connect_timeout = 5) as conn:
+            return conn.execute(AVAILABLE_CONNECTIONS_QUERY).fetchone()[0]
+    except psycopg.OperationalError as e:
+        print(f"Could not read max_connections from {dbname} ({e}); the pool sizes are only divided across the workers")
+        return None
+
+def get_worker_pool_sizes(pool_min_size: int, pool_max_size: int, workers: int, available_connections: int | None = None, reserved_connections: int = 0) -> tuple:
+    """
+    Divides the pool sizes of the whole server across its workers.
+
+    :param int pool_min_size: connections kept open by all the workers together
+    :param int pool_max_size: connections all the workers together can grow to
+    :param int workers: worker processes
+    :param int available_connections: if given, the pool sizes are also capped so that the workers open at most this many connections, less reserved_connections
+    :return: (min_size, max_size) of the pool of each worker
+    :rtype: tuple
+    """
+    total_max_size = pool_max_size
+    if available_connections is not None:
+        total_max_size = min(total_max_size, available_connections - reserved_connections)
+    if total_max_size < workers:
+        raise ValueError(f"{workers} workers need at least one connection each, but at most {total_max_size} connections can be opened; lower SERVER_WORKERS or raise DATABASE_POOL_MAX_SIZE / max_connections")
+    worker_max_size = total_max_size // workers
+    worker_min_size = min(pool_min_size // workers, worker_max_size)
+    return worker_min_size, worker_max_size
+
+def run_server() -> None:
+    workers = CONFIG.SERVER_WORKERS
+    available_connections = get_available_connections()
+    worker_min_size, worker_max_size = get_worker_pool_sizes(CONFIG.DATABASE_POOL_MIN_SIZE, CONFIG.DATABASE_POOL_MAX_SIZE, workers, available_connections, CONFIG.DATABASE_POOL_RESERVED_CONNECTIONS)
+    if worker_max_size * workers < CONFIG.DATABASE_POOL_MAX_SIZE:
+        print(f"DATABASE_POOL_MAX_SIZE of {CONFIG.DATABASE_POOL_MAX_SIZE} capped to {worker_max_size * workers}: {available_connections} connections are available, {CONFIG.DATABASE_POOL_RESERVED_CONNECTIONS} of them reserved")
+    print(f"{workers} worker(s), each with a pool of {worker_min_size} to {worker_max_size} connections")
+
+    # the workers are spawned (not forked), so they read their config, including these, from the environment
+    os.environ["DATABASE_POOL_MIN_SIZE"] = str(worker_min_size)
+    os.environ["DATABASE_POOL_MAX_SIZE"] = str(worker_max_size)
+    os.environ["DATABASE_SLOW_QUERY_LOG_PER_PROCESS"] = "True" # each worker writes (and rotates) its own slow query log file
+
+    config = uvicorn.Config(
+        "app.main:app",
+        host = CONFIG.SERVER_HOST,
+        port = CONFIG.SERVER_PORT,
+        workers = workers,
+        loop = CONFIG.SERVER_LOOP, # "auto" uses uvloop when it is installed
+        http = CONFIG.SERVER_HTTP, # "auto" uses httptools when it is installed
+        backlog = CONFIG.SERVER_BACKLOG,
+        timeout_keep_alive = CONFIG.SERVER_TIMEOUT_KEEP_ALIVE_SECONDS,
+        timeout_graceful_shutdown = CONFIG.SERVER_TIMEOUT_GRACEFUL_SHUTDOWN_SECONDS,
+        proxy_headers = CONFIG.SERVER_PROXY_HEADERS,
+        forwarded_allow_ips = CONFIG.SERVER_FORWARDED_ALLOW_IPS,
+        lifespan = "on",
+    )
+    server = uvicorn.Server(config)
+    # the supervisor even for a single worker, so SIGHUP restarts it and a crashed worker is replaced
+    Multiprocess(config, target = server.run, sockets = [config.bind_socket()]).run()
+
+if __name__ == '__main__':
+    run_server()
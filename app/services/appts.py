@@ -3,30 +3,36 @@ from app.database.db import Database
 import psycopg
 from app.schemas import appts as schemas_appts
 import datetime
+import bisect
 from app.core.config import CONFIG
-from app.utils.util_funcs import get_formatted_time
+from app.utils.schedule import get_weekly_schedule
+from app.utils.util_funcs import encode_cursor, decode_cursor
 from types import MappingProxyType
 
-IS_OPEN_WEEKDAY_MAPPING = MappingProxyType({1: "is_open_mo", 2: "is_open_tu", 3: "is_open_we", 4: "is_open_th", 5: "is_open_fr", 6: "is_open_sa", 7: "is_open_su"})
-OPEN_TIME_WEEKDAY_MAPPING = MappingProxyType({1: "open_time_mo", 2: "open_time_tu", 3: "open_time_we", 4: "open_time_th", 5: "open_time_fr", 6: "open_time_sa", 7: "open_time_su"})
-CLOSE_TIME_WEEKDAY_MAPPING = MappingProxyType({1: "close_time_mo", 2: "close_time_tu", 3: "close_time_we", 4: "close_time_th", 5: "close_time_fr", 6: "close_time_sa", 7: "close_time_su"})
+# maps each booking_status of Database.book_appt (other than booked) to the error returned to the client
+BOOKING_STATUS_ERROR_MAPPING = MappingProxyType({
+    "service_not_found": (status.HTTP_404_NOT_FOUND, "Service not found"),
+    "appt_type_not_found": (status.HTTP_404_NOT_FOUND, "Appt type not found"),
+    "invalid_time": (status.HTTP_400_BAD_REQUEST, "Could not create appointment due to invalid appointment time"),
+    "conflict": (status.HTTP_409_CONFLICT, "Could not create appointment due to service having conflict at the time"),
+})
 
 async def service_appt_create(appt: schemas_appts.ApptCreateRequest, db: Database, user_id: int):
+    if CONFIG.APPT_BOOKING_SINGLE_ROUND_TRIP:
+        return await service_appt_create_single_round_trip(appt, db, user_id)
+    return await service_appt_create_multi_query(appt, db, user_id)
+
+async def service_appt_create_multi_query(appt: schemas_appts.ApptCreateRequest, db: Database, user_id: int):
     appt_dict = appt.model_dump()
 
     try:
-        service_from_db = await db.get_service_by_service_id(appt_dict["service_id"])
+        service_from_db, appt_type_from_db = await db.get_service_and_appt_type(appt_dict["service_id"], appt_dict["appt_type_name"]) # one round trip if db.pipeline is on
     except psycopg.Error as e:
         raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = f"Database issue occurred: {e}")
     
     if service_from_db is None:
         raise HTTPException(status_code = status.HTTP_404_NOT_FOUND, detail = "Service not found")
     
-    try:
-        appt_type_from_db = await db.get_appt_type_by_service_id_and_appt_type_name(appt_dict["service_id"], appt_dict["appt_type_name"])
-    except psycopg.Error as e:
-        raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = f"Database issue occurred: {e}")
-    
     if appt_type_from_db is None:
         raise HTTPException(status_code = status.HTTP_404_NOT_FOUND, detail = "Appt type not found")
     
@@ -34,46 +40,166 @@ async def service_appt_create(appt: schemas_appts.ApptCreateRequest, db: Databas
     appt_starts_at = appt_dict["appt_starts_at"]
     appt_ends_at = appt_starts_at + datetime.timedelta(minutes = int(appt_duration_minutes))
 
-
-    # start day
-    date_in_check = appt_starts_at.date()
-    weekday_in_check = date_in_check.isoweekday()
-    if (
-        not ( service_from_db[IS_OPEN_WEEKDAY_MAPPING[weekday_in_check]] ) # on a day that service is not open
-        or ( appt_starts_at.time() < get_formatted_time(service_from_db[OPEN_TIME_WEEKDAY_MAPPING[weekday_in_check]]) )  # starts before service opens
-        or ( appt_starts_at.time() > get_formatted_time(service_from_db[CLOSE_TIME_WEEKDAY_MAPPING[weekday_in_check]]) ) # starts after service closes
-    ):
-        raise HTTPException(status_code = status.HTTP_400_BAD_REQUEST, detail = "Could not create appointment due to invalid appointment time")
-    
-    # THE BELOW LOGIC CAN BE MADE MORE EFFICIENT (O(1) by checking only the distinct weekdays in range, i.e. at most 7 days, rather than the entire range from start to end, which could be >> 7 days)
+    # the schedule is built once per service row and reused across requests, so this is O(1) however many days the appt spans
     # IF THE "HOLIDAY" FEATURE GETS ADDED, THAT CAN BE CHECKED THROUGH A QUERY FOR THE RELEVANT TIME RANGE (SIMILAR TO CONFLICT CHECK)
-    # inbetween days (i.e. appt stretches across entire day, e.g. hotel booking)
-    if appt_starts_at.date() != appt_ends_at.date():
-        date_in_check += datetime.timedelta(days = 1)
-        while date_in_check < appt_ends_at.date():
-            weekday_in_check = date_in_check.isoweekday()
-            if (
-                not (service_from_db.get(IS_OPEN_WEEKDAY_MAPPING[weekday_in_check])) # on a day that service is not open
-                or (str(get_formatted_time(service_from_db[OPEN_TIME_WEEKDAY_MAPPING[weekday_in_check]])) != CONFIG.SERVICE_MIN_TIME) # 00:00:00 # since appt does not end this day, service must be open whole day
-                or (str(get_formatted_time(service_from_db[CLOSE_TIME_WEEKDAY_MAPPING[weekday_in_check]])) != CONFIG.SERVICE_MAX_TIME) # 23:59:59 # since appt does not end this day, service must be open whole day
-            ):
-                raise HTTPException(status_code = status.HTTP_400_BAD_REQUEST, detail = "Could not create appointment due to invalid appointment time")
-            date_in_check += datetime.timedelta(days = 1)
-            
-    # last day
-    weekday_in_check = date_in_check.isoweekday()
-    if (
-        not ( service_from_db.get(IS_OPEN_WEEKDAY_MAPPING[weekday_in_check]) ) # on a day that service is not open
-        or ( appt_ends_at.time() < get_formatted_time(service_from_db[OPEN_TIME_WEEKDAY_MAPPING[weekday_in_check]]) ) # ends before service opens
-        or ( appt_ends_at.time() > get_formatted_time(service_from_db[CLOSE_TIME_WEEKDAY_MAPPING[weekday_in_check]]) ) # ends after service closes
-    ):
+    if not get_weekly_schedule(service_from_db).is_within_hours(appt_starts_at, appt_ends_at):
         raise HTTPException(status_code = status.HTTP_400_BAD_REQUEST, detail = "Could not create appointment due to invalid appointment time")
 
-    # NEED TO CHECK IN DB FOR CONFLICT WITH ANY EXISTING APPOINTMENT
-    appt_conflict_check = await db.get_conflicting_appt(appt_dict["service_id"], appt_dict["appt_type_name"], str(appt_starts_at), str(appt_ends_at))
-    if appt_conflict_check is not None:
-        raise HTTPException(status_code = status.HTTP_400_BAD_REQUEST, detail = "Could not create appointment due to service having conflict at the time")
-        
-    created_appt = await db.insert_appt(user_id, appt_dict["service_id"], appt_dict["appt_type_name"], appt_starts_at, appt_ends_at)
+    # conflict with any existing appointment is checked atomically by the appts_no_overlap exclusion constraint on insert
+    try:
+        created_appt = await db.insert_appt(user_id, appt_dict["service_id"], appt_dict["appt_type_name"], appt_starts_at, appt_ends_at)
+    except psycopg.errors.ExclusionViolation as e:
+        raise HTTPException(status_code = status.HTTP_409_CONFLICT, detail = "Could not create appointment due to service having conflict at the time")
+    except psycopg.Error as e:
+        raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = f"Database issue occurred: {e}")
     
-    return created_appt
\ No newline at end of file
+    return created_appt
+
+async def service_appt_create_single_round_trip(appt: schemas_appts.ApptCreateRequest, db: Database, user_id: int):
+    appt_dict = appt.model_dump()
+
+    try:
+        booking = await db.book_appt(user_id, appt_dict["service_id"], appt_dict["appt_type_name"], appt_dict["appt_starts_at"])
+    except psycopg.Error as e:
+        raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = f"Database issue occurred: {e}")
+    
+    booking_status = booking.pop("booking_status")
+    if booking_status != "booked":
+        status_code, detail = BOOKING_STATUS_ERROR_MAPPING[booking_status]
+        raise HTTPException(status_code = status_code, detail = detail)
+    
+    return booking
+
+def _get_batch_item_error(index: int, status_code: int, detail: str) -> schemas_appts.ApptBatchCreateItemResponse:
+    return schemas_appts.ApptBatchCreateItemResponse(index = index, status_code = status_code, detail = detail)
+
+async def service_appt_batch_create(batch: schemas_appts.ApptBatchCreateRequest, db: Database, user_id: int):
+    """
+    Books many appointments at once: each referenced service and appt type is fetched once, opening hours are validated in memory, conflicts (including between items of the batch) are checked set-wise, and the valid appointments are inserted with one multi-row INSERT.
+    An item that cannot be booked gets the status code that POST /appts would have returned for it; in all_or_nothing mode, nothing is booked if any item fails and the items that would have succeeded get 424.
+    """
+    appts = batch.appts
+    results = [None] * len(appts)
+
+    try:
+        services_from_db, appt_types_from_db = await db.get_services_and_appt_types(
+            {appt.service_id for appt in appts},
+            {(appt.service_id, appt.appt_type_name) for appt in appts}
+        )
+    except psycopg.Error as e:
+        raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = f"Database issue occurred: {e}")
+
+    # validate each item in memory
+    candidates = list() # (index, appt_starts_at, appt_ends_at) of items that passed validation
+    for (index, appt) in enumerate(appts):
+        service_from_db = services_from_db.get(appt.service_id)
+        if service_from_db is None:
+            results[index] = _get_batch_item_error(index, status.HTTP_404_NOT_FOUND, "Service not found")
+            continue
+        appt_type_from_db = appt_types_from_db.get((appt.service_id, appt.appt_type_name))
+        if appt_type_from_db is None:
+            results[index] = _get_batch_item_error(index, status.HTTP_404_NOT_FOUND, "Appt type not found")
+            continue
+        appt_ends_at = appt.appt_starts_at + datetime.timedelta(minutes = int(appt_type_from_db["appt_duration_minutes"]))
+        if not get_weekly_schedule(service_from_db).is_within_hours(appt.appt_starts_at, appt_ends_at):
+            results[index] = _get_batch_item_error(index, status.HTTP_400_BAD_REQUEST, "Could not create appointment due to invalid appointment time")
+            continue
+        candidates.append((index, appt.appt_starts_at, appt_ends_at))
+
+    # conflicts between items of the batch; the earlier item in the request wins
+    accepted_by_key = dict() # (service_id, appt_type_name) -> sorted list of (appt_starts_at, appt_ends_at, index)
+    to_insert = list()
+    for (index, appt_starts_at, appt_ends_at) in candidates:
+        accepted = accepted_by_key.setdefault((appts[index].service_id, appts[index].appt_type_name), list())
+        position = bisect.bisect_left(accepted, (appt_starts_at, ))
+        conflicting = None
+        if position > 0 and accepted[position - 1][1] > appt_starts_at: # previous one ends after this starts
+            conflicting = accepted[position - 1]
+        elif position < len(accepted) and accepted[position][0] < appt_ends_at: # next one starts before this ends
+            conflicting = accepted[position]
+        if conflicting is not None:
+            results[index] = _get_batch_item_error(index, status.HTTP_409_CONFLICT, f"Could not create appointment due to conflict with item {conflicting[2]} of the batch")
+            continue
+        accepted.insert(position, (appt_starts_at, appt_ends_at, index))
+        to_insert.append((index, appt_starts_at, appt_ends_at))
+
+    not_booked_detail = "Not created since another appointment of the batch could not be created"
+    if batch.all_or_nothing and len(to_insert) < len(appts):
+        for (index, _, _) in to_insert:
+            results[index] = _get_batch_item_error(index, status.HTTP_424_FAILED_DEPENDENCY, not_booked_detail)
+        return schemas_appts.ApptBatchCreateResponse(appts = results, created_count = 0)
+
+    # conflicts with existing appointments are checked set-wise by the insert itself
+    inserted_appts = list()
+    if to_insert:
+        try:
+            inserted_appts = await db.insert_appts(
+                [(user_id, appts[index].service_id, appts[index].appt_type_name, appt_starts_at, appt_ends_at) for (index, appt_starts_at, appt_ends_at) in to_insert],
+                all_or_nothing = batch.all_or_nothing
+            )
+            if inserted_appts is None: # all_or_nothing and at least one conflicted, so find out which
+                conflicting_appts = await db.get_conflicting_appts(
+                    [(appts[index].service_id, appts[index].appt_type_name, appt_starts_at, appt_ends_at) for (index, appt_starts_at, appt_ends_at) in to_insert]
+                )
+        except psycopg.Error as e:
+            raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = f"Database issue occurred: {e}")
+
+    if inserted_appts is None:
+        conflicting_indexes = {to_insert[row["batch_index"]][0] for row in conflicting_appts}
+        for (index, _, _) in to_insert:
+            if index in conflicting_indexes:
+                results[index] = _get_batch_item_error(index, status.HTTP_409_CONFLICT, "Could not create appointment due to service having conflict at the time")
+            else:
+                results[index] = _get_batch_item_error(index, status.HTTP_424_FAILED_DEPENDENCY, not_booked_detail)
+        return schemas_appts.ApptBatchCreateResponse(appts = results, created_count = 0)
+
+    # items of the batch do not overlap each other, so (service_id, appt_type_name, appt_starts_at) identifies the item an inserted row belongs to
+    inserted_appt_by_key = {(row["service_id"], row["appt_type_name"], row["appt_starts_at"]): row for row in inserted_appts}
+    for (index, appt_starts_at, _) in to_insert:
+        inserted_appt = inserted_appt_by_key.get((appts[index].service_id, appts[index].appt_type_name, appt_starts_at))
+        if inserted_appt is None:
+            results[index] = _get_batch_item_error(index, status.HTTP_409_CONFLICT, "Could not create appointment due to service having conflict at the time")
+        else:
+            results[index] = schemas_appts.ApptBatchCreateItemResponse(index = index, status_code = status.HTTP_201_CREATED, appt = schemas_appts.ApptCreateResponse(**inserted_appt))
+
+    return schemas_appts.ApptBatchCreateResponse(appts = results, created_count = len(inserted_appts))
+
+async def service_appts_get_page(limit: int | None,
+                                 cursor: str | None,
+                                 starts_from: datetime.datetime | None,
+                                 starts_before: datetime.datetime | None,
+                                 db: Database,
+                                 user_id: int | None = None,
+                                 service_id: int | None = None):
+    """
+    Gets one page of the appointments of a patron (user_id) or of a service (service_id), in time order.
+
+    :param int limit: appointments per page; defaults to APPTS_PAGE_DEFAULT_LIMIT
+    :return: the page of appointments, and the cursor of the next page (None if this is the last page)
+    :rtype: tuple[list, str | None]
+    """
+    limit = limit if limit is not None else CONFIG.APPTS_PAGE_DEFAULT_LIMIT
+    if not (1 <= limit <= CONFIG.APPTS_PAGE_MAX_LIMIT):
+        raise HTTPException(status_code = status.HTTP_400_BAD_REQUEST, detail = f"limit must be between 1 and {CONFIG.APPTS_PAGE_MAX_LIMIT}")
+    if starts_from is not None and starts_before is not None and starts_from >= starts_before:
+        raise HTTPException(status_code = status.HTTP_400_BAD_REQUEST, detail = "starts_from must be before starts_before")
+
+    after = None
+    if cursor is not None:
+        try:
+            position = decode_cursor(cursor, ("appt_starts_at", "appt_id"))
+            after = (datetime.datetime.fromisoformat(position["appt_starts_at"]), int(position["appt_id"]))
+        except (ValueError, TypeError):
+            raise HTTPException(status_code = status.HTTP_400_BAD_REQUEST, detail = "Invalid cursor")
+
+    try:
+        appts_from_db = await db.get_appts_page(limit + 1, user_id = user_id, service_id = service_id, starts_from = starts_from, starts_before = starts_before, after = after) # one extra to know if there is a next page
+    except psycopg.Error as e:
+        raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = f"Database issue occurred: {e}")
+
+    next_cursor = None
+    if len(appts_from_db) > limit:
+        appts_from_db = appts_from_db[:limit]
+        next_cursor = encode_cursor({"appt_starts_at": appts_from_db[-1]["appt_starts_at"].isoformat(), "appt_id": appts_from_db[-1]["appt_id"]})
+
+    return appts_from_db, next_cursor
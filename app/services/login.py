@@ -2,6 +2,7 @@ from fastapi import APIRouter, status, Depends, HTTPException
 from app.schemas import oauth2 as schemas_oauth2
 from app.schemas import users as schemas_users
 from app.utils.util_funcs import is_correct_password
+from app.utils.hashing_executor import HashingExecutorSaturatedError, get_hashing_executor
 from app.database.db import Database
 import psycopg
 import app.core.oauth2 as oauth2
@@ -19,7 +20,12 @@ async def service_login(login_req: OAuth2PasswordRequestForm, db: Database) -> s
     
     user = schemas_users.UserFromDB(**user_from_db)
             
-    if not is_correct_password(login_req.password, user.password):
+    try:
+        is_correct = await get_hashing_executor().run(is_correct_password, login_req.password, user.password)
+    except HashingExecutorSaturatedError as e:
+        raise HTTPException(status_code = status.HTTP_503_SERVICE_UNAVAILABLE, detail = "Server is busy, please retry", headers = {"Retry-After": "1"})
+
+    if not is_correct:
         raise HTTPException(status_code = status.HTTP_403_FORBIDDEN, detail = "Invalid login")
     
     user_id = int(user.user_id)
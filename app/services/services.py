@@ -5,6 +5,12 @@ import psycopg
 from app.core.oauth2 import get_current_user
 from app.schemas import services as schemas_services
 from app.schemas import appt_types as schemas_appt_types
+from app.core.config import CONFIG
+from app.utils.availability import get_available_slots
+from app.utils.service_import import import_services, iter_lines
+from app.utils.util_funcs import encode_cursor, decode_cursor
+from app.utils.responses import encode_rows
+import datetime
 
 async def service_services_create(service: schemas_services.ServiceCreateRequest, db: Database, user_id: int):
 
@@ -22,17 +28,68 @@ async def service_services_create(service: schemas_services.ServiceCreateRequest
     return service_from_db
 
 
-async def service_services_get(db: Database, user_id: int):
+async def service_services_import(chunks, import_format: str, db: Database, user_id: int):
 
     try:
-        services_from_db = await db.get_services_by_host_id(user_id)
+        result = await import_services(db, user_id, iter_lines(chunks), import_format)
     except psycopg.Error as e:
         raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = f"Database issue occurred: {e}")
     
-    if services_from_db is None:
-        raise HTTPException(status_code = status.HTTP_404_NOT_FOUND, detail = "Services not found")
+    return result
+
+
+def _get_after_service_id(cursor: str | None) -> int | None:
+    if cursor is None:
+        return None
+    try:
+        return int(decode_cursor(cursor, ("service_id", ))["service_id"])
+    except (ValueError, TypeError):
+        raise HTTPException(status_code = status.HTTP_400_BAD_REQUEST, detail = "Invalid cursor")
+
+async def service_services_get_page(limit: int, cursor: str | None, db: Database, user_id: int):
+    """
+    :return: the page of services, and the cursor of the next page (None if this is the last page)
+    :rtype: tuple[list, str | None]
+    """
+    if not (1 <= limit <= CONFIG.SERVICES_PAGE_MAX_LIMIT):
+        raise HTTPException(status_code = status.HTTP_400_BAD_REQUEST, detail = f"limit must be between 1 and {CONFIG.SERVICES_PAGE_MAX_LIMIT}")
+    after_service_id = _get_after_service_id(cursor)
+
+    try:
+        services_from_db = await db.get_services_by_host_id_page(user_id, limit + 1, after_service_id) # one extra to know if there is a next page
+    except psycopg.Error as e:
+        raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = f"Database issue occurred: {e}")
     
-    return services_from_db
+    next_cursor = None
+    if len(services_from_db) > limit:
+        services_from_db = services_from_db[:limit]
+        next_cursor = encode_cursor({"service_id": services_from_db[-1]["service_id"]})
+    
+    return services_from_db, next_cursor
+
+def service_services_stream(cursor: str | None, db: Database, user_id: int):
+    """
+    Gets the services of a host as chunks of a JSON array, written as rows arrive from a server-side cursor (memory per request does not grow with the number of services).
+    The cursor is checked here, before the response starts; a database error after that can only abort the response.
+
+    :return: async iterator of bytes
+    """
+    after_service_id = _get_after_service_id(cursor)
+
+    async def iter_chunks():
+        yield b"["
+        chunk = list()
+        is_first = True
+        async for service in db.stream_services_by_host_id(user_id, after_service_id):
+            chunk.append(service)
+            if len(chunk) >= CONFIG.DATABASE_STREAM_ITERSIZE:
+                yield (b"" if is_first else b",") + encode_rows(schemas_services.ServiceGetResponse, chunk)[1:-1] # without the brackets of the array
+                chunk, is_first = list(), False
+        if chunk:
+            yield (b"" if is_first else b",") + encode_rows(schemas_services.ServiceGetResponse, chunk)[1:-1]
+        yield b"]"
+
+    return iter_chunks()
 
 
 async def service_services_get_by_id(service_id: int, db: Database, user_id: int):
@@ -72,4 +129,42 @@ async def service_appt_types_create(service_id: int, appt_type: schemas_appt_typ
         raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = f"Database issue occurred: {e}")
     
     return appt_type_from_db
-    
\ No newline at end of file
+
+async def service_availability_get(service_id: int, appt_type_name: str, start_date: datetime.date, end_date: datetime.date, slot_interval_minutes: int | None, db: Database):
+
+    if end_date < start_date:
+        raise HTTPException(status_code = status.HTTP_400_BAD_REQUEST, detail = "end_date must not be before start_date")
+    
+    if (end_date - start_date).days + 1 > CONFIG.SERVICE_AVAILABILITY_MAX_DAYS:
+        raise HTTPException(status_code = status.HTTP_400_BAD_REQUEST, detail = f"Date range must not exceed {CONFIG.SERVICE_AVAILABILITY_MAX_DAYS} days")
+    
+    if slot_interval_minutes is not None and slot_interval_minutes <= 0:
+        raise HTTPException(status_code = status.HTTP_400_BAD_REQUEST, detail = "slot_interval_minutes must be positive")
+
+    try:
+        service_from_db, appt_type_from_db = await db.get_service_and_appt_type(service_id, appt_type_name)
+    except psycopg.Error as e:
+        raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = f"Database issue occurred: {e}")
+    
+    if service_from_db is None:
+        raise HTTPException(status_code = status.HTTP_404_NOT_FOUND, detail = "Service not found")
+    
+    if appt_type_from_db is None:
+        raise HTTPException(status_code = status.HTTP_404_NOT_FOUND, detail = "Appt type not found")
+    
+    # all appointments in the range are fetched in one query, and the slots are then built in memory
+    range_starts_at = datetime.datetime.combine(start_date, datetime.time.min)
+    range_ends_at = datetime.datetime.combine(end_date + datetime.timedelta(days = 1), datetime.time.min)
+    try:
+        appts_from_db = await db.get_appts_by_service_id_and_appt_type_name_in_range(service_id, appt_type_name, str(range_starts_at), str(range_ends_at))
+    except psycopg.Error as e:
+        raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = f"Database issue occurred: {e}")
+    
+    slots = get_available_slots(service_from_db, appt_type_from_db["appt_duration_minutes"], appts_from_db, start_date, end_date, slot_interval_minutes)
+
+    return {
+        "service_id": service_id,
+        "appt_type_name": appt_type_name,
+        "appt_duration_minutes": appt_type_from_db["appt_duration_minutes"],
+        "slots": slots,
+    }
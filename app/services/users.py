@@ -1,5 +1,6 @@
 from fastapi import APIRouter, status, Depends, HTTPException
 from app.utils.util_funcs import get_hashed_salted_password
+from app.utils.hashing_executor import HashingExecutorSaturatedError, get_hashing_executor
 from app.database.db import Database
 import psycopg
 from app.core.oauth2 import get_current_user
@@ -9,7 +10,10 @@ from app.schemas import oauth2 as schemas_oauth2
 
 async def service_user_create(user: schemas_users.UserCreateRequest, db: Database):
       
-    user.password = get_hashed_salted_password(user.password)
+    try:
+        user.password = await get_hashing_executor().run(get_hashed_salted_password, user.password)
+    except HashingExecutorSaturatedError as e:
+        raise HTTPException(status_code = status.HTTP_503_SERVICE_UNAVAILABLE, detail = "Server is busy, please retry", headers = {"Retry-After": "1"})
 
     try:
         user_from_db = await db.insert_user(**user.model_dump())
@@ -0,0 +1,94 @@
+import datetime
+from collections import defaultdict
+from app.utils.schedule import get_weekly_schedule
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+def _get_booked_intervals_by_date(booked_appts: list) -> dict:
+    """
+    Buckets the booked appointments into per-day intervals (in seconds of day), clipping appointments that span across days.
+
+    :param list booked_appts: rows with appt_starts_at and appt_ends_at
+    :return: mapping of date to a sorted list of (start_second, end_second)
+    :rtype: dict
+    """
+    ret = defaultdict(list)
+    for appt in booked_appts:
+        # timestamps are stored as str(datetime), which fromisoformat parses much faster than strptime
+        appt_starts_at = datetime.datetime.fromisoformat(str(appt["appt_starts_at"]))
+        appt_ends_at = datetime.datetime.fromisoformat(str(appt["appt_ends_at"]))
+        date_in_check = appt_starts_at.date()
+        while date_in_check <= appt_ends_at.date():
+            day_starts_at = datetime.datetime.combine(date_in_check, datetime.time.min)
+            start_second = max(0, int((appt_starts_at - day_starts_at).total_seconds()))
+            end_second = min(SECONDS_PER_DAY, int((appt_ends_at - day_starts_at).total_seconds()))
+            if start_second < end_second:
+                ret[date_in_check].append((start_second, end_second))
+            date_in_check += datetime.timedelta(days = 1)
+    for intervals in ret.values():
+        intervals.sort()
+    return ret
+
+def get_available_slots(service: dict,
+                        appt_duration_minutes: int,
+                        booked_appts: list,
+                        start_date: datetime.date,
+                        end_date: datetime.date,
+                        slot_interval_minutes: int | None = None
+                        ) -> list:
+    """
+    Builds the free appointment slots of a service between start_date and end_date (both inclusive).
+    Each day is represented as the open interval of the service minus the booked intervals, so the cost is linear in the number of days, appointments and slots (no query per candidate slot).
+    Only slots that start and end on the same day are returned; candidate start times are aligned to the opening time of the day.
+
+    :param dict service: service row from the database
+    :param int appt_duration_minutes: duration of the appointment type
+    :param list booked_appts: existing appointments (with appt_starts_at and appt_ends_at) overlapping the range
+    :param date start_date: first day of the range
+    :param date end_date: last day of the range
+    :param int slot_interval_minutes: spacing between candidate start times; defaults to appt_duration_minutes
+    :return: list of dicts with appt_starts_at and appt_ends_at
+    :rtype: list
+    """
+    duration = int(appt_duration_minutes) * 60
+    step = int(slot_interval_minutes or appt_duration_minutes) * 60
+
+    schedule = get_weekly_schedule(service) # opening hours are parsed once per service row, not per day in the range
+    booked_intervals_by_date = _get_booked_intervals_by_date(booked_appts)
+
+    slots = list()
+    date_in_check = start_date
+    while date_in_check <= end_date:
+        open_interval = schedule.get_open_interval(date_in_check.isoweekday())
+        if open_interval is None: # on a day that service is not open
+            date_in_check += datetime.timedelta(days = 1)
+            continue
+
+        open_second, close_second = open_interval
+        day_starts_at = datetime.datetime.combine(date_in_check, datetime.time.min)
+
+        # subtract the booked intervals from the open interval, leaving the free intervals of the day
+        free_intervals = list()
+        free_start = open_second
+        for (booked_start, booked_end) in booked_intervals_by_date.get(date_in_check, ()):
+            if booked_end <= free_start:
+                continue
+            if booked_start >= close_second:
+                break
+            if booked_start > free_start:
+                free_intervals.append((free_start, booked_start))
+            free_start = max(free_start, booked_end)
+        if free_start < close_second:
+            free_intervals.append((free_start, close_second))
+
+        # candidate start times are on the grid open_second + k * step
+        for (free_start, free_end) in free_intervals:
+            slot_start = open_second + -(-(free_start - open_second) // step) * step # ceil to the next grid point
+            while slot_start + duration <= free_end:
+                slot_starts_at = day_starts_at + datetime.timedelta(seconds = slot_start)
+                slots.append({"appt_starts_at": slot_starts_at, "appt_ends_at": slot_starts_at + datetime.timedelta(seconds = duration)})
+                slot_start += step
+
+        date_in_check += datetime.timedelta(days = 1)
+
+    return slots
@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import CONFIG
+
+class HashingExecutorSaturatedError(Exception):
+    pass
+
+class HashingExecutor:
+    """
+    Runs CPU-bound password hashing (bcrypt) off the event loop, in a bounded thread pool (bcrypt releases the GIL while hashing).
+    At most max_workers calls run at once and at most max_queue_depth calls wait for a worker; beyond that, run() raises HashingExecutorSaturatedError so the caller can shed load (e.g. 503) instead of queueing without bound.
+    """
+
+    def __init__(self, max_workers: int, max_queue_depth: int):
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self._executor = None # created on first use
+        self._in_flight = 0 # only changed from the event loop
+        self._stats_lock = threading.Lock() # stats are updated from the worker threads
+        self._stats = {
+            "calls": 0,
+            "rejected": 0,
+            "queue_wait_seconds_total": 0.0,
+            "queue_wait_seconds_max": 0.0,
+            "hash_seconds_total": 0.0,
+            "hash_seconds_max": 0.0,
+        }
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers = self.max_workers, thread_name_prefix = "hashing")
+        return self._executor
+
+    def _run_timed(self, submitted_at: float, func, *args):
+        started_at = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            finished_at = time.perf_counter()
+            queue_wait = started_at - submitted_at
+            hash_time = finished_at - started_at
+            with self._stats_lock:
+                self._stats["calls"] += 1
+                self._stats["queue_wait_seconds_total"] += queue_wait
+                self._stats["queue_wait_seconds_max"] = max(self._stats["queue_wait_seconds_max"], queue_wait)
+                self._stats["hash_seconds_total"] += hash_time
+                self._stats["hash_seconds_max"] = max(self._stats["hash_seconds_max"], hash_time)
+
+    async def run(self, func, *args):
+        """
+        Runs func(*args) in the hashing thread pool and awaits its result.
+
+        :raises HashingExecutorSaturatedError: if all workers are busy and the queue is full
+        """
+        if self._in_flight >= self.max_workers + self.max_queue_depth:
+            with self._stats_lock:
+                self._stats["rejected"] += 1
+            raise HashingExecutorSaturatedError(f"Hashing executor saturated ({self._in_flight} calls in flight)")
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._get_executor(), self._run_timed, time.perf_counter(), func, *args)
+        self._in_flight += 1
+        future.add_done_callback(self._on_done) # when the call finishes in its thread, even if the awaiting request was cancelled before
+        return await asyncio.shield(future) # so cancelling the request does not mark the call done while it still holds (or waits for) a worker
+
+    def _on_done(self, future: asyncio.Future) -> None:
+        self._in_flight -= 1
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["in_flight"] = self._in_flight
+        stats["queue_depth"] = max(0, self._in_flight - self.max_workers)
+        stats["max_workers"] = self.max_workers
+        stats["max_queue_depth"] = self.max_queue_depth
+        return stats
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait = True)
+            self._executor = None
+
+_hashing_executor = None
+
+def get_hashing_executor() -> HashingExecutor:
+    """
+    Gets the HashingExecutor of the app (singleton), built on first use.
+    """
+    global _hashing_executor
+    if _hashing_executor is None:
+        _hashing_executor = HashingExecutor(max_workers = CONFIG.PASSWORD_HASHING_MAX_WORKERS, max_queue_depth = CONFIG.PASSWORD_HASHING_MAX_QUEUE_DEPTH)
+    return _hashing_executor
@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import time
+from typing import Awaitable, Callable
+import psycopg
+from fastapi import HTTPException, status
+from fastapi.responses import Response
+from pydantic import BaseModel
+from app.core.config import CONFIG
+from app.database.db import Database
+from app.utils.log import get_logger
+from app.utils.lru_cache import LRUCache, MISSING
+from app.utils.responses import FastJSONResponse
+
+LOGGER = get_logger(__name__)
+
+IDEMPOTENT_REPLAYED_HEADER = "Idempotent-Replayed"
+
+def get_request_hash(request: BaseModel) -> str:
+    """
+    Hash of a validated request body, to tell a retry (same body) from another request reusing its Idempotency-Key.
+    """
+    return hashlib.sha256(request.model_dump_json().encode()).hexdigest()
+
+class IdempotencyStore:
+    """
+    Makes create requests sent with an Idempotency-Key header safe to retry (e.g. by a mobile client after a timeout): the first request with a key runs and its response is stored in idempotency_keys; a retry with the key gets that response again (with the Idempotent-Replayed header) without running the request.
+    Stored responses are also kept in an in-memory LRU cache, so a retry to the same worker does not touch the database.
+    A duplicate arriving while the first request is still in progress waits for it: on an asyncio future in the same worker, or by polling the key in another worker; after wait_timeout_seconds it gets 409.
+    Keys are per user. 2xx and 4xx responses are stored; on a 5xx (or an exception) the key is released, so a retry runs again.
+    """
+
+    def __init__(self, cache_max_size: int, ttl_seconds: float, in_progress_timeout_seconds: float, wait_timeout_seconds: float, poll_interval_seconds: float, purge_interval_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.in_progress_timeout_seconds = in_progress_timeout_seconds
+        self.wait_timeout_seconds = wait_timeout_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.purge_interval_seconds = purge_interval_seconds
+        self.cache = LRUCache(cache_max_size) # (user_id, idempotency_key) -> stored response
+        self._in_flight = dict() # (user_id, idempotency_key) -> future of the stored response, or of None if the key was released
+        self._purged_at = time.monotonic()
+        self._purge_task = None
+
+    @classmethod
+    def from_config(cls) -> "IdempotencyStore":
+        return cls(
+            cache_max_size = CONFIG.IDEMPOTENCY_CACHE_MAX_SIZE,
+            ttl_seconds = CONFIG.IDEMPOTENCY_KEY_TTL_SECONDS,
+            in_progress_timeout_seconds = CONFIG.IDEMPOTENCY_IN_PROGRESS_TIMEOUT_SECONDS,
+            wait_timeout_seconds = CONFIG.IDEMPOTENCY_WAIT_TIMEOUT_SECONDS,
+            poll_interval_seconds = CONFIG.IDEMPOTENCY_POLL_INTERVAL_SECONDS,
+            purge_interval_seconds = CONFIG.IDEMPOTENCY_PURGE_INTERVAL_SECONDS,
+        )
+
+    async def run(self, db: Database, user_id: int, idempotency_key: str | None, route: str, request_hash: str, handler: Callable[[], Awaitable[Response]]) -> Response:
+        """
+        :param int user_id: user sending the request
+        :param str idempotency_key: the Idempotency-Key header of the request; if None, handler is just run
+        :param str route: e.g. "POST /appts"; a key reused on another route, or with another body (request_hash), gets 422
+        :param str request_hash: see get_request_hash
+        :param handler: runs the request and returns its response; an HTTPException it raises is the response
+        :return: the response of the request, or the stored response of the first request with the key
+        :rtype: Response
+        """
+        if idempotency_key is None:
+            return await handler()
+
+        self._maybe_purge(db)
+        key = (user_id, idempotency_key)
+        deadline = time.monotonic() + self.wait_timeout_seconds
+        while True:
+            stored = self.cache.get(key)
+            if stored is not MISSING:
+                return self._replay(stored, route, request_hash)
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                break
+            try:
+                stored = await asyncio.wait_for(asyncio.shield(in_flight), max(deadline - time.monotonic(), 0))
+            except TimeoutError:
+                raise self._get_in_progress_exception()
+            if stored is not None:
+                return self._replay(stored, route, request_hash)
+            # the first request was released (e.g. it failed with a 500), so this one claims the key
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            stored = await self._claim(db, user_id, idempotency_key, route, request_hash, deadline)
+            if stored is not None:
+                self.cache.set(key, stored, time.time() + self.ttl_seconds)
+                future.set_result(stored)
+                return self._replay(stored, route, request_hash)
+
+            response = await self._run_handler(db, user_id, idempotency_key, handler)
+            if response.status_code >= 500:
+                await self._release(db, user_id, idempotency_key)
+                return response
+
+            stored = {"route": route, "request_hash": request_hash, "status_code": response.status_code, "body": bytes(response.body)}
+            try:
+                await db.complete_idempotency_key(user_id, idempotency_key, response.status_code, stored["body"])
+            except psycopg.Error:
+                # the request did run, so its response is still returned and cached here; a retry to another worker runs again once the key times out in progress
+                LOGGER.exception("Could not store the response for an idempotency key")
+            self.cache.set(key, stored, time.time() + self.ttl_seconds)
+            future.set_result(stored)
+            return response
+        finally:
+            if not future.done():
+                future.set_result(None)
+            self._in_flight.pop(key, None)
+
+    async def _claim(self, db: Database, user_id: int, idempotency_key: str, route: str, request_hash: str, deadline: float) -> dict | None:
+        """
+        :return: None if the key was claimed for this request, else the stored response of the first request with the key (waiting for it if in progress in another worker)
+        """
+        while True:
+            try:
+                row = await db.claim_idempotency_key(user_id, idempotency_key, route, request_hash, self.in_progress_timeout_seconds, self.ttl_seconds)
+            except psycopg.Error as e:
+                raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = f"Database issue occurred: {e}")
+            if row is not None:
+                if row["is_claimed"]:
+                    return None
+                if row["route"] != route or row["request_hash"] != request_hash:
+                    raise self._get_mismatch_exception()
+                if row["response_status_code"] is not None:
+                    return {"route": row["route"], "request_hash": row["request_hash"], "status_code": row["response_status_code"], "body": bytes(row["response_body"])}
+                if time.monotonic() >= deadline:
+                    raise self._get_in_progress_exception()
+                await asyncio.sleep(self.poll_interval_seconds)
+
+    async def _run_handler(self, db: Database, user_id: int, idempotency_key: str, handler: Callable[[], Awaitable[Response]]) -> Response:
+        try:
+            return await handler()
+        except HTTPException as e:
+            if e.status_code >= 500:
+                await self._release(db, user_id, idempotency_key)
+                raise e
+            return FastJSONResponse({"detail": e.detail}, status_code = e.status_code, headers = e.headers) # as FastAPI would have returned it
+        except BaseException:
+            await self._release(db, user_id, idempotency_key)
+            raise
+
+    async def _release(self, db: Database, user_id: int, idempotency_key: str) -> None:
+        try:
+            await db.release_idempotency_key(user_id, idempotency_key)
+        except psycopg.Error:
+            LOGGER.exception("Could not release an idempotency key") # it is claimed again once it times out in progress
+
+    def _replay(self, stored: dict, route: str, request_hash: str) -> Response:
+        if stored["route"] != route or stored["request_hash"] != request_hash:
+            raise self._get_mismatch_exception()
+        return Response(content = stored["body"], status_code = stored["status_code"], media_type = "application/json", headers = {IDEMPOTENT_REPLAYED_HEADER: "true"})
+
+    def _get_mismatch_exception(self) -> HTTPException:
+        return HTTPException(status_code = status.HTTP_422_UNPROCESSABLE_ENTITY, detail = "Idempotency-Key was already used for another request")
+
+    def _get_in_progress_exception(self) -> HTTPException:
+        return HTTPException(status_code = status.HTTP_409_CONFLICT, detail = "A request with this Idempotency-Key is still in progress; retry later")
+
+    def _maybe_purge(self, db: Database) -> None:
+        """
+        Deletes the expired keys in the background, at most once per purge_interval_seconds.
+        """
+        if time.monotonic() - self._purged_at < self.purge_interval_seconds or (self._purge_task is not None and not self._purge_task.done()):
+            return
+        self._purged_at = time.monotonic()
+        self._purge_task = asyncio.create_task(self._purge(db))
+
+    async def _purge(self, db: Database) -> None:
+        try:
+            await db.delete_expired_idempotency_keys(self.ttl_seconds)
+        except psycopg.Error:
+            LOGGER.exception("Could not delete the expired idempotency keys")
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+_idempotency_store = None
+
+def get_idempotency_store() -> IdempotencyStore:
+    """
+    Gets the IdempotencyStore of the app (singleton), built on first use.
+    """
+    global _idempotency_store
+    if _idempotency_store is None:
+        _idempotency_store = IdempotencyStore.from_config()
+    return _idempotency_store
@@ -0,0 +1,203 @@
+import datetime
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import time
+import traceback
+import contextvars
+import uuid
+import orjson
+from app.core.config import CONFIG
+
+# id of the request being handled (see RequestIdMiddleware), added to each log record
+REQUEST_ID = contextvars.ContextVar("request_id", default = None)
+REQUEST_ID_HEADER = b"x-request-id"
+VALID_REQUEST_ID_REGEX = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+# attributes every LogRecord has; any other attribute comes from extra = {...} and is logged as a field
+_STANDARD_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    :param str name: name of the module logging, e.g. __name__; its logger is under the "app" logger that setup_logging configures
+    """
+    return logging.getLogger(name if name == "app" or name.startswith("app.") else f"app.{name}")
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line: time, level, logger, message, request id, the fields passed with extra = {...}, and the traceback if any.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "at": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for (name, value) in vars(record).items():
+            if name not in _STANDARD_RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info:
+            entry["exc_type"] = record.exc_info[0].__name__ if record.exc_info[0] is not None else None
+            entry["exc"] = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return orjson.dumps(entry, default = str).decode()
+
+class TextFormatter(logging.Formatter):
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = None
+        return super().format(record)
+
+class ErrorDedupFilter(logging.Filter):
+    """
+    Lets through at most max_per_window records of each kind of error (same logger, message template and exception type) per window, and then a sample of them (sample_rate),
+    so that an incident (e.g. the database going down, failing every request the same way) logs a handful of tracebacks instead of one per request.
+    The next record of a kind that gets through carries the number of those suppressed before it (suppressed).
+    Records below ERROR always get through.
+    """
+
+    def __init__(self, window_seconds: float, max_per_window: int, sample_rate: float, max_kinds: int = 1000):
+        super().__init__()
+        self.window_seconds = window_seconds
+        self.max_per_window = max_per_window
+        self.sample_rate = sample_rate
+        self.max_kinds = max_kinds
+        self._kinds = dict() # kind -> [window started at, records in the window, suppressed since the last one through]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.ERROR:
+            return True
+        kind = (record.name, record.msg, record.exc_info[0] if record.exc_info else None)
+        now = time.monotonic()
+        state = self._kinds.get(kind)
+        if state is None or now - state[0] >= self.window_seconds:
+            if state is None and len(self._kinds) >= self.max_kinds:
+                self._kinds.clear() # e.g. messages formatted with f-strings rather than arguments make every record its own kind
+            state = [now, 0, state[2] if state is not None else 0]
+            self._kinds[kind] = state
+        state[1] += 1
+        if state[1] > self.max_per_window and random.random() >= self.sample_rate:
+            state[2] += 1
+            return False
+        if state[2]:
+            record.suppressed = state[2]
+            state[2] = 0
+        return True
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to a QueueListener, whose thread formats and writes them, so logging on the request path never waits on I/O (e.g. a slow or blocked stderr).
+    The queue is bounded: if the writer falls behind, records are dropped rather than queued without bound, and the next record through carries the number dropped (dropped).
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped_count = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # only what must be done in the calling thread: merge the arguments (they may change once we return) and take the request id; the traceback is formatted by the listener
+        record.msg = record.getMessage()
+        record.args = None
+        record.request_id = REQUEST_ID.get()
+        if self.dropped_count:
+            record.dropped = self.dropped_count
+            self.dropped_count = 0
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped_count += 1
+
+class _StderrHandler(logging.StreamHandler):
+    """
+    Writes to the current sys.stderr (e.g. as replaced by pytest), not the one at setup.
+    """
+
+    @property
+    def stream(self):
+        return sys.stderr
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+_listener = None
+
+def setup_logging(level: str | None = None, log_format: str | None = None, handler: logging.Handler | None = None) -> None:
+    """
+    Configures the "app" logger: records go through a bounded queue to a background thread that writes them (as JSON, or text) to stderr, with repeated errors deduplicated and sampled.
+    Calling it again replaces the previous setup.
+
+    :param str level: defaults to LOG_LEVEL
+    :param str log_format: "json" or "text"; defaults to LOG_FORMAT
+    :param Handler handler: where the records are written; defaults to stderr
+    """
+    shutdown_logging()
+    global _listener
+    handler = handler if handler is not None else _StderrHandler()
+    handler.setFormatter(TextFormatter() if (log_format or CONFIG.LOG_FORMAT) == "text" else JsonFormatter())
+    queue_handler = AsyncQueueHandler(queue.Queue(CONFIG.LOG_QUEUE_MAX_SIZE))
+    queue_handler.addFilter(ErrorDedupFilter(CONFIG.LOG_ERROR_DEDUP_WINDOW_SECONDS, CONFIG.LOG_ERROR_DEDUP_MAX_PER_WINDOW, CONFIG.LOG_ERROR_SAMPLE_RATE))
+
+    logger = logging.getLogger("app")
+    for existing_handler in list(logger.handlers):
+        logger.removeHandler(existing_handler)
+    logger.addHandler(queue_handler)
+    logger.setLevel(level or CONFIG.LOG_LEVEL)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, handler, respect_handler_level = True)
+    _listener.start()
+
+def shutdown_logging() -> None:
+    """
+    Writes out the records still queued and stops the writer thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware that sets the id of each request (its X-Request-ID header if valid, e.g. from a load balancer, else a new one) for its log records, and returns it in the X-Request-ID response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for (name, value) in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")
+                break
+        if request_id is None or not VALID_REQUEST_ID_REGEX.match(request_id):
+            request_id = uuid.uuid4().hex
+        token = REQUEST_ID.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(REQUEST_ID_HEADER, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            REQUEST_ID.reset(token)
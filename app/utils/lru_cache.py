@@ -0,0 +1,63 @@
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object() # returned by LRUCache.get on a miss, so that None can be cached as a value
+
+class LRUCache:
+    """
+    Bounded least-recently-used cache whose entries can also expire at a given time (time.time() based).
+    Thread-safe, since sync FastAPI dependencies run in a threadpool.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict() # key -> (value, expires_at or None)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default = MISSING):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, expires_at: float | None = None) -> None:
+        """
+        :param key: key of the entry
+        :param value: value of the entry
+        :param float expires_at: unix timestamp after which the entry is no longer returned; None for no expiry
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last = False)
+                self.evictions += 1
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> dict:
+        return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
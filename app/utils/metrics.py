@@ -0,0 +1,229 @@
+import bisect
+import contextvars
+import functools
+import inspect
+import time
+
+# name of the Database method being awaited, e.g. for the slow query log
+CURRENT_DB_METHOD = contextvars.ContextVar("current_db_method", default = None)
+
+# (stat of HashingExecutor.get_stats, metric name, metric type, help text)
+HASHING_STAT_METRICS = (
+    ("calls", "appt_password_hashing_calls_total", "counter", "Password hashing calls run."),
+    ("rejected", "appt_password_hashing_rejected_total", "counter", "Password hashing calls rejected because the executor was saturated."),
+    ("queue_wait_seconds_total", "appt_password_hashing_queue_wait_seconds_total", "counter", "Time password hashing calls waited for a worker."),
+    ("hash_seconds_total", "appt_password_hashing_seconds_total", "counter", "Time spent hashing passwords."),
+    ("queue_wait_seconds_max", "appt_password_hashing_queue_wait_seconds_max", "gauge", "Longest wait of a password hashing call for a worker."),
+    ("hash_seconds_max", "appt_password_hashing_seconds_max", "gauge", "Longest password hashing call."),
+    ("in_flight", "appt_password_hashing_in_flight", "gauge", "Password hashing calls running or waiting for a worker."),
+    ("queue_depth", "appt_password_hashing_queue_depth", "gauge", "Password hashing calls waiting for a worker."),
+    ("max_workers", "appt_password_hashing_max_workers", "gauge", "Workers of the password hashing executor."),
+    ("max_queue_depth", "appt_password_hashing_max_queue_depth", "gauge", "Calls that may wait for a password hashing worker before new ones are rejected."),
+)
+
+LATENCY_BUCKETS_SECONDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class LatencySeries:
+    """
+    Latency histogram, row count and error count of one Database method or route.
+    Recording is a few integer increments with no lock: the event loop runs one coroutine at a time, and buckets are only made cumulative when scraped.
+    """
+    __slots__ = ("bucket_counts", "seconds_sum", "count", "row_count", "error_count")
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS_SECONDS) + 1) # last one is +Inf
+        self.seconds_sum = 0.0
+        self.count = 0
+        self.row_count = 0
+        self.error_count = 0
+
+    def observe(self, seconds: float, row_count: int = 0, is_error: bool = False) -> None:
+        self.bucket_counts[bisect.bisect_left(LATENCY_BUCKETS_SECONDS, seconds)] += 1
+        self.seconds_sum += seconds
+        self.count += 1
+        self.row_count += row_count
+        if is_error:
+            self.error_count += 1
+
+def _escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(labels: tuple) -> str:
+    return ",".join(f'{name}="{_escape_label_value(value)}"' for (name, value) in labels)
+
+class Metrics:
+    """
+    Metrics of the Database methods (see instrument_methods) and of the routes (see MetricsMiddleware), rendered in the Prometheus text format on scrape.
+    """
+
+    def __init__(self):
+        self.enabled = True # set from METRICS_ENABLED when the app is built (see app/main.py); when False nothing is recorded
+        self.db_series = dict() # method name -> LatencySeries
+        self.http_series = dict() # (method, route) -> LatencySeries
+        self.http_status_counts = dict() # (method, route, status code) -> count
+
+    def get_db_series(self, method_name: str) -> LatencySeries:
+        series = self.db_series.get(method_name)
+        if series is None:
+            series = self.db_series.setdefault(method_name, LatencySeries())
+        return series
+
+    def observe_http(self, method: str, route: str, status_code: int, seconds: float) -> None:
+        key = (method, route)
+        series = self.http_series.get(key)
+        if series is None:
+            series = self.http_series.setdefault(key, LatencySeries())
+        series.observe(seconds, is_error = status_code >= 500)
+        status_key = (method, route, status_code)
+        self.http_status_counts[status_key] = self.http_status_counts.get(status_key, 0) + 1
+
+    def clear(self) -> None:
+        self.db_series.clear()
+        self.http_series.clear()
+        self.http_status_counts.clear()
+
+    @staticmethod
+    def _render_histogram(lines: list, name: str, help_text: str, series_by_labels: list) -> None:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for (labels, series) in series_by_labels:
+            label_text = _format_labels(labels)
+            cumulative_count = 0
+            for (upper_bound, bucket_count) in zip(LATENCY_BUCKETS_SECONDS + ("+Inf", ), series.bucket_counts):
+                cumulative_count += bucket_count
+                lines.append(f'{name}_bucket{{{label_text},le="{upper_bound}"}} {cumulative_count}')
+            lines.append(f"{name}_sum{{{label_text}}} {series.seconds_sum}")
+            lines.append(f"{name}_count{{{label_text}}} {series.count}")
+
+    @staticmethod
+    def _render_values(lines: list, name: str, metric_type: str, help_text: str, values_by_labels: list) -> None:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for (labels, value) in values_by_labels:
+            lines.append(f"{name}{{{_format_labels(labels)}}} {value}" if labels else f"{name} {value}")
+
+    def render(self, pool_stats: dict | None = None, hashing_stats: dict | None = None) -> str:
+        """
+        Renders the metrics in the Prometheus text format (version 0.0.4).
+
+        :param dict pool_stats: statistics of the connection pools (see Database.get_pool_stats), rendered as gauges
+        :param dict hashing_stats: statistics of the password hashing executor (see HashingExecutor.get_stats), rendered as counters and gauges
+        :return: the metrics
+        :rtype: str
+        """
+        lines = list()
+        db_series = sorted((((("method", method_name), ), series) for (method_name, series) in list(self.db_series.items())), key = lambda item: item[0])
+        http_series = sorted((((("method", method), ("route", route)), series) for ((method, route), series) in list(self.http_series.items())), key = lambda item: item[0])
+
+        self._render_histogram(lines, "appt_db_query_duration_seconds", "Duration of Database method calls.", db_series)
+        self._render_values(lines, "appt_db_query_rows_total", "counter", "Rows returned by Database method calls.", [(labels, series.row_count) for (labels, series) in db_series])
+        self._render_values(lines, "appt_db_query_errors_total", "counter", "Database method calls that raised.", [(labels, series.error_count) for (labels, series) in db_series])
+
+        self._render_histogram(lines, "appt_http_request_duration_seconds", "Duration of requests by route.", http_series)
+        self._render_values(lines, "appt_http_request_errors_total", "counter", "Requests by route that failed with a 5xx status code.", [(labels, series.error_count) for (labels, series) in http_series])
+        self._render_values(lines, "appt_http_responses_total", "counter", "Responses by route and status code.", sorted((((("method", method), ("route", route), ("status", status_code)), count) for ((method, route, status_code), count) in list(self.http_status_counts.items()))))
+
+        pool_values = dict() # stat name -> [(labels, value)]
+        for (pool_name, stats) in sorted((pool_stats or dict()).items()):
+            for (stat_name, value) in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    pool_values.setdefault(stat_name, list()).append(((("pool", pool_name), ), value))
+        for (stat_name, values_by_labels) in sorted(pool_values.items()):
+            self._render_values(lines, f"appt_db_pool_{stat_name}", "gauge", f"Connection pool statistic {stat_name} (counters restart when the pool statistics are reset).", values_by_labels)
+
+        if hashing_stats is not None:
+            for (stat_name, name, metric_type, help_text) in HASHING_STAT_METRICS:
+                if stat_name in hashing_stats:
+                    self._render_values(lines, name, metric_type, help_text, [((), hashing_stats[stat_name])])
+        return "\n".join(lines) + "\n"
+
+def _count_rows(res) -> int:
+    if isinstance(res, list):
+        return len(res)
+    if isinstance(res, dict):
+        return 1
+    if isinstance(res, tuple) and res and isinstance(res[0], list): # e.g. copy_services
+        return len(res[0])
+    return 0
+
+def _instrument(method, metrics: "Metrics", series: LatencySeries):
+    if inspect.isasyncgenfunction(method):
+        @functools.wraps(method)
+        async def asyncgen_wrapper(*args, **kwargs):
+            started_at = time.perf_counter()
+            row_count = 0
+            is_error = False
+            rows = method(*args, **kwargs)
+            try:
+                async for row in rows:
+                    row_count += 1
+                    yield row
+            except Exception:
+                is_error = True
+                raise
+            finally:
+                await rows.aclose() # if the caller stopped early, releases e.g. the pooled connection now rather than when garbage collected
+                if metrics.enabled:
+                    series.observe(time.perf_counter() - started_at, row_count, is_error) # until the iteration finishes
+        return asyncgen_wrapper
+
+    method_name = method.__name__
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        started_at = time.perf_counter()
+        token = CURRENT_DB_METHOD.set(method_name)
+        try:
+            res = await method(*args, **kwargs)
+        except Exception:
+            if metrics.enabled:
+                series.observe(time.perf_counter() - started_at, is_error = True)
+            raise
+        finally:
+            CURRENT_DB_METHOD.reset(token)
+        if metrics.enabled:
+            series.observe(time.perf_counter() - started_at, _count_rows(res))
+        return res
+    return wrapper
+
+def instrument_methods(metrics: "Metrics"):
+    """
+    Class decorator that records the latency, rows and errors of every public async method (and async generator) of the class in metrics, while metrics.enabled.
+    """
+    def decorator(cls):
+        for (name, method) in list(vars(cls).items()):
+            if name.startswith("_") or not (inspect.iscoroutinefunction(method) or inspect.isasyncgenfunction(method)):
+                continue
+            setattr(cls, name, _instrument(method, metrics, metrics.get_db_series(name)))
+        return cls
+    return decorator
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that records the latency and status code of each request by route template (e.g. /api/v1/services/{service_id}), so the number of series stays bounded.
+    """
+
+    def __init__(self, app, metrics: "Metrics"):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started_at = time.perf_counter()
+        status_code = 500 # if the app raises before starting the response
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route") # set by the router once matched
+            self.metrics.observe_http(scope["method"], route.path if route is not None else "unmatched", status_code, time.perf_counter() - started_at)
+
+METRICS = Metrics()
@@ -0,0 +1,64 @@
+import orjson
+from typing import Any
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, TypeAdapter
+from app.core.config import CONFIG
+
+ORJSON_OPTIONS = orjson.OPT_UTC_Z # datetimes as pydantic writes them (Z instead of +00:00)
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse that encodes with orjson, and encodes pydantic models as they are (no further validation).
+    A route returning a Response is not validated against its response_model by FastAPI, so response_model is kept only for the docs.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default = _default, option = ORJSON_OPTIONS)
+
+_FIELD_NAMES = dict() # model -> (tuple, frozenset) of its field names
+_LIST_ADAPTERS = dict() # model -> TypeAdapter of a list of the model
+
+def _get_field_names(model: type[BaseModel]) -> tuple:
+    field_names = _FIELD_NAMES.get(model)
+    if field_names is None:
+        field_names = _FIELD_NAMES[model] = (tuple(model.model_fields), frozenset(model.model_fields))
+    return field_names
+
+def _get_list_adapter(model: type[BaseModel]) -> TypeAdapter:
+    list_adapter = _LIST_ADAPTERS.get(model)
+    if list_adapter is None:
+        list_adapter = _LIST_ADAPTERS[model] = TypeAdapter(list[model])
+    return list_adapter
+
+def encode_rows(model: type[BaseModel], rows: list, validate: bool | None = None) -> bytes:
+    """
+    Encodes rows from the database as a JSON array of model, without building a model per row.
+
+    :param model: response model of each row
+    :param list rows: dicts (e.g. from dict_row) with at least the fields of model
+    :param bool validate: if True, validates the rows against model once (pydantic-core) before encoding; if False, the rows are trusted and only their model fields are encoded (the rows as they are when they have no other columns); defaults to RESPONSE_VALIDATE_DB_ROWS
+    :return: JSON array
+    :rtype: bytes
+    """
+    validate = validate if validate is not None else CONFIG.RESPONSE_VALIDATE_DB_ROWS
+    if validate:
+        list_adapter = _get_list_adapter(model)
+        return list_adapter.dump_json(list_adapter.validate_python(rows))
+    field_names, field_name_set = _get_field_names(model)
+    if rows and rows[0].keys() == field_name_set: # rows of one query have the same columns, so they are encoded as they are
+        return orjson.dumps(rows, option = ORJSON_OPTIONS)
+    return orjson.dumps([{field_name: row[field_name] for field_name in field_names} for row in rows], option = ORJSON_OPTIONS)
+
+def rows_response(model: type[BaseModel], rows: list, status_code: int = 200, headers: dict | None = None, validate: bool | None = None) -> Response:
+    """
+    Response of a JSON array of model, from rows from the database (see encode_rows).
+
+    :param int status_code: status code of the response (the status_code of the route is not applied to a returned Response)
+    :param dict headers: headers of the response (headers set on an injected Response are not applied to a returned Response)
+    """
+    return Response(encode_rows(model, rows, validate), status_code = status_code, headers = headers, media_type = "application/json")
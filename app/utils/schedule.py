@@ -0,0 +1,112 @@
+import datetime
+from app.core.config import CONFIG
+from app.utils.lru_cache import LRUCache, MISSING
+from app.utils.util_funcs import get_formatted_time, IS_OPEN_WEEKDAY_MAPPING, OPEN_TIME_WEEKDAY_MAPPING, CLOSE_TIME_WEEKDAY_MAPPING
+
+def get_seconds_of_day(t: datetime.time) -> int:
+    return t.hour * 3600 + t.minute * 60 + t.second
+
+class WeeklySchedule:
+    """
+    Opening hours of a service, parsed once from the service row into seconds of day per isoweekday.
+    Checking whether an appointment fits in the opening hours is O(1) regardless of how many days it spans: weekdays repeat, so whether every day strictly between the start and end day is open the whole day is looked up in a table precomputed for each (first weekday, number of days up to 7).
+    """
+    __slots__ = ("open_seconds", "close_seconds", "_is_full_day_run")
+
+    def __init__(self, open_seconds: tuple, close_seconds: tuple):
+        """
+        :param tuple open_seconds: opening second of day indexed by isoweekday (index 0 unused), None if the service is not open that day
+        :param tuple close_seconds: closing second of day indexed by isoweekday (index 0 unused), None if the service is not open that day
+        """
+        self.open_seconds = open_seconds
+        self.close_seconds = close_seconds
+
+        min_second = get_seconds_of_day(get_formatted_time(CONFIG.SERVICE_MIN_TIME)) # 00:00:00
+        max_second = get_seconds_of_day(get_formatted_time(CONFIG.SERVICE_MAX_TIME)) # 23:59:59
+        is_full_day = [False] + [open_seconds[weekday] == min_second and close_seconds[weekday] == max_second for weekday in range(1, 8)]
+
+        # _is_full_day_run[first_weekday][n]: whether the n consecutive days starting on first_weekday are all open the whole day
+        is_full_day_run = [()]
+        for first_weekday in range(1, 8):
+            run = [True]
+            for n in range(1, 8):
+                run.append(run[-1] and is_full_day[(first_weekday + n - 2) % 7 + 1])
+            is_full_day_run.append(tuple(run))
+        self._is_full_day_run = tuple(is_full_day_run)
+
+    @classmethod
+    def from_service(cls, service: dict) -> "WeeklySchedule":
+        """
+        :param dict service: service row from the database
+        """
+        open_seconds = [None] * 8
+        close_seconds = [None] * 8
+        for weekday in range(1, 8):
+            if service[IS_OPEN_WEEKDAY_MAPPING[weekday]]:
+                open_seconds[weekday] = get_seconds_of_day(get_formatted_time(service[OPEN_TIME_WEEKDAY_MAPPING[weekday]]))
+                close_seconds[weekday] = get_seconds_of_day(get_formatted_time(service[CLOSE_TIME_WEEKDAY_MAPPING[weekday]]))
+        return cls(tuple(open_seconds), tuple(close_seconds))
+
+    def get_open_interval(self, weekday: int) -> tuple | None:
+        """
+        :param int weekday: isoweekday (1 = Monday, 7 = Sunday)
+        :return: (open_second, close_second) of the weekday, or None if the service is not open that day
+        :rtype: tuple | None
+        """
+        open_second = self.open_seconds[weekday]
+        if open_second is None:
+            return None
+        return (open_second, self.close_seconds[weekday])
+
+    def _is_open_at(self, weekday: int, second: int) -> bool:
+        open_second = self.open_seconds[weekday]
+        return open_second is not None and open_second <= second <= self.close_seconds[weekday]
+
+    def is_within_hours(self, appt_starts_at: datetime.datetime, appt_ends_at: datetime.datetime) -> bool:
+        """
+        Whether an appointment fits in the opening hours: the service must be open at its start and at its end, and open the whole day on every day inbetween (e.g. hotel booking).
+
+        :param datetime appt_starts_at: start of the appointment
+        :param datetime appt_ends_at: end of the appointment
+        :return: boolean indicating whether the appointment is within the opening hours
+        :rtype: bool
+        """
+        start_weekday = appt_starts_at.isoweekday()
+        if not self._is_open_at(start_weekday, get_seconds_of_day(appt_starts_at.time())): # start day
+            return False
+        if not self._is_open_at(appt_ends_at.isoweekday(), get_seconds_of_day(appt_ends_at.time())): # last day
+            return False
+        days_inbetween = (appt_ends_at.date() - appt_starts_at.date()).days - 1
+        if days_inbetween > 0:
+            return self._is_full_day_run[start_weekday % 7 + 1][min(days_inbetween, 7)]
+        return True
+
+_schedule_cache = None
+
+def get_schedule_cache() -> LRUCache:
+    """
+    Gets the cache of schedules, keyed by (service_id, updated_at) so that a service that gets updated gets a new schedule; built on first use.
+    """
+    global _schedule_cache
+    if _schedule_cache is None:
+        _schedule_cache = LRUCache(CONFIG.SERVICE_SCHEDULE_CACHE_MAX_SIZE)
+    return _schedule_cache
+
+def get_weekly_schedule(service: dict) -> WeeklySchedule:
+    """
+    Gets the WeeklySchedule of a service row, reusing the one built for an earlier request if the row has not changed.
+
+    :param dict service: service row from the database
+    :return: schedule of the service
+    :rtype: WeeklySchedule
+    """
+    service_id = service.get("service_id")
+    if service_id is None: # not a row from the database, so nothing to key it by
+        return WeeklySchedule.from_service(service)
+    key = (service_id, str(service.get("updated_at")))
+    schedule_cache = get_schedule_cache()
+    schedule = schedule_cache.get(key)
+    if schedule is MISSING:
+        schedule = WeeklySchedule.from_service(service)
+        schedule_cache.set(key, schedule)
+    return schedule
@@ -0,0 +1,163 @@
+import asyncio
+import codecs
+import csv
+import orjson
+import pydantic
+from app.core.config import CONFIG
+from app.database.db import Database, SERVICE_INSERT_COLUMNS
+from app.schemas import services as schemas_services
+
+SERVICE_IMPORT_FORMATS = ("csv", "ndjson")
+
+async def iter_lines(chunks):
+    """
+    Splits a stream of bytes (e.g. the body of a request) into lines, without reading it whole into memory.
+
+    :param chunks: async iterable of bytes
+    :return: async iterator of str, without line endings
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final = True)
+    if pending:
+        yield pending.rstrip("\r")
+
+def _get_validation_error_detail(e: pydantic.ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(loc) for loc in error['loc']) or 'row'}: {error['msg']}" for error in e.errors())
+
+class ServiceImport:
+    """
+    Imports services (and their appt types) of one host from CSV or NDJSON lines, validating each row with ServiceImportRow (the ServiceCreateRequest rules) and inserting valid rows in batches with Database.copy_services.
+    CSV has a header line with the ServiceCreateRequest fields (empty cells take the default) and optionally appt_types as a JSON array; NDJSON has one such object per line. CSV fields cannot contain line breaks.
+    Each batch is committed on its own, so a database error partway leaves the earlier batches imported.
+    While a batch is being copied into the database, the next one is parsed and validated.
+    """
+
+    def __init__(self, db: Database, host_id: int, import_format: str, batch_size: int | None = None):
+        if import_format not in SERVICE_IMPORT_FORMATS:
+            raise ValueError(f"import_format must be one of {SERVICE_IMPORT_FORMATS}")
+        self.db = db
+        self.host_id = host_id
+        self.import_format = import_format
+        self.batch_size = batch_size if batch_size is not None else CONFIG.SERVICE_IMPORT_BATCH_SIZE
+        self.imported_count = 0
+        self.appt_types_imported_count = 0
+        self.errors = list()
+        self._line_number_by_phone_number = dict() # first line of each phone_number, to report duplicates within the file
+        self._batch = list() # (line_number, ServiceImportRow)
+        self._pending_import = None # task importing the previous batch
+        self._csv_header = None
+
+    def _parse_line(self, line: str) -> dict:
+        if self.import_format == "ndjson":
+            record = orjson.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("line is not a JSON object")
+            return record
+        values = next(csv.reader([line]))
+        if len(values) != len(self._csv_header):
+            raise ValueError(f"expected {len(self._csv_header)} fields, got {len(values)}")
+        return {key: value for (key, value) in zip(self._csv_header, values) if value != ""} # empty cells take the default
+
+    def _add_error(self, line_number: int, detail: str) -> None:
+        self.errors.append(schemas_services.ServiceImportError(line_number = line_number, detail = detail))
+
+    async def add_line(self, line_number: int, line: str) -> None:
+        """
+        Validates one line of the file, and imports the batch it completes (if any).
+        """
+        if not line.strip():
+            return
+        if self.import_format == "csv" and self._csv_header is None:
+            self._csv_header = next(csv.reader([line]))
+            return
+
+        try:
+            record = self._parse_line(line)
+            row = schemas_services.ServiceImportRow.model_validate(record)
+        except pydantic.ValidationError as e:
+            self._add_error(line_number, _get_validation_error_detail(e))
+            return
+        except ValueError as e: # includes orjson.JSONDecodeError
+            self._add_error(line_number, f"Could not parse line: {e}")
+            return
+
+        first_line_number = self._line_number_by_phone_number.setdefault(row.phone_number, line_number)
+        if first_line_number != line_number:
+            self._add_error(line_number, f"Duplicate phone_number {row.phone_number} (also on line {first_line_number})")
+            return
+
+        self._batch.append((line_number, row))
+        if len(self._batch) >= self.batch_size:
+            await self.flush(wait = False)
+
+    async def flush(self, wait: bool = True) -> None:
+        """
+        Starts importing the current batch with COPY, once the previous batch is imported.
+
+        :param bool wait: if False, returns without waiting for the current batch to be imported
+        """
+        if self._pending_import is not None:
+            pending_import, self._pending_import = self._pending_import, None
+            await pending_import
+        if self._batch:
+            batch, self._batch = self._batch, list()
+            self._pending_import = asyncio.ensure_future(self._import_batch(batch))
+        if wait and self._pending_import is not None:
+            pending_import, self._pending_import = self._pending_import, None
+            await pending_import
+
+    async def _import_batch(self, batch: list) -> None:
+        services = list()
+        appt_types = list()
+        for (_, row) in batch:
+            service = {column: getattr(row, column) for column in SERVICE_INSERT_COLUMNS if column != "host_id"}
+            service["host_id"] = self.host_id
+            services.append(service)
+            for appt_type in row.appt_types:
+                appt_types.append((row.phone_number, appt_type.appt_type_name, appt_type.appt_duration_minutes))
+
+        inserted_services, inserted_appt_types_count = await self.db.copy_services(services, appt_types)
+
+        inserted_phone_numbers = {service["phone_number"] for service in inserted_services}
+        for (line_number, row) in batch:
+            if row.phone_number not in inserted_phone_numbers:
+                self._add_error(line_number, f"Duplicate phone_number {row.phone_number} (already exists)")
+        self.imported_count += len(inserted_services)
+        self.appt_types_imported_count += inserted_appt_types_count
+
+    def get_result(self) -> schemas_services.ServiceImportResponse:
+        return schemas_services.ServiceImportResponse(
+            imported_count = self.imported_count,
+            appt_types_imported_count = self.appt_types_imported_count,
+            rejected_count = len(self.errors),
+            errors = sorted(self.errors, key = lambda error: error.line_number),
+        )
+
+async def import_services(db: Database, host_id: int, lines, import_format: str, batch_size: int | None = None) -> schemas_services.ServiceImportResponse:
+    """
+    Imports services (and their appt types) for host_id from CSV or NDJSON.
+
+    :param Database db: database to import into
+    :param int host_id: user_id of the host of the services
+    :param lines: async iterable of the lines of the file
+    :param str import_format: csv or ndjson
+    :param int batch_size: number of rows per COPY; defaults to SERVICE_IMPORT_BATCH_SIZE
+    :return: counts of imported rows, and the error of each rejected line
+    :rtype: ServiceImportResponse
+    """
+    service_import = ServiceImport(db, host_id, import_format, batch_size)
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        await service_import.add_line(line_number, line)
+        if line_number % 256 == 0:
+            await asyncio.sleep(0) # parsing does not await, so let the pending batch import make progress
+    await service_import.flush()
+    return service_import.get_result()
@@ -3,6 +3,12 @@ from typing import Any
 import json
 from app.core.config import CONFIG
 import datetime
+import base64
+from types import MappingProxyType
+
+IS_OPEN_WEEKDAY_MAPPING = MappingProxyType({1: "is_open_mo", 2: "is_open_tu", 3: "is_open_we", 4: "is_open_th", 5: "is_open_fr", 6: "is_open_sa", 7: "is_open_su"})
+OPEN_TIME_WEEKDAY_MAPPING = MappingProxyType({1: "open_time_mo", 2: "open_time_tu", 3: "open_time_we", 4: "open_time_th", 5: "open_time_fr", 6: "open_time_sa", 7: "open_time_su"})
+CLOSE_TIME_WEEKDAY_MAPPING = MappingProxyType({1: "close_time_mo", 2: "close_time_tu", 3: "close_time_we", 4: "close_time_th", 5: "close_time_fr", 6: "close_time_sa", 7: "close_time_su"})
 
 def get_hashed_salted_password(password: str) -> str:
     password_salt = bcrypt.gensalt(rounds = CONFIG.PASSWORD_SALT_ROUNDS) # TODO: config the rounds?
@@ -27,4 +33,34 @@ def get_formatted_datetime(inp) -> datetime:
     return datetime.datetime.strptime(str(inp), CONFIG.DT_DATETIME_FORMAT)
 
 def get_formatted_time(inp) -> datetime:
+    if isinstance(inp, datetime.time): # e.g. opening hours from the database (TIME columns)
+        return inp
     return datetime.datetime.strptime(str(inp), CONFIG.DT_TIME_FORMAT).time()
+
+
+def encode_cursor(position: dict) -> str:
+    """
+    Encodes the position of the last row of a page (keyset pagination) into an opaque cursor token for the client.
+
+    :param dict position: values of the sort key of the last row, e.g. {"service_id": 7}
+    :return: cursor token
+    :rtype: str
+    """
+    return base64.urlsafe_b64encode(json.dumps(position, default = str).encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, keys: tuple) -> dict:
+    """
+    Decodes a cursor token made by encode_cursor. Raises ValueError if it is not a valid token with the given keys.
+
+    :param str cursor: cursor token
+    :param tuple keys: keys the position must have
+    :return: position of the last row of the previous page
+    :rtype: dict
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(position, dict) or set(position) != set(keys):
+        raise ValueError("Invalid cursor")
+    return position
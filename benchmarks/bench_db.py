@@ -0,0 +1,113 @@
+"""
+Benchmarks the execution modes of Database (default, prepared statements, prepared statements + pipeline) on get_service_by_service_id and on the booking flow.
+Uses (and re-creates) the test database, so do not point it at anything else.
+
+Usage: python -m benchmarks.bench_db [--iterations N]
+"""
+import os
+import asyncio
+if os.name == 'nt':
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+import argparse
+import datetime
+import statistics
+import time
+from app.core.config import CONFIG
+from app.database.db import Database
+from app.database.db_init import init_database, drop_database
+from app.schemas import appts as schemas_appts
+from app.services.appts import service_appt_create_multi_query, service_appt_create_single_round_trip
+
+MODES = {
+    "default": {"prepared_statements": False, "pipeline": False},
+    "prepared": {"prepared_statements": True, "pipeline": False},
+    "prepared+pipeline": {"prepared_statements": True, "pipeline": True},
+}
+
+def get_test_database(**kwargs) -> Database:
+    return Database(
+        dbname = CONFIG.DATABASE_TEST_DB_NAME,
+        user = CONFIG.DATABASE_TEST_DB_USERNAME,
+        password = CONFIG.DATABASE_TEST_DB_PASSWORD,
+        host = CONFIG.DATABASE_TEST_DB_HOSTNAME,
+        port = CONFIG.DATABASE_TEST_DB_PORT,
+        replica_host = None, # the test database, with no replica
+        **kwargs
+    )
+
+async def seed(db: Database) -> tuple:
+    user = await db.insert_user("bench@email.com", "password123")
+    user_id = int(user["user_id"])
+    hours = [1, "00:00:00", "23:59:59"] * 7
+    service = await db.insert_service(user_id, "Bench Biz", "1 Bench St", "NYC", "NY", "11368", "10000000000", *hours)
+    service_id = int(service["service_id"])
+    await db.insert_appt_type(service_id, "30 Min", 30)
+    return user_id, service_id
+
+async def time_calls(func, iterations: int) -> list:
+    timings = list()
+    for i in range(iterations):
+        started_at = time.perf_counter()
+        await func(i)
+        timings.append((time.perf_counter() - started_at) * 1000)
+    return timings
+
+def summarize(name: str, mode: str, timings: list) -> str:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    return f"{name:<32} {mode:<20} mean {statistics.mean(timings):8.3f} ms   p50 {statistics.median(timings):8.3f} ms   p95 {p95:8.3f} ms"
+
+async def main(iterations: int) -> None:
+    drop_database(dbname = CONFIG.DATABASE_TEST_DB_NAME)
+    init_database(
+        dbname = CONFIG.DATABASE_TEST_DB_NAME,
+        user = CONFIG.DATABASE_TEST_DB_USERNAME,
+        password = CONFIG.DATABASE_TEST_DB_PASSWORD,
+        host = CONFIG.DATABASE_TEST_DB_HOSTNAME,
+        port = CONFIG.DATABASE_TEST_DB_PORT
+    )
+
+    results = list()
+    first_slot = datetime.datetime(2030, 1, 1)
+    slot_offset = 0
+    try:
+        for (mode, kwargs) in MODES.items():
+            db = get_test_database(**kwargs)
+            await db.db_open()
+            try:
+                await db.reset_db()
+                user_id, service_id = await seed(db)
+
+                async def get_service(i):
+                    await db.get_service_by_service_id(service_id)
+
+                def get_appt(i):
+                    appt_starts_at = first_slot + datetime.timedelta(minutes = 30 * (slot_offset + i))
+                    return schemas_appts.ApptCreateRequest(service_id = service_id, appt_type_name = "30 Min", appt_starts_at = appt_starts_at.strftime(CONFIG.DT_DATETIME_FORMAT))
+
+                async def book_multi_query(i):
+                    await service_appt_create_multi_query(get_appt(i), db, user_id)
+
+                async def book_single_round_trip(i):
+                    await service_appt_create_single_round_trip(get_appt(i), db, user_id)
+
+                await time_calls(get_service, 10) # warm up the pool connections
+                results.append(summarize("get_service_by_service_id", mode, await time_calls(get_service, iterations)))
+                results.append(summarize("booking (multi query)", mode, await time_calls(book_multi_query, iterations)))
+                slot_offset += iterations
+                results.append(summarize("booking (single round trip)", mode, await time_calls(book_single_round_trip, iterations)))
+                slot_offset += iterations
+            finally:
+                await db.db_close()
+    finally:
+        drop_database(dbname = CONFIG.DATABASE_TEST_DB_NAME)
+
+    for line in results:
+        print(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the Database execution modes")
+    parser.add_argument("--iterations", type = int, default = 500)
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations))
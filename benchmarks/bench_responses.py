@@ -0,0 +1,90 @@
+"""
+Benchmarks serializing a list of services through FastAPI: the previous path (a ServiceGetResponse per row, validated again and encoded by FastAPI via response_model) against FastJSONResponse / rows_response (validated once, or trusted DB rows encoded with orjson).
+Runs the app in process over ASGI, so it needs no database or server.
+
+Usage: python -m benchmarks.bench_responses [--services N] [--iterations N]
+"""
+import os
+import asyncio
+if os.name == 'nt':
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+import argparse
+import datetime
+import statistics
+import time
+import httpx
+from fastapi import FastAPI
+from app.schemas import services as schemas_services
+from app.utils.responses import encode_rows, rows_response
+
+def get_service_rows(count: int) -> list:
+    now = datetime.datetime.now()
+    hours = {f"{prefix}_{day}": value for day in ("mo", "tu", "we", "th", "fr", "sa", "su") for (prefix, value) in (("is_open", 1), ("open_time", "09:00:00"), ("close_time", "17:00:00"))}
+    return [
+        dict(hours, service_id = i, service_name = f"Bench Biz {i}", street_address = f"{i} Bench St", city = "NYC", state = "NY", zip_code = "11368", phone_number = str(10000000000 + i), host_id = 1, created_at = now, updated_at = now)
+        for i in range(count)
+    ]
+
+def get_app(rows: list) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/models", response_model = list[schemas_services.ServiceGetResponse])
+    async def get_models():
+        return [schemas_services.ServiceGetResponse(**row) for row in rows]
+
+    @app.get("/validated", response_model = list[schemas_services.ServiceGetResponse])
+    async def get_validated():
+        return rows_response(schemas_services.ServiceGetResponse, rows, validate = True)
+
+    @app.get("/trusted", response_model = list[schemas_services.ServiceGetResponse])
+    async def get_trusted():
+        return rows_response(schemas_services.ServiceGetResponse, rows, validate = False)
+
+    return app
+
+def summarize(name: str, timings: list) -> str:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    return f"{name:<40} mean {statistics.mean(timings):8.3f} ms   p50 {statistics.median(timings):8.3f} ms   p95 {p95:8.3f} ms"
+
+def time_sync(func, iterations: int) -> list:
+    timings = list()
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started_at) * 1000)
+    return timings
+
+async def main(service_count: int, iterations: int) -> None:
+    rows = get_service_rows(service_count)
+    results = list()
+
+    results.append(summarize("encode_rows (validate)", time_sync(lambda: encode_rows(schemas_services.ServiceGetResponse, rows, validate = True), iterations)))
+    results.append(summarize("encode_rows (trusted)", time_sync(lambda: encode_rows(schemas_services.ServiceGetResponse, rows, validate = False), iterations)))
+
+    async with httpx.AsyncClient(transport = httpx.ASGITransport(app = get_app(rows)), base_url = "http://bench") as client:
+        bodies = dict()
+        for path in ("/models", "/validated", "/trusted"):
+            for _ in range(5): # warm up
+                response = await client.get(path)
+            bodies[path] = response.json()
+            timings = list()
+            for _ in range(iterations):
+                started_at = time.perf_counter()
+                response = await client.get(path)
+                timings.append((time.perf_counter() - started_at) * 1000)
+                response.raise_for_status()
+            results.append(summarize(f"GET {path} ({service_count} services)", timings))
+
+    assert bodies["/models"] == bodies["/validated"] == bodies["/trusted"], "responses differ"
+
+    for line in results:
+        print(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark response serialization of a list of services")
+    parser.add_argument("--services", type = int, default = 1000)
+    parser.add_argument("--iterations", type = int, default = 100)
+    args = parser.parse_args()
+    asyncio.run(main(args.services, args.iterations))
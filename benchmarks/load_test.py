@@ -0,0 +1,329 @@
+"""
+Load test of the booking flow: virtual users run a weighted mix of signups, logins, service creation, bookings racing for a few popular slots, and list reads, for a fixed duration.
+Reports the throughput, the p50/p95/p99 latency, the error rate (5xx and failed requests) and the conflict rate (409) of each route, and the connection pool waits over the run;
+--output writes the same as JSON, to compare releases.
+
+By default the app runs in-process (through the ASGI transport) against the test database, which is re-created, so do not point it at anything else.
+With --url, it drives a running server instead (e.g. python -m app.main), whose data is left in place; pass --internal-token (its INTERNAL_API_TOKEN) to get the pool statistics. In-process, they are read from the Database.
+
+Usage: python -m benchmarks.load_test [--url URL] [--duration SECONDS] [--concurrency N] [--mix signup=1,login=2,...] [--output results.json]
+"""
+import os
+import asyncio
+if os.name == 'nt':
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+import argparse
+import datetime
+import functools
+import itertools
+import random
+import statistics
+import time
+import uuid
+import httpx
+import orjson
+from app.core.config import CONFIG
+
+API_PREFIX = "/api/v1"
+POOL_STATS_PATH = "/api/internal/pool/stats"
+POOL_STATS_RESET_PATH = "/api/internal/pool/stats/reset"
+APPT_TYPE_NAME = "30 Min"
+APPT_DURATION_MINUTES = 30
+ALWAYS_OPEN_HOURS = {f"{field}_{day}": value for day in ("mo", "tu", "we", "th", "fr", "sa", "su") for (field, value) in (("is_open", 1), ("open_time", "00:00:00"), ("close_time", "23:59:59"))}
+POPULAR_SLOTS_FIRST_DAY = datetime.datetime(2030, 1, 1, 9)
+OTHER_SLOTS_FIRST_DAY = datetime.datetime(2040, 1, 1)
+
+DEFAULT_MIX = {
+    "signup": 1,
+    "login": 2,
+    "create_service": 1,
+    "book_popular_slot": 4,
+    "book_other_slot": 2,
+    "list_services": 3,
+    "list_appts": 3,
+    "get_service": 4,
+}
+
+def parse_mix(text: str) -> dict:
+    mix = dict()
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name.strip()!r}; scenarios are {', '.join(DEFAULT_MIX)}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """
+    Nearest-rank percentile of already sorted values.
+    """
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, min(len(sorted_values) - 1, int(len(sorted_values) * fraction + 0.5) - 1))]
+
+class RouteStats:
+
+    def __init__(self):
+        self.latencies_ms = list()
+        self.status_counts = dict()
+        self.error_count = 0
+        self.conflict_count = 0
+
+    def observe(self, latency_ms: float, status_code: int | None) -> None:
+        self.latencies_ms.append(latency_ms)
+        status_key = str(status_code) if status_code is not None else "failed" # e.g. a timeout or a dropped connection
+        self.status_counts[status_key] = self.status_counts.get(status_key, 0) + 1
+        if status_code is None or status_code >= 500:
+            self.error_count += 1
+        elif status_code == 409:
+            self.conflict_count += 1
+
+    def summarize(self, duration_seconds: float) -> dict:
+        latencies_ms = sorted(self.latencies_ms)
+        count = len(latencies_ms)
+        return {
+            "requests": count,
+            "throughput_rps": round(count / duration_seconds, 2),
+            "mean_ms": round(statistics.mean(latencies_ms), 3) if latencies_ms else 0.0,
+            "p50_ms": round(percentile(latencies_ms, 0.50), 3),
+            "p95_ms": round(percentile(latencies_ms, 0.95), 3),
+            "p99_ms": round(percentile(latencies_ms, 0.99), 3),
+            "max_ms": round(latencies_ms[-1], 3) if latencies_ms else 0.0,
+            "errors": self.error_count,
+            "error_rate": round(self.error_count / count, 4) if count else 0.0,
+            "conflicts": self.conflict_count,
+            "conflict_rate": round(self.conflict_count / count, 4) if count else 0.0,
+            "status_counts": dict(sorted(self.status_counts.items())),
+        }
+
+class LoadTest:
+    """
+    State shared by the virtual users: the HTTP client, the stats by route, and the users and services created so far.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, mix: dict, popular_slot_count: int, popular_slot_seconds: float, rng: random.Random):
+        self.client = client
+        self.scenarios = list(mix)
+        self.weights = [mix[name] for name in self.scenarios]
+        self.popular_slot_count = popular_slot_count
+        self.popular_slot_seconds = popular_slot_seconds
+        self.rng = rng
+        self.run_id = uuid.uuid4().hex[:8] # keeps emails and phone numbers unique across runs against the same server
+        self.stats = dict() # route -> RouteStats
+        self.credentials = list() # (email, password) of the users signed up
+        self.service_ids = list()
+        self.popular_service_id = None
+        self.started_at = None
+        self._ids = itertools.count(1)
+        self._other_slots = itertools.count()
+
+    async def request(self, route: str, method: str, path: str, **kwargs) -> httpx.Response | None:
+        """
+        Sends a request and records its latency and status under route (the route template, e.g. GET /api/v1/services/{service_id}, so the stats do not grow with the ids).
+        """
+        started_at = time.perf_counter()
+        response = None
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            pass
+        self.stats.setdefault(route, RouteStats()).observe((time.perf_counter() - started_at) * 1000, response.status_code if response is not None else None)
+        return response
+
+    async def signup(self) -> tuple | None:
+        email = f"load-{self.run_id}-{next(self._ids)}@email.com"
+        password = "password123"
+        response = await self.request("POST /api/v1/users", "POST", f"{API_PREFIX}/users", json = {"email": email, "password": password})
+        if response is None or response.status_code != 201:
+            return None
+        self.credentials.append((email, password))
+        return email, password
+
+    async def login(self, email: str, password: str) -> dict | None:
+        response = await self.request("POST /api/v1/login", "POST", f"{API_PREFIX}/login", data = {"username": email, "password": password})
+        if response is None or response.status_code != 200:
+            return None
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def create_service(self, headers: dict) -> int | None:
+        service_number = next(self._ids)
+        service = {"service_name": f"Load Biz {service_number}", "street_address": "1 Load St", "city": "NYC", "state": "NY", "zip_code": "11368", "phone_number": f"{self.run_id}{service_number}", **ALWAYS_OPEN_HOURS}
+        response = await self.request("POST /api/v1/services", "POST", f"{API_PREFIX}/services", json = service, headers = headers)
+        if response is None or response.status_code != 201:
+            return None
+        response = await self.request("GET /api/v1/services", "GET", f"{API_PREFIX}/services", headers = headers) # the create response has no service_id; phone numbers are unique
+        if response is None or response.status_code != 200:
+            return None
+        service_id = next(row["service_id"] for row in response.json() if row["phone_number"] == service["phone_number"])
+        response = await self.request("POST /api/v1/services/{service_id}/appt-types", "POST", f"{API_PREFIX}/services/{service_id}/appt-types", json = {"appt_type_name": APPT_TYPE_NAME, "appt_duration_minutes": APPT_DURATION_MINUTES}, headers = headers)
+        if response is None or response.status_code != 201:
+            return None
+        self.service_ids.append(service_id)
+        return service_id
+
+    def get_popular_slot(self) -> datetime.datetime:
+        # a new set of popular slots opens every popular_slot_seconds, so the race for them goes on for the whole run instead of only the first requests
+        round_number = int((time.perf_counter() - self.started_at) / self.popular_slot_seconds)
+        return POPULAR_SLOTS_FIRST_DAY + datetime.timedelta(days = round_number, minutes = APPT_DURATION_MINUTES * self.rng.randrange(self.popular_slot_count))
+
+    async def book(self, headers: dict, service_id: int, appt_starts_at: datetime.datetime) -> None:
+        await self.request("POST /api/v1/appts", "POST", f"{API_PREFIX}/appts", json = {"service_id": service_id, "appt_type_name": APPT_TYPE_NAME, "appt_starts_at": appt_starts_at.strftime(CONFIG.DT_DATETIME_FORMAT)}, headers = headers)
+
+    async def run_scenario(self, name: str, headers: dict) -> None:
+        if name == "signup":
+            await self.signup()
+        elif name == "login":
+            await self.login(*self.rng.choice(self.credentials))
+        elif name == "create_service":
+            await self.create_service(headers)
+        elif name == "book_popular_slot":
+            await self.book(headers, self.popular_service_id, self.get_popular_slot())
+        elif name == "book_other_slot": # free slots, so these measure booking without contention
+            await self.book(headers, self.popular_service_id, OTHER_SLOTS_FIRST_DAY + datetime.timedelta(minutes = APPT_DURATION_MINUTES * next(self._other_slots)))
+        elif name == "list_services":
+            await self.request("GET /api/v1/services", "GET", f"{API_PREFIX}/services", params = {"limit": 50}, headers = headers)
+        elif name == "list_appts":
+            await self.request("GET /api/v1/appts", "GET", f"{API_PREFIX}/appts", params = {"limit": 50}, headers = headers)
+        elif name == "get_service":
+            service_id = self.rng.choice(self.service_ids)
+            await self.request("GET /api/v1/services/{service_id}", "GET", f"{API_PREFIX}/services/{service_id}", headers = headers)
+
+    async def run_virtual_user(self, deadline: float) -> None:
+        credentials = await self.signup()
+        headers = await self.login(*credentials) if credentials is not None else None
+        if headers is None:
+            return
+        while time.perf_counter() < deadline:
+            await self.run_scenario(self.rng.choices(self.scenarios, self.weights)[0], headers)
+
+async def get_pool_stats(client: httpx.AsyncClient, internal_token: str, reset: bool = False) -> dict | None:
+    if not internal_token:
+        return None # the internal endpoints are only served with a token
+    try:
+        headers = {"X-Internal-Token": internal_token}
+        response = await (client.post(POOL_STATS_RESET_PATH, headers = headers) if reset else client.get(POOL_STATS_PATH, headers = headers))
+    except httpx.HTTPError:
+        return None
+    return response.json() if response.status_code == 200 else None
+
+async def sample_pool(read_pool_stats, samples: list, interval_seconds: float = 0.5) -> None:
+    while True:
+        await asyncio.sleep(interval_seconds)
+        pool_stats = await read_pool_stats()
+        if pool_stats is not None:
+            samples.append(pool_stats)
+
+def summarize_pool(pool_stats: dict | None, samples: list) -> dict | None:
+    if pool_stats is None:
+        return None
+    summary = dict()
+    for (pool_name, stats) in pool_stats.items():
+        summary[pool_name] = {name: stats.get(name, 0) for name in ("requests_num", "requests_queued", "requests_wait_ms", "requests_wait_ms_mean", "requests_errors", "connections_errors")}
+        summary[pool_name]["requests_waiting_max"] = max((sample[pool_name].get("requests_waiting", 0) for sample in samples if pool_name in sample), default = 0)
+        summary[pool_name]["pool_size_max"] = max((sample[pool_name].get("pool_size", 0) for sample in samples if pool_name in sample), default = stats.get("pool_size", 0))
+    return summary
+
+async def run(client: httpx.AsyncClient, target: str, duration_seconds: float, concurrency: int, mix: dict, popular_slot_count: int, popular_slot_seconds: float, read_pool_stats, seed: int | None) -> dict:
+    """
+    :param read_pool_stats: coroutine function taking reset, which gets the pool statistics (or None if not available)
+    """
+    load_test = LoadTest(client, mix, popular_slot_count, popular_slot_seconds, random.Random(seed))
+
+    host_credentials = await load_test.signup() # owns the service with the popular slots
+    host_headers = await load_test.login(*host_credentials) if host_credentials is not None else None
+    load_test.popular_service_id = await load_test.create_service(host_headers) if host_headers is not None else None
+    if load_test.popular_service_id is None:
+        raise RuntimeError(f"could not set up the load test against {target}: {dict((route, stats.status_counts) for (route, stats) in load_test.stats.items())}")
+    load_test.stats.clear() # the setup is not part of the results
+
+    await read_pool_stats(reset = True) # counters start with the run
+    pool_samples = list()
+    sampler = asyncio.create_task(sample_pool(read_pool_stats, pool_samples))
+    load_test.started_at = time.perf_counter()
+    started_at = datetime.datetime.now(datetime.timezone.utc)
+    try:
+        await asyncio.gather(*(load_test.run_virtual_user(load_test.started_at + duration_seconds) for _ in range(concurrency)))
+    finally:
+        sampler.cancel()
+    elapsed_seconds = time.perf_counter() - load_test.started_at
+    pool_stats = await read_pool_stats()
+
+    totals = RouteStats()
+    for stats in load_test.stats.values():
+        for latency_ms in stats.latencies_ms:
+            totals.latencies_ms.append(latency_ms)
+        for (status_key, count) in stats.status_counts.items():
+            totals.status_counts[status_key] = totals.status_counts.get(status_key, 0) + count
+        totals.error_count += stats.error_count
+        totals.conflict_count += stats.conflict_count
+
+    return {
+        "target": target,
+        "started_at": started_at.isoformat(),
+        "duration_seconds": round(elapsed_seconds, 3),
+        "concurrency": concurrency,
+        "mix": mix,
+        "popular_slots": {"count": popular_slot_count, "seconds": popular_slot_seconds},
+        "total": totals.summarize(elapsed_seconds),
+        "routes": {route: stats.summarize(elapsed_seconds) for (route, stats) in sorted(load_test.stats.items())},
+        "pool": summarize_pool(pool_stats, pool_samples),
+    }
+
+async def run_in_process(internal_token: str, **kwargs) -> dict:
+    from app.main import app
+    from app.dependencies import get_db
+    from app.database.db_init import init_database, drop_database
+    from benchmarks.bench_db import get_test_database
+
+    test_db_params = dict(dbname = CONFIG.DATABASE_TEST_DB_NAME, user = CONFIG.DATABASE_TEST_DB_USERNAME, password = CONFIG.DATABASE_TEST_DB_PASSWORD, host = CONFIG.DATABASE_TEST_DB_HOSTNAME, port = CONFIG.DATABASE_TEST_DB_PORT)
+    drop_database(dbname = CONFIG.DATABASE_TEST_DB_NAME)
+    init_database(**test_db_params)
+    db = get_test_database()
+    await db.db_open()
+    app.dependency_overrides[get_db] = lambda: db
+
+    async def read_pool_stats(reset: bool = False) -> dict:
+        return db.get_pool_stats(reset)
+
+    try:
+        async with httpx.AsyncClient(transport = httpx.ASGITransport(app = app), base_url = "http://load-test") as client:
+            return await run(client, "asgi", read_pool_stats = read_pool_stats, **kwargs)
+    finally:
+        app.dependency_overrides.clear()
+        await db.db_close()
+        drop_database(dbname = CONFIG.DATABASE_TEST_DB_NAME)
+
+async def run_over_http(url: str, concurrency: int, internal_token: str, **kwargs) -> dict:
+    limits = httpx.Limits(max_connections = concurrency, max_keepalive_connections = concurrency)
+    async with httpx.AsyncClient(base_url = url, limits = limits, timeout = 30.0) as client:
+        return await run(client, url, concurrency = concurrency, read_pool_stats = functools.partial(get_pool_stats, client, internal_token), **kwargs)
+
+def format_results(results: dict) -> str:
+    lines = [f"{results['target']}: {results['concurrency']} virtual users for {results['duration_seconds']} s"]
+    for (route, summary) in list(results["routes"].items()) + [("total", results["total"])]:
+        lines.append(f"{route:<48} {summary['requests']:>7} req  {summary['throughput_rps']:>9.2f} req/s   p50 {summary['p50_ms']:8.3f} ms   p95 {summary['p95_ms']:8.3f} ms   p99 {summary['p99_ms']:8.3f} ms   errors {summary['error_rate']:6.2%}   conflicts {summary['conflict_rate']:6.2%}")
+    for (pool_name, summary) in (results["pool"] or dict()).items():
+        lines.append(f"pool {pool_name:<43} {summary['requests_queued']} of {summary['requests_num']} checkouts waited, {summary['requests_wait_ms_mean']:.3f} ms on average; at most {summary['requests_waiting_max']} waiting at once")
+    return "\n".join(lines)
+
+async def main(url: str | None, output: str | None, **kwargs) -> None:
+    results = await (run_over_http(url, **kwargs) if url is not None else run_in_process(**kwargs))
+    print(format_results(results))
+    if output is not None:
+        with open(output, "wb") as f:
+            f.write(orjson.dumps(results, option = orjson.OPT_INDENT_2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Load test the booking flow")
+    parser.add_argument("--url", help = "base URL of a running server, e.g. http://127.0.0.1:8000 (default: run the app in-process against the test database)")
+    parser.add_argument("--duration", type = float, default = 10.0, help = "seconds to run for")
+    parser.add_argument("--concurrency", type = int, default = 20, help = "virtual users, each sending one request at a time")
+    parser.add_argument("--mix", type = parse_mix, default = DEFAULT_MIX, help = f"weights of the scenarios (default: {','.join(f'{name}={weight}' for (name, weight) in DEFAULT_MIX.items())})")
+    parser.add_argument("--popular-slots", type = int, default = 4, help = "slots the book_popular_slot scenario races for")
+    parser.add_argument("--popular-slot-seconds", type = float, default = 1.0, help = "seconds after which a new set of popular slots opens")
+    parser.add_argument("--internal-token", default = CONFIG.INTERNAL_API_TOKEN, help = "token of the internal endpoints, for the pool statistics")
+    parser.add_argument("--seed", type = int, help = "seed of the scenario choices")
+    parser.add_argument("--output", help = "file to write the results to, as JSON")
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.output, duration_seconds = args.duration, concurrency = args.concurrency, mix = args.mix, popular_slot_count = args.popular_slots, popular_slot_seconds = args.popular_slot_seconds, internal_token = args.internal_token, seed = args.seed))
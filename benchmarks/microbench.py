@@ -0,0 +1,155 @@
+"""
+Microbenchmarks of the CPU-bound work done on every request: token verification, request validation, the opening hours check of a booking and response construction.
+Needs no database or server.
+
+Each case is timed with timeit (the number of calls per repeat is calibrated to take at least 0.2 s), and its result is the fastest repeat, in ns per call, which is the least noisy figure for code that does no I/O.
+--save-baseline stores the results as the baseline; later runs compare against it and exit with status 1 if any case got slower by more than --threshold percent.
+A baseline is only comparable on the machine (and Python version) it was recorded on, so record it where the comparisons run.
+
+Usage: python -m benchmarks.microbench [--cases NAME ...] [--repeat N] [--baseline PATH] [--save-baseline] [--threshold PERCENT] [--output results.json]
+"""
+import argparse
+import datetime
+import os
+import platform
+import sys
+import timeit
+import orjson
+from app.core.oauth2 import create_access_token, get_token_cache, verify_access_token
+from app.schemas import appts as schemas_appts
+from app.schemas import services as schemas_services
+from app.utils.schedule import WeeklySchedule, get_schedule_cache, get_weekly_schedule
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(__file__), "microbench_baseline.json")
+DEFAULT_THRESHOLD_PERCENT = 10.0
+
+SERVICE_HOURS = {f"{prefix}_{day}": value for day in ("mo", "tu", "we", "th", "fr", "sa", "su") for (prefix, value) in (("is_open", 1), ("open_time", "09:00:00"), ("close_time", "17:00:00"))}
+SERVICE_REQUEST = dict(SERVICE_HOURS, service_name = "Bench Biz", street_address = "1 Bench St", city = "NYC", state = "NY", zip_code = "11368", phone_number = "10000000000")
+APPT_REQUEST = {"service_id": 1, "appt_type_name": "30 Min", "appt_starts_at": "2030-01-07 10:00:00"}
+
+def get_service_row() -> dict:
+    """
+    A services row as the database returns it (TIME columns as datetime.time).
+    """
+    now = datetime.datetime(2030, 1, 1)
+    hours = {name: (datetime.time(int(value[:2])) if isinstance(value, str) else value) for (name, value) in SERVICE_HOURS.items()}
+    return dict(SERVICE_REQUEST, **hours, service_id = 1, host_id = 1, created_at = now, updated_at = now)
+
+def setup_verify_access_token_cached():
+    token = create_access_token({"user_id": 1}).access_token
+    credentials_exception = Exception("Could not validate credentials")
+    verify_access_token(token, credentials_exception)
+    return lambda: verify_access_token(token, credentials_exception)
+
+def setup_verify_access_token_uncached():
+    token = create_access_token({"user_id": 1}).access_token
+    credentials_exception = Exception("Could not validate credentials")
+
+    def verify():
+        get_token_cache().clear() # each call decodes and checks the signature, as for the first request with a token
+        verify_access_token(token, credentials_exception)
+    return verify
+
+def setup_appt_create_request():
+    return lambda: schemas_appts.ApptCreateRequest(**APPT_REQUEST) # includes the get_formatted_datetime round trip of appt_starts_at
+
+def setup_service_create_request():
+    return lambda: schemas_services.ServiceCreateRequest(**SERVICE_REQUEST)
+
+def setup_opening_hours_check():
+    service = get_service_row()
+    appt_starts_at = datetime.datetime(2030, 1, 7, 10)
+    appt_ends_at = appt_starts_at + datetime.timedelta(minutes = 30)
+    get_schedule_cache().clear()
+    get_weekly_schedule(service)
+    return lambda: get_weekly_schedule(service).is_within_hours(appt_starts_at, appt_ends_at)
+
+def setup_weekly_schedule_build():
+    service = get_service_row()
+    return lambda: WeeklySchedule.from_service(service) # what a schedule cache miss costs
+
+def setup_service_get_response():
+    service = get_service_row()
+    return lambda: schemas_services.ServiceGetResponse(**service)
+
+CASES = {
+    "verify_access_token (cached)": setup_verify_access_token_cached,
+    "verify_access_token (uncached)": setup_verify_access_token_uncached,
+    "ApptCreateRequest": setup_appt_create_request,
+    "ServiceCreateRequest": setup_service_create_request,
+    "opening hours check": setup_opening_hours_check,
+    "WeeklySchedule.from_service": setup_weekly_schedule_build,
+    "ServiceGetResponse": setup_service_get_response,
+}
+
+def time_case(func, repeat: int) -> dict:
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(number, int(number * 0.2 / max(timer.timeit(number), 1e-9))) # autorange stops at 0.2 s or more; aim at 0.2 s per repeat
+    ns_per_call = sorted(seconds / number * 1e9 for seconds in timer.repeat(repeat = repeat, number = number))
+    return {"ns_per_call": round(ns_per_call[0], 1), "median_ns_per_call": round(ns_per_call[len(ns_per_call) // 2], 1), "calls_per_repeat": number, "repeat": repeat}
+
+def run(case_names: list, repeat: int) -> dict:
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "recorded_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "cases": {name: time_case(CASES[name](), repeat) for name in case_names},
+    }
+
+def compare(results: dict, baseline: dict) -> list:
+    """
+    :return: (case name, baseline ns per call, ns per call, change in percent) of each case also in the baseline
+    :rtype: list
+    """
+    comparisons = list()
+    for (name, result) in results["cases"].items():
+        baseline_result = baseline["cases"].get(name)
+        if baseline_result is not None:
+            change_percent = (result["ns_per_call"] / baseline_result["ns_per_call"] - 1) * 100
+            comparisons.append((name, baseline_result["ns_per_call"], result["ns_per_call"], change_percent))
+    return comparisons
+
+def main(case_names: list, repeat: int, baseline_path: str, save_baseline: bool, threshold_percent: float, output: str | None) -> int:
+    results = run(case_names, repeat)
+    if output is not None:
+        with open(output, "wb") as f:
+            f.write(orjson.dumps(results, option = orjson.OPT_INDENT_2))
+
+    if save_baseline or not os.path.exists(baseline_path):
+        for (name, result) in results["cases"].items():
+            print(f"{name:<34} {result['ns_per_call']:12.1f} ns")
+        with open(baseline_path, "wb") as f:
+            f.write(orjson.dumps(results, option = orjson.OPT_INDENT_2))
+        print(f"baseline saved to {baseline_path}")
+        return 0
+
+    with open(baseline_path, "rb") as f:
+        baseline = orjson.loads(f.read())
+    if baseline.get("python") != results["python"]:
+        print(f"warning: the baseline was recorded with Python {baseline.get('python')}, this is {results['python']}")
+
+    regressions = list()
+    for (name, baseline_ns, ns, change_percent) in compare(results, baseline):
+        is_regression = change_percent > threshold_percent
+        print(f"{name:<34} {baseline_ns:12.1f} ns -> {ns:12.1f} ns   {change_percent:+7.1f}%" + ("   REGRESSION" if is_regression else ""))
+        if is_regression:
+            regressions.append(name)
+    for name in results["cases"].keys() - baseline["cases"].keys():
+        print(f"{name:<34} {results['cases'][name]['ns_per_call']:12.1f} ns (not in the baseline)")
+
+    if regressions:
+        print(f"{len(regressions)} case(s) regressed by more than {threshold_percent}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Microbenchmark the per-request hot paths against a baseline")
+    parser.add_argument("--cases", nargs = "+", choices = list(CASES), default = list(CASES), metavar = "NAME", help = f"cases to run (default: all of {', '.join(CASES)})")
+    parser.add_argument("--repeat", type = int, default = 7)
+    parser.add_argument("--baseline", default = DEFAULT_BASELINE_PATH, help = "baseline file, created by the first run")
+    parser.add_argument("--save-baseline", action = "store_true", help = "store these results as the new baseline instead of comparing")
+    parser.add_argument("--threshold", type = float, default = DEFAULT_THRESHOLD_PERCENT, help = "percent by which a case may get slower before the run fails")
+    parser.add_argument("--output", help = "file to write the results to, as JSON")
+    args = parser.parse_args()
+    sys.exit(main(args.cases, args.repeat, args.baseline, args.save_baseline, args.threshold, args.output))
@@ -0,0 +1,96 @@
+"""
+Reports what importing a module of the app costs, from a cold interpreter: the total, the cost by package, and the modules that cost the most by themselves.
+Each run imports the module in a new interpreter with python -X importtime; the fastest of --runs is reported, as it is the least noisy.
+Needs no database or server.
+
+Usage: python -m benchmarks.startup_report [--modules app.main app.database.db_init ...] [--top N] [--runs N] [--output results.json]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+import orjson
+
+DEFAULT_MODULES = ("app.main", "app.database.db", "app.database.db_init", "app.database.migrate", "app.core.config")
+REPO_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_TIME_LINE_REGEX = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+def get_package(module: str) -> str:
+    """
+    Groups the modules of the app by their subpackage (e.g. app.database), and the others by their top-level package.
+    """
+    parts = module.split(".")
+    return ".".join(parts[:2]) if parts[0] == "app" else parts[0]
+
+def measure_import(module: str) -> dict:
+    """
+    Imports module in a new interpreter.
+
+    :return: the wall time of the interpreter less that of an empty one, and the self and cumulative import time of each module it imported (in ms)
+    :rtype: dict
+    """
+    started_at = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], cwd = REPO_DIRECTORY, check = True)
+    empty_seconds = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd = REPO_DIRECTORY, capture_output = True, text = True)
+    wall_seconds = time.perf_counter() - started_at
+    if completed.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{completed.stderr[-2000:]}")
+
+    modules = list()
+    for line in completed.stderr.splitlines():
+        match = IMPORT_TIME_LINE_REGEX.match(line)
+        if match is not None:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append({"module": name, "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000, "depth": (len(indent) - 1) // 2})
+    return {"wall_ms": round((wall_seconds - empty_seconds) * 1000, 1), "modules": modules}
+
+def summarize(module: str, measurement: dict, top: int) -> dict:
+    modules = measurement["modules"]
+    root = next((entry for entry in modules if entry["module"] == module), None)
+    package_self_ms = dict()
+    for entry in modules:
+        package = get_package(entry["module"])
+        package_self_ms[package] = package_self_ms.get(package, 0.0) + entry["self_ms"]
+    return {
+        "module": module,
+        "wall_ms": measurement["wall_ms"],
+        "import_ms": round(root["cumulative_ms"], 1) if root is not None else None,
+        "modules_imported": len(modules),
+        "packages": {package: round(self_ms, 1) for (package, self_ms) in sorted(package_self_ms.items(), key = lambda item: -item[1])[:top]},
+        "slowest_modules": [{"module": entry["module"], "self_ms": round(entry["self_ms"], 1), "cumulative_ms": round(entry["cumulative_ms"], 1)} for entry in sorted(modules, key = lambda entry: -entry["self_ms"])[:top]],
+    }
+
+def format_summary(summary: dict) -> str:
+    lines = [f"{summary['module']}: {summary['import_ms']} ms to import ({summary['modules_imported']} modules), {summary['wall_ms']} ms more than an empty interpreter"]
+    lines.append("  by package (self time):")
+    for (package, self_ms) in summary["packages"].items():
+        lines.append(f"    {package:<40} {self_ms:9.1f} ms")
+    lines.append("  slowest modules (self / cumulative):")
+    for entry in summary["slowest_modules"]:
+        lines.append(f"    {entry['module']:<40} {entry['self_ms']:9.1f} ms {entry['cumulative_ms']:9.1f} ms")
+    return "\n".join(lines)
+
+def main(modules: list, top: int, runs: int, output: str | None) -> None:
+    summaries = list()
+    for module in modules:
+        measurement = min((measure_import(module) for _ in range(runs)), key = lambda measurement: measurement["wall_ms"])
+        summary = summarize(module, measurement, top)
+        summaries.append(summary)
+        print(format_summary(summary))
+    if output is not None:
+        with open(output, "wb") as f:
+            f.write(orjson.dumps({"python": sys.version.split()[0], "runs": runs, "modules": summaries}, option = orjson.OPT_INDENT_2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Report the import cost of modules of the app")
+    parser.add_argument("--modules", nargs = "+", default = list(DEFAULT_MODULES))
+    parser.add_argument("--top", type = int, default = 15, help = "packages and modules listed for each module")
+    parser.add_argument("--runs", type = int, default = 3)
+    parser.add_argument("--output", help = "file to write the report to, as JSON")
+    args = parser.parse_args()
+    main(args.modules, args.top, args.runs, args.output)
@@ -0,0 +1,69 @@
+import pytest
+import httpx
+from fastapi import FastAPI
+from app.api.router import create_router
+from app.core.config import CONFIG
+from app.dependencies import get_db
+
+class FakeDatabase:
+
+    def __init__(self):
+        self.resets = 0
+
+    def get_pool_stats(self, reset: bool = False) -> dict:
+        self.resets += reset
+        return {"primary": {"pool_size": 5}}
+
+def create_test_app(db: FakeDatabase) -> FastAPI:
+    app = FastAPI()
+    app.include_router(create_router(), prefix = '/api')
+    app.dependency_overrides[get_db] = lambda: db
+    return app
+
+class TestInternalRouter:
+
+    @pytest.mark.asyncio
+    async def test_internal_routes_not_served_without_token(self, monkeypatch):
+
+        monkeypatch.setattr(CONFIG, "INTERNAL_API_ENABLED", True)
+        monkeypatch.setattr(CONFIG, "INTERNAL_API_TOKEN", "")
+        db = FakeDatabase()
+
+        async with httpx.AsyncClient(transport = httpx.ASGITransport(app = create_test_app(db)), base_url = "http://test") as client:
+            assert (await client.get("/api/internal/pool/stats")).status_code == 404
+            assert (await client.post("/api/internal/pool/stats/reset")).status_code == 404
+            assert (await client.get("/api/internal/metrics")).status_code == 404
+        assert db.resets == 0
+
+    @pytest.mark.asyncio
+    async def test_pool_stats_with_token(self, monkeypatch):
+
+        monkeypatch.setattr(CONFIG, "INTERNAL_API_ENABLED", True)
+        monkeypatch.setattr(CONFIG, "INTERNAL_API_TOKEN", "secret")
+        db = FakeDatabase()
+
+        async with httpx.AsyncClient(transport = httpx.ASGITransport(app = create_test_app(db)), base_url = "http://test") as client:
+            assert (await client.get("/api/internal/pool/stats")).status_code == 401
+            assert (await client.get("/api/internal/pool/stats", headers = {"X-Internal-Token": "wrong"})).status_code == 401
+            response = await client.get("/api/internal/pool/stats", headers = {"Authorization": "Bearer secret"})
+            assert response.status_code == 200
+            assert response.json() == {"primary": {"pool_size": 5}}
+
+            assert (await client.get("/api/internal/pool/stats", params = {"reset": "true"}, headers = {"X-Internal-Token": "secret"})).status_code == 200
+            assert db.resets == 0 # a GET does not reset the counters
+            assert (await client.post("/api/internal/pool/stats/reset")).status_code == 401
+            assert (await client.post("/api/internal/pool/stats/reset", headers = {"X-Internal-Token": "secret"})).status_code == 200
+            assert db.resets == 1
+
+    @pytest.mark.asyncio
+    async def test_metrics_with_token(self, monkeypatch):
+
+        monkeypatch.setattr(CONFIG, "INTERNAL_API_ENABLED", True)
+        monkeypatch.setattr(CONFIG, "INTERNAL_API_TOKEN", "secret")
+        monkeypatch.setattr(CONFIG, "METRICS_ENABLED", True)
+
+        async with httpx.AsyncClient(transport = httpx.ASGITransport(app = create_test_app(FakeDatabase())), base_url = "http://test") as client:
+            assert (await client.get("/api/internal/metrics")).status_code == 401
+            response = await client.get("/api/internal/metrics", headers = {"Authorization": "Bearer secret"})
+            assert response.status_code == 200
+            assert 'appt_db_pool_pool_size{pool="primary"} 5' in response.text
@@ -24,7 +24,8 @@ async def test_db(): # can make async if needed
             user = CONFIG.DATABASE_TEST_DB_USERNAME,
             password = CONFIG.DATABASE_TEST_DB_PASSWORD,
             host = CONFIG.DATABASE_TEST_DB_HOSTNAME,
-            port = CONFIG.DATABASE_TEST_DB_PORT 
+            port = CONFIG.DATABASE_TEST_DB_PORT,
+            replica_host = None # reads go to the test database, not to a replica that may be configured
         )
         print("Test database setup complete")
         await test_db.db_open()
@@ -0,0 +1,18 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parents[2]
+
+class TestConfig:
+
+    def test_import_without_env_file(self, tmp_path):
+
+        # run from a directory with no .env (and with none of the settings in the environment), so loading the config would fail
+        code = "import app.database.db, app.main; from app.core.config import CONFIG; print(len(vars(CONFIG)))"
+        env = {"PATH": os.environ.get("PATH", ""), "PYTHONPATH": str(REPO_DIR)}
+        res = subprocess.run([sys.executable, "-c", code], cwd = tmp_path, env = env, capture_output = True, text = True)
+
+        assert res.returncode == 0, res.stderr
+        assert res.stdout.strip() == "0" # CONFIG was not loaded
@@ -0,0 +1,48 @@
+import pytest
+import time
+import jwt
+from fastapi import HTTPException
+from app.core.config import CONFIG
+from app.core.oauth2 import create_access_token, verify_access_token, get_token_cache
+from app.utils.lru_cache import LRUCache, MISSING
+
+class TestTokenCache:
+
+    def test_verify_access_token_cached(self):
+
+        token_cache = get_token_cache()
+        token_cache.clear()
+        token = create_access_token({"user_id": 7}).access_token
+        credentials_exception = HTTPException(status_code = 401)
+
+        hits_before = token_cache.hits
+        token_data = verify_access_token(token, credentials_exception)
+        token_data2 = verify_access_token(token, credentials_exception)
+
+        assert token_data.user_id == 7
+        assert token_data2.user_id == 7
+        assert token_cache.hits == hits_before + 1
+
+    def test_verify_access_token_not_cached_when_invalid(self):
+
+        token_cache = get_token_cache()
+        token_cache.clear()
+        token = jwt.encode({"user_id": 7, "expires_at": "2099-01-01 00:00:00+00:00"}, CONFIG.OAUTH2_SECRET_KEY + "fake", algorithm = CONFIG.OAUTH2_ALGORITHM)
+
+        with pytest.raises(HTTPException):
+            verify_access_token(token, HTTPException(status_code = 401))
+        assert len(token_cache) == 0
+
+    def test_lru_cache_expiry_and_eviction(self):
+
+        cache = LRUCache(max_size = 2)
+        cache.set("a", 1)
+        cache.set("b", None) # None can be cached
+        cache.get("a") # a is now most recently used
+        cache.set("c", 3) # evicts b
+        cache.set("d", 4, expires_at = time.time() - 1) # already expired, evicts a
+
+        assert cache.get("b") is MISSING
+        assert cache.get("c") == 3
+        assert cache.get("d") is MISSING
+        assert cache.evictions == 2
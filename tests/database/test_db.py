@@ -2,6 +2,7 @@ import pytest
 import psycopg.errors
 import datetime
 from app.utils.util_funcs import get_formatted_datetime
+from app.database.cache import ReadThroughCache
 
 # can run with "pytest -s" for print statements to show
 
@@ -115,26 +116,26 @@ class TestDBServices:
         assert inserted_service.get("zip_code") == zip_code
         assert inserted_service.get("phone_number") == phone_number
         assert int(inserted_service.get("is_open_mo")) == is_open_mo
-        assert inserted_service.get("open_time_mo") == open_time_mo
-        assert inserted_service.get("close_time_mo") == close_time_mo
+        assert str(inserted_service.get("open_time_mo")) == open_time_mo
+        assert str(inserted_service.get("close_time_mo")) == close_time_mo
         assert int(inserted_service.get("is_open_tu")) == is_open_tu
-        assert inserted_service.get("open_time_tu") == open_time_tu
-        assert inserted_service.get("close_time_tu") == close_time_tu
+        assert str(inserted_service.get("open_time_tu")) == open_time_tu
+        assert str(inserted_service.get("close_time_tu")) == close_time_tu
         assert int(inserted_service.get("is_open_we")) == is_open_we
-        assert inserted_service.get("open_time_we") == open_time_we
-        assert inserted_service.get("close_time_we") == close_time_we
+        assert str(inserted_service.get("open_time_we")) == open_time_we
+        assert str(inserted_service.get("close_time_we")) == close_time_we
         assert int(inserted_service.get("is_open_th")) == is_open_th
-        assert inserted_service.get("open_time_th") == open_time_th
-        assert inserted_service.get("close_time_th") == close_time_th
+        assert str(inserted_service.get("open_time_th")) == open_time_th
+        assert str(inserted_service.get("close_time_th")) == close_time_th
         assert int(inserted_service.get("is_open_fr")) == is_open_fr
-        assert inserted_service.get("open_time_fr") == open_time_fr
-        assert inserted_service.get("close_time_fr") == close_time_fr
+        assert str(inserted_service.get("open_time_fr")) == open_time_fr
+        assert str(inserted_service.get("close_time_fr")) == close_time_fr
         assert int(inserted_service.get("is_open_sa")) == is_open_sa
-        assert inserted_service.get("open_time_sa") == open_time_sa
-        assert inserted_service.get("close_time_sa") == close_time_sa
+        assert str(inserted_service.get("open_time_sa")) == open_time_sa
+        assert str(inserted_service.get("close_time_sa")) == close_time_sa
         assert int(inserted_service.get("is_open_su")) == is_open_su
-        assert inserted_service.get("open_time_su") == open_time_su
-        assert inserted_service.get("close_time_su") == close_time_su
+        assert str(inserted_service.get("open_time_su")) == open_time_su
+        assert str(inserted_service.get("close_time_su")) == close_time_su
         assert inserted_service.get("created_at") is not None
         assert inserted_service.get("updated_at") is not None
 
@@ -206,6 +207,34 @@ class TestDBServices:
         assert service.get("phone_number") == phone_number
         assert service2 is None
 
+    @pytest.mark.asyncio
+    async def test_service_hours_functions(self, test_db):
+
+        test_data = ["Kunal Biz", "47 Brick Lnz", "NYC", "NY", "11368", "17187777777", 1, "09:00:00", "17:00:00", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 0, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59"]
+
+        inserted_user = await test_db.insert_user("bruh@email.com", "password123")
+        inserted_service = await test_db.insert_service(int(inserted_user.get("user_id")), *test_data)
+
+        assert inserted_service.get("open_time_mo") == datetime.time(9, 0, 0)
+
+        async with test_db.pool.connection() as conn:
+            cursor = await conn.execute(
+                """
+                    SELECT
+                        is_service_open_at(s, '2024-11-25 08:59:59') AS before_open, -- a Monday
+                        is_service_open_at(s, '2024-11-25 17:00:00') AS at_close,
+                        is_service_open_at(s, '2024-11-28 12:00:00') AS closed_day,
+                        is_within_service_hours(s, tsrange('2024-11-25 16:30:00', '2024-11-25 17:00:00')) AS ends_at_close,
+                        is_within_service_hours(s, tsrange('2024-11-25 16:30:00', '2024-11-25 17:30:00')) AS ends_after_close,
+                        is_within_service_hours(s, tsrange('2024-11-25 16:30:00', '2024-11-27 10:00:00')) AS spans_full_days
+                    FROM services s WHERE service_id = %s;
+                """,
+                (inserted_service.get("service_id"), ),
+            )
+            hours = await cursor.fetchone()
+
+        assert hours == {"before_open": False, "at_close": True, "closed_day": False, "ends_at_close": True, "ends_after_close": False, "spans_full_days": True}
+
 class TestDBApptType:
     @pytest.mark.asyncio
     @pytest.mark.parametrize(
@@ -312,6 +341,89 @@ class TestDBApptType:
         assert appt_type.get("appt_type_name") == appt_type_name
         assert appt_type.get("appt_duration_minutes") == appt_duration_minutes
 
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("prepared_statements, pipeline", [(False, False), (True, False), (True, True)])
+    async def test_get_service_and_appt_type(self, test_db, prepared_statements, pipeline):
+
+        test_data = ["Kunal Biz", "47 Brick Lnz", "NYC", "NY", "11368", "17187777777", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59"]
+
+        inserted_user = await test_db.insert_user("bruh@email.com", "password123")
+        host_id = int(inserted_user.get("user_id"))
+        inserted_service = await test_db.insert_service(host_id, *test_data)
+        service_id = int(inserted_service.get("service_id"))
+        await test_db.insert_appt_type(service_id, "30 Min", 30)
+
+        test_db.prepared_statements, test_db.pipeline = prepared_statements, pipeline
+        try:
+            service, appt_type = await test_db.get_service_and_appt_type(service_id, "30 Min")
+            service2, appt_type2 = await test_db.get_service_and_appt_type(service_id, "Fake Min")
+            service3, appt_type3 = await test_db.get_service_and_appt_type(service_id + 999999999, "30 Min")
+        finally:
+            test_db.prepared_statements, test_db.pipeline = False, False
+
+        assert int(service.get("service_id")) == service_id
+        assert appt_type.get("appt_duration_minutes") == 30
+        assert int(service2.get("service_id")) == service_id
+        assert appt_type2 is None
+        assert service3 is None
+        assert appt_type3 is None
+
+class TestDBPool:
+    @pytest.mark.asyncio
+    async def test_get_pool_stats(self, test_db):
+
+        test_db.get_pool_stats(reset = True)
+        for i in range(3):
+            await test_db.get_user_by_email(f"bruh{i}@email.com")
+
+        stats = test_db.get_pool_stats(reset = True)["primary"]
+        stats2 = test_db.get_pool_stats()["primary"]
+
+        assert stats["requests_num"] == 3
+        assert stats["pool_max"] == test_db.pool.max_size
+        assert stats["requests_waiting"] == 0
+        assert "requests_wait_ms_mean" in stats
+        assert stats2.get("requests_num", 0) == 0 # counters start again after a reset
+
+class TestDBCache:
+    @pytest.mark.asyncio
+    async def test_read_through_cache(self, test_db):
+
+        test_data = ["Kunal Biz", "47 Brick Lnz", "NYC", "NY", "11368", "17187777777", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59"]
+
+        inserted_user = await test_db.insert_user("bruh@email.com", "password123")
+        host_id = int(inserted_user.get("user_id"))
+        inserted_service = await test_db.insert_service(host_id, *test_data)
+        service_id = int(inserted_service.get("service_id"))
+
+        test_db.cache = ReadThroughCache(max_size = 10, ttl_seconds_by_entity = {"services": 60, "appt_types": 60, "users": 60}, negative_ttl_seconds = 60)
+        try:
+            service = await test_db.get_service_by_service_id(service_id)
+            service["service_name"] = "Modified" # must not modify the cached row
+            service2 = await test_db.get_service_by_service_id(service_id)
+            assert service2.get("service_name") == "Kunal Biz"
+            assert test_db.cache.get_stats()["services"]["hits"] == 1
+
+            appt_type = await test_db.get_appt_type_by_service_id_and_appt_type_name(service_id, "30 Min")
+            assert appt_type is None # now cached as not found
+            await test_db.insert_appt_type(service_id, "30 Min", 30) # invalidates it
+            appt_type2 = await test_db.get_appt_type_by_service_id_and_appt_type_name(service_id, "30 Min")
+            assert appt_type2.get("appt_duration_minutes") == 30
+
+            service3, appt_type3 = await test_db.get_service_and_appt_type(service_id, "30 Min") # both cached, so no query
+            assert int(service3.get("service_id")) == service_id
+            assert appt_type3.get("appt_duration_minutes") == 30
+
+            user = await test_db.get_user_by_user_id(host_id)
+            user2 = await test_db.get_user_by_user_id(host_id)
+            assert user2.get("email") == user.get("email") == "bruh@email.com"
+            assert test_db.cache.get_stats()["users"]["hits"] == 1
+
+            await test_db.reset_db()
+            assert await test_db.get_service_by_service_id(service_id) is None
+        finally:
+            test_db.cache = None
+
 class TestDBAppt:
     @pytest.mark.asyncio
     @pytest.mark.parametrize(
@@ -337,8 +449,8 @@ class TestDBAppt:
         assert int(inserted_appt.get("user_id")) == booker_id
         assert int(inserted_appt.get("service_id")) == service_id
         assert inserted_appt.get("appt_type_name") == appt_type_name
-        assert inserted_appt.get("appt_starts_at") == appt_starts_at
-        assert inserted_appt.get("appt_ends_at") == appt_ends_at
+        assert inserted_appt.get("appt_starts_at") == get_formatted_datetime(appt_starts_at)
+        assert inserted_appt.get("appt_ends_at") == get_formatted_datetime(appt_ends_at)
         assert inserted_appt_type.get("created_at") is not None
         assert inserted_appt_type.get("updated_at") is not None
 
@@ -402,3 +514,118 @@ class TestDBAppt:
                                                                             
         assert int(conflict_1.get("appt_id")) == appt_id
         assert conflict_2 is None
+
+    @pytest.mark.asyncio
+    async def test_get_appts_by_service_id_and_appt_type_name_in_range(self, test_db):
+
+        test_data = ["Kunal Biz", "47 Brick Lnz", "NYC", "NY", "11368", "17187777777", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59"]
+
+        inserted_user = await test_db.insert_user("bruh@email.com", "password123")
+        host_id = int(inserted_user.get("user_id"))
+        inserted_service = await test_db.insert_service(host_id, *test_data)
+        service_id = int(inserted_service.get("service_id"))
+        await test_db.insert_appt_type(service_id, "30 Min", 30)
+
+        await test_db.insert_appt(host_id, service_id, "30 Min", "2024-11-24 23:45:00", "2024-11-25 00:15:00") # overlaps start of range
+        await test_db.insert_appt(host_id, service_id, "30 Min", "2024-11-25 01:00:00", "2024-11-25 01:30:00")
+        await test_db.insert_appt(host_id, service_id, "30 Min", "2024-11-26 00:00:00", "2024-11-26 00:30:00") # starts when range ends
+
+        appts = await test_db.get_appts_by_service_id_and_appt_type_name_in_range(service_id, "30 Min", "2024-11-25 00:00:00", "2024-11-26 00:00:00")
+
+        assert [str(appt.get("appt_starts_at")) for appt in appts] == ["2024-11-24 23:45:00", "2024-11-25 01:00:00"]
+
+    @pytest.mark.asyncio
+    async def test_insert_appt_constraints_exclusion(self, test_db):
+
+        test_data = ["Kunal Biz", "47 Brick Lnz", "NYC", "NY", "11368", "17187777777", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59"]
+
+        inserted_user = await test_db.insert_user("bruh@email.com", "password123")
+        host_id = int(inserted_user.get("user_id"))
+        inserted_service = await test_db.insert_service(host_id, *test_data)
+        service_id = int(inserted_service.get("service_id"))
+        await test_db.insert_appt_type(service_id, "30 Min", 30)
+        await test_db.insert_appt_type(service_id, "60 Min", 60)
+
+        await test_db.insert_appt(host_id, service_id, "30 Min", "2024-11-25 01:00:00", "2024-11-25 01:30:00")
+        await test_db.insert_appt(host_id, service_id, "30 Min", "2024-11-25 01:30:00", "2024-11-25 02:00:00") # adjacent is fine
+        await test_db.insert_appt(host_id, service_id, "60 Min", "2024-11-25 01:00:00", "2024-11-25 02:00:00") # other appt type is fine
+
+        with pytest.raises(psycopg.errors.ExclusionViolation):
+            await test_db.insert_appt(host_id, service_id, "30 Min", "2024-11-25 00:45:00", "2024-11-25 02:15:00") # covers both
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "appt_type_name, appt_starts_at, booking_status", 
+        [
+            ("30 Min", "2024-11-25 09:00:00", "booked"), # monday
+            ("30 Min", "2024-11-25 16:45:00", "invalid_time"), # ends after service closes
+            ("30 Min", "2024-11-25 08:59:59", "invalid_time"), # starts before service opens
+            ("30 Min", "2024-11-24 10:00:00", "invalid_time"), # sunday
+            ("Fake Min", "2024-11-25 09:00:00", "appt_type_not_found"),
+        ])
+    async def test_book_appt(self, test_db, appt_type_name, appt_starts_at, booking_status):
+
+        test_data = ["Kunal Biz", "47 Brick Lnz", "NYC", "NY", "11368", "17187777777", 1, "09:00:00", "17:00:00", 1, "09:00:00", "17:00:00", 1, "09:00:00", "17:00:00", 1, "09:00:00", "17:00:00", 1, "09:00:00", "17:00:00", 0, "09:00:00", "17:00:00", 0, "09:00:00", "17:00:00"]
+
+        inserted_user = await test_db.insert_user("bruh@email.com", "password123")
+        host_id = int(inserted_user.get("user_id"))
+        inserted_service = await test_db.insert_service(host_id, *test_data)
+        service_id = int(inserted_service.get("service_id"))
+        await test_db.insert_appt_type(service_id, "30 Min", 30)
+
+        booking = await test_db.book_appt(host_id, service_id, appt_type_name, appt_starts_at)
+        booking2 = await test_db.book_appt(host_id, service_id + 999999999, appt_type_name, appt_starts_at)
+
+        assert booking.get("booking_status") == booking_status
+        assert booking2.get("booking_status") == "service_not_found"
+        if booking_status == "booked":
+            assert int(booking.get("appt_id")) is not None
+            assert booking.get("appt_starts_at") == get_formatted_datetime(appt_starts_at)
+            assert booking.get("appt_ends_at") == get_formatted_datetime(appt_starts_at) + datetime.timedelta(minutes = 30)
+        else:
+            assert booking.get("appt_id") is None
+
+    @pytest.mark.asyncio
+    async def test_book_appt_conflict(self, test_db):
+
+        test_data = ["Kunal Biz", "47 Brick Lnz", "NYC", "NY", "11368", "17187777777", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59"]
+
+        inserted_user = await test_db.insert_user("bruh@email.com", "password123")
+        host_id = int(inserted_user.get("user_id"))
+        inserted_service = await test_db.insert_service(host_id, *test_data)
+        service_id = int(inserted_service.get("service_id"))
+        await test_db.insert_appt_type(service_id, "30 Min", 30)
+
+        booking = await test_db.book_appt(host_id, service_id, "30 Min", "2024-11-25 01:00:00")
+        booking2 = await test_db.book_appt(host_id, service_id, "30 Min", "2024-11-25 01:15:00")
+
+        assert booking.get("booking_status") == "booked"
+        assert booking2.get("booking_status") == "conflict"
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("all_or_nothing", [False, True])
+    async def test_insert_appts(self, test_db, all_or_nothing):
+
+        test_data = ["Kunal Biz", "47 Brick Lnz", "NYC", "NY", "11368", "17187777777", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59"]
+
+        inserted_user = await test_db.insert_user("bruh@email.com", "password123")
+        host_id = int(inserted_user.get("user_id"))
+        inserted_service = await test_db.insert_service(host_id, *test_data)
+        service_id = int(inserted_service.get("service_id"))
+        await test_db.insert_appt_type(service_id, "30 Min", 30)
+        await test_db.insert_appt(host_id, service_id, "30 Min", "2024-11-25 01:00:00", "2024-11-25 01:30:00")
+
+        appts = [
+            (host_id, service_id, "30 Min", get_formatted_datetime("2024-11-25 00:30:00"), get_formatted_datetime("2024-11-25 01:00:00")), # adjacent is fine
+            (host_id, service_id, "30 Min", get_formatted_datetime("2024-11-25 01:15:00"), get_formatted_datetime("2024-11-25 01:45:00")), # conflicts with existing
+            (host_id, service_id, "30 Min", get_formatted_datetime("2024-11-25 02:00:00"), get_formatted_datetime("2024-11-25 02:30:00")),
+        ]
+        inserted_appts = await test_db.insert_appts(appts, all_or_nothing = all_or_nothing)
+        conflicting_appts = await test_db.get_conflicting_appts([appt[1:] for appt in appts])
+
+        if all_or_nothing:
+            assert inserted_appts is None
+            assert [row["batch_index"] for row in conflicting_appts] == [1]
+        else:
+            assert sorted(str(appt["appt_starts_at"]) for appt in inserted_appts) == ["2024-11-25 00:30:00", "2024-11-25 02:00:00"]
+            assert [row["batch_index"] for row in conflicting_appts] == [0, 1, 2] # all exist now
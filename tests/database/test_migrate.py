@@ -0,0 +1,112 @@
+import pytest
+import psycopg
+from app.core.config import CONFIG
+from app.database.migrate import MigrationRunner, MigrationError, get_migrations, split_sql_statements
+
+def connect_test_db() -> psycopg.Connection:
+    return psycopg.connect(
+        dbname = CONFIG.DATABASE_TEST_DB_NAME,
+        user = CONFIG.DATABASE_TEST_DB_USERNAME,
+        password = CONFIG.DATABASE_TEST_DB_PASSWORD,
+        host = CONFIG.DATABASE_TEST_DB_HOSTNAME,
+        port = CONFIG.DATABASE_TEST_DB_PORT
+    )
+
+def get_index_names(conn: psycopg.Connection) -> set:
+    return {row["indexname"] for row in conn.execute("SELECT indexname FROM pg_indexes WHERE schemaname = 'public';").fetchall()}
+
+class TestMigrate:
+
+    def test_split_sql_statements(self):
+
+        script = """
+            -- comment; not a statement
+            CREATE INDEX CONCURRENTLY a ON t (x);
+            INSERT INTO t VALUES ('a;b', 'it''s');
+            CREATE FUNCTION f() RETURNS INT LANGUAGE sql AS $$ SELECT 1; $$;
+            CREATE FUNCTION g() RETURNS INT LANGUAGE plpgsql AS $fn1$ BEGIN RETURN 1; END; $fn1$;
+            /* block; comment */
+        """
+
+        assert split_sql_statements(script) == [
+            "-- comment; not a statement\n            CREATE INDEX CONCURRENTLY a ON t (x)",
+            "INSERT INTO t VALUES ('a;b', 'it''s')",
+            "CREATE FUNCTION f() RETURNS INT LANGUAGE sql AS $$ SELECT 1; $$",
+            "CREATE FUNCTION g() RETURNS INT LANGUAGE plpgsql AS $fn1$ BEGIN RETURN 1; END; $fn1$",
+            "/* block; comment */",
+        ]
+
+    def test_get_migrations(self):
+
+        migrations = get_migrations()
+
+        assert [int(migration.version) for migration in migrations] == list(range(1, len(migrations) + 1))
+        assert all(migration.down_path is not None for migration in migrations)
+        assert not migrations[6].is_transactional # _0007 builds its index concurrently
+        assert migrations[0].is_transactional
+
+    @pytest.mark.asyncio
+    async def test_upgrade_downgrade(self, test_db): # test_db is set up with init_database, which applies every migration
+
+        lines = list()
+        with connect_test_db() as conn, MigrationRunner(conn, out = lines.append) as runner:
+            latest_version = runner.migrations[-1].version
+            assert all(applied_at is not None for (_, applied_at) in runner.get_status())
+            assert runner.upgrade() == []
+
+            reverted = runner.downgrade("0006", dry_run = True)
+            assert "appts_user_id_appt_starts_at_idx" in get_index_names(conn)
+
+            assert runner.downgrade("0006") == reverted
+            assert [migration.version for migration in reverted] == [migration.version for migration in reversed(runner.migrations[6:])]
+            assert "appts_user_id_appt_starts_at_idx" not in get_index_names(conn)
+            assert "services_host_id_service_id_idx" not in get_index_names(conn)
+
+            assert runner.upgrade("0007") == reverted[-1:]
+            assert "services_host_id_service_id_idx" in get_index_names(conn)
+            runner.upgrade()
+            assert "appts_user_id_appt_starts_at_idx" in get_index_names(conn)
+            assert max(runner.get_applied()) == latest_version
+
+        assert lines[0].startswith("Would revert")
+
+    @pytest.mark.asyncio
+    async def test_verify_checksum(self, test_db):
+
+        with connect_test_db() as conn, MigrationRunner(conn) as runner:
+            conn.execute("UPDATE schema_migrations SET checksum = 'edited' WHERE version = '0001';")
+            try:
+                with pytest.raises(MigrationError):
+                    runner.upgrade()
+            finally:
+                conn.execute("UPDATE schema_migrations SET checksum = %s WHERE version = '0001';", (runner.migrations[0].checksum, ))
+
+    @pytest.mark.asyncio
+    async def test_overlapping_appts_before_exclusion_constraint(self, test_db):
+
+        inserted_user = await test_db.insert_user("bruh@email.com", "password123")
+        user_id = int(inserted_user.get("user_id"))
+        test_data = ["Kunal Biz", "47 Brick Lnz", "NYC", "NY", "11368", "17187777777", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59"]
+        inserted_service = await test_db.insert_service(user_id, *test_data)
+        service_id = int(inserted_service.get("service_id"))
+        await test_db.insert_appt_type(service_id, "30 Min", 30)
+
+        with connect_test_db() as conn, MigrationRunner(conn) as runner:
+            runner.downgrade("0004") # appointment times are text again, with no constraint against overlaps
+            try:
+                insert_query = "INSERT INTO appts (user_id, service_id, appt_type_name, appt_starts_at, appt_ends_at) VALUES (%s, %s, '30 Min', %s, %s) RETURNING appt_id;"
+                appt_ids = [conn.execute(insert_query, (user_id, service_id, starts_at, ends_at)).fetchone()["appt_id"] for (starts_at, ends_at) in (
+                    ("2024-11-25 12:00:00", "2024-11-25 12:30:00"),
+                    ("2024-11-25 12:15:00", "2024-11-25 12:45:00"),
+                    ("2024-11-25 12:30:00", "2024-11-25 13:00:00"), # starts as the first ends, so does not overlap it
+                )]
+
+                with pytest.raises(psycopg.errors.RaiseException) as e:
+                    runner.upgrade()
+                assert "2 pairs of appointments overlap" in str(e.value)
+                assert e.value.diag.message_detail == f"Overlapping (appt_id, appt_id) pairs: ({appt_ids[0]}, {appt_ids[1]}), ({appt_ids[1]}, {appt_ids[2]})"
+                assert max(runner.get_applied()) == "0004" # the failed migration was rolled back
+            finally:
+                conn.execute("DELETE FROM appts;")
+                runner.upgrade()
+            assert max(runner.get_applied()) == runner.migrations[-1].version
@@ -0,0 +1,133 @@
+import pytest
+import pytest_asyncio
+import asyncio
+import contextvars
+import psycopg
+from app.core.config import CONFIG
+from app.database.db import Database
+from app.database.db_init import init_database, drop_database
+from app.database.replica import read_from_primary
+
+# a second database on the test server stands in for the replica; it does not replicate, so rows in only one of them show where a read went
+# (to test against a second Postgres instance, e.g. a streaming standby, point replica_host / replica_port at it instead)
+REPLICA_DB_NAME = f"{CONFIG.DATABASE_TEST_DB_NAME}_replica"
+
+TEST_DB_PARAMS = dict(
+    dbname = CONFIG.DATABASE_TEST_DB_NAME,
+    user = CONFIG.DATABASE_TEST_DB_USERNAME,
+    password = CONFIG.DATABASE_TEST_DB_PASSWORD,
+    host = CONFIG.DATABASE_TEST_DB_HOSTNAME,
+    port = CONFIG.DATABASE_TEST_DB_PORT,
+)
+
+SERVICE_TEST_DATA = ["Kunal Biz", "47 Brick Lnz", "NYC", "NY", "11368", "17187777777", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59"]
+
+def run_as_new_request(coro):
+    return asyncio.get_running_loop().create_task(coro, context = contextvars.Context()) # nothing written yet in this context
+
+@pytest.fixture(scope = "module")
+def replica_dbname():
+    drop_database(dbname = REPLICA_DB_NAME)
+    init_database(**dict(TEST_DB_PARAMS, dbname = REPLICA_DB_NAME))
+    yield REPLICA_DB_NAME
+    drop_database(dbname = REPLICA_DB_NAME)
+
+@pytest_asyncio.fixture
+async def replica_db(test_db, replica_dbname):
+    with psycopg.connect(**dict(TEST_DB_PARAMS, dbname = replica_dbname)) as conn:
+        conn.execute("TRUNCATE TABLE users, services, appt_types, appts CASCADE;")
+        conn.execute("INSERT INTO users (user_id, email, password) VALUES (12345, 'replica@email.com', 'password123');")
+        conn.execute("INSERT INTO services (host_id, service_name, street_address, city, state, zip_code, phone_number, is_open_mo, open_time_mo, close_time_mo, is_open_tu, open_time_tu, close_time_tu, is_open_we, open_time_we, close_time_we, is_open_th, open_time_th, close_time_th, is_open_fr, open_time_fr, close_time_fr, is_open_sa, open_time_sa, close_time_sa, is_open_su, open_time_su, close_time_su) VALUES (12345, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);", SERVICE_TEST_DATA)
+    db = Database(**TEST_DB_PARAMS, pool_min_size = 1, replica_host = CONFIG.DATABASE_TEST_DB_HOSTNAME, replica_dbname = replica_dbname, replica_check_interval_seconds = 0.5)
+    await db.db_open()
+    yield db
+    await db.db_close()
+
+class TestReplica:
+
+    @pytest.mark.asyncio
+    async def test_reads_replica(self, replica_db):
+
+        async def request():
+            user = await replica_db.get_user_by_user_id(12345) # only in the replica
+            services = await replica_db.get_services_by_host_id(12345)
+            return user, services
+
+        user, services = await run_as_new_request(request())
+
+        assert replica_db.replica_is_healthy
+        assert user["email"] == "replica@email.com"
+        assert len(services) == 1
+        assert replica_db.get_pool_stats()["replica"]["is_healthy"]
+
+    @pytest.mark.asyncio
+    async def test_read_your_writes(self, replica_db):
+
+        async def request():
+            services_before = await replica_db.get_services_by_host_id(12345) # replica
+            inserted_user = await replica_db.insert_user("primary@email.com", "password123")
+            services_after = await replica_db.get_services_by_host_id(12345) # primary, where host 12345 has no services
+            user = await replica_db.get_user_by_user_id(inserted_user["user_id"])
+            return services_before, services_after, user, inserted_user
+
+        services_before, services_after, user, inserted_user = await run_as_new_request(request())
+
+        async def other_request():
+            with read_from_primary():
+                services = await replica_db.get_services_by_host_id(12345)
+            return services, await replica_db.get_user_by_user_id(inserted_user["user_id"]) # not in the replica, so retried on the primary
+
+        services, user2 = await run_as_new_request(other_request())
+
+        assert len(services_before) == 1
+        assert services_after == []
+        assert user["email"] == "primary@email.com"
+        assert services == []
+        assert user2["email"] == "primary@email.com"
+
+    @pytest.mark.asyncio
+    async def test_replica_lagging(self, replica_db):
+
+        async def get_read_pool():
+            return replica_db.get_read_pool()
+
+        replica_db.replica_max_lag_seconds = -1 # any replica lags by more than this
+        assert not await replica_db.check_replica()
+        assert await run_as_new_request(get_read_pool()) is replica_db.pool
+        assert "lag" in replica_db.replica_error
+
+        replica_db.replica_max_lag_seconds = CONFIG.DATABASE_REPLICA_MAX_LAG_SECONDS
+        assert await replica_db.check_replica()
+        assert await run_as_new_request(get_read_pool()) is replica_db.replica_pool
+
+    @pytest.mark.asyncio
+    async def test_replica_down(self, test_db):
+
+        db = Database(**TEST_DB_PARAMS, pool_min_size = 1, pool_timeout = 0.5, replica_host = CONFIG.DATABASE_TEST_DB_HOSTNAME, replica_port = 1, replica_check_interval_seconds = 0.5) # nothing listens on port 1
+        await db.db_open()
+        try:
+            inserted_user = await db.insert_user("bruh@email.com", "password123")
+
+            assert not db.replica_is_healthy
+
+            db.replica_is_healthy = True # e.g. the replica went down since it was last checked
+            user = await run_as_new_request(db.get_user_by_user_id(inserted_user["user_id"]))
+
+            assert user["email"] == "bruh@email.com" # from the primary
+            assert not db.replica_is_healthy
+        finally:
+            await db.db_close()
+
+    @pytest.mark.asyncio
+    async def test_replica_from_config(self, monkeypatch):
+
+        monkeypatch.setattr(CONFIG, "DATABASE_REPLICA_HOSTNAME", "replica.internal")
+        monkeypatch.setattr(CONFIG, "DATABASE_REPLICA_NAME", "appts_replica")
+
+        db = Database(**TEST_DB_PARAMS) # the pools are not opened
+        assert "appts_replica@replica.internal" in db.replica_pool.name
+
+        db = Database(**TEST_DB_PARAMS, replica_host = CONFIG.DATABASE_TEST_DB_HOSTNAME) # defaults to the database of the primary, not the configured replica's
+        assert db.replica_pool.name.startswith(f"{CONFIG.DATABASE_TEST_DB_NAME}@")
+
+        assert Database(**TEST_DB_PARAMS, replica_host = None).replica_pool is None
@@ -0,0 +1,101 @@
+import os
+import pytest
+import pytest_asyncio
+import orjson
+from app.core.config import CONFIG
+from app.database.db import Database
+from app.database.slow_queries import SlowQueryLog, redact_params
+from app.utils.metrics import CURRENT_DB_METHOD
+
+TEST_DB_PARAMS = dict(
+    dbname = CONFIG.DATABASE_TEST_DB_NAME,
+    user = CONFIG.DATABASE_TEST_DB_USERNAME,
+    password = CONFIG.DATABASE_TEST_DB_PASSWORD,
+    host = CONFIG.DATABASE_TEST_DB_HOSTNAME,
+    port = CONFIG.DATABASE_TEST_DB_PORT,
+)
+
+def read_entries(path) -> list:
+    with open(path, "rb") as f:
+        return [orjson.loads(line) for line in f]
+
+@pytest_asyncio.fixture
+async def slow_db(test_db, tmp_path):
+    slow_query_log = SlowQueryLog(threshold_ms = 0, path = str(tmp_path / "logs" / "slow_queries.log"), explain_sample_rate = 1.0, explain_max_per_minute = 2) # every statement is slow
+    db = Database(**TEST_DB_PARAMS, pool_min_size = 1, pool_max_size = 1, replica_host = None, slow_query_log = slow_query_log) # the EXPLAINs reuse the connections of the methods
+    await db.db_open()
+    yield db
+    await db.db_close()
+
+class TestSlowQueries:
+
+    def test_per_process_path(self, tmp_path):
+
+        path = str(tmp_path / "logs" / "slow_queries.log")
+        assert SlowQueryLog(threshold_ms = 0, path = path).path == path
+        assert SlowQueryLog(threshold_ms = 0, path = path, per_process = True).path == str(tmp_path / "logs" / f"slow_queries.{os.getpid()}.log")
+
+    def test_redact_params(self):
+
+        assert redact_params(None) is None
+        assert redact_params(("secret@email.com", 5, None, [1, 2])) == ["<str of length 16>", "<int>", "<NoneType>", "<list of 2>"]
+        assert redact_params({"email": "secret@email.com"}) == {"email": "<str of length 16>"}
+
+    @pytest.mark.asyncio
+    async def test_slow_query_log(self, slow_db):
+
+        inserted_user = await slow_db.insert_user("secret@email.com", "password123")
+        await slow_db.slow_query_log.wait_for_explain()
+        await slow_db.get_user_by_email("secret@email.com")
+        await slow_db.slow_query_log.wait_for_explain()
+        await slow_db.get_user_by_user_id(inserted_user["user_id"]) # a third EXPLAIN within the minute is skipped
+        await slow_db.slow_query_log.wait_for_explain()
+
+        entries = read_entries(slow_db.slow_query_log.path)
+        slow_queries = [entry for entry in entries if entry["kind"] == "slow_query"]
+        explains = {entry["id"]: entry for entry in entries if entry["kind"] == "explain"}
+
+        assert [entry["method"] for entry in slow_queries] == ["insert_user", "get_user_by_email", "get_user_by_user_id"]
+        assert slow_queries[0]["query"] == "INSERT INTO users(email, password) VALUES (%s, %s) RETURNING *;"
+        assert slow_queries[0]["params"] == ["<str of length 16>", "<str of length 11>"]
+        assert slow_queries[0]["pool"] == CONFIG.DATABASE_TEST_DB_NAME
+        with open(slow_db.slow_query_log.path, "rb") as f:
+            assert b"secret@email.com" not in f.read()
+
+        assert len(explains) == 2
+        assert not explains[slow_queries[0]["id"]]["analyze"] # a write is not run again
+        assert any("Insert on users" in line for line in explains[slow_queries[0]["id"]]["plan"])
+        assert explains[slow_queries[1]["id"]]["analyze"]
+        assert any("Execution Time" in line for line in explains[slow_queries[1]["id"]]["plan"])
+        assert slow_queries[2]["id"] not in explains
+
+    @pytest.mark.asyncio
+    async def test_writing_method_not_analyzed(self, slow_db):
+
+        token = CURRENT_DB_METHOD.set("book_appt") # its SELECT * FROM book_appt(...) inserts the appointment
+        try:
+            async with slow_db.pool.connection() as conn:
+                await conn.execute("SELECT count(*) FROM users;")
+        finally:
+            CURRENT_DB_METHOD.reset(token)
+        await slow_db.slow_query_log.wait_for_explain()
+
+        entries = read_entries(slow_db.slow_query_log.path)
+        slow_query = [entry for entry in entries if entry["kind"] == "slow_query"][-1]
+        explain = [entry for entry in entries if entry["kind"] == "explain"][-1]
+        assert slow_query["method"] == "book_appt"
+        assert explain["id"] == slow_query["id"]
+        assert not explain["analyze"]
+
+    @pytest.mark.asyncio
+    async def test_threshold(self, test_db, tmp_path):
+
+        slow_query_log = SlowQueryLog(threshold_ms = 60000, path = str(tmp_path / "slow_queries.log"))
+        db = Database(**TEST_DB_PARAMS, pool_min_size = 1, replica_host = None, slow_query_log = slow_query_log)
+        await db.db_open()
+        try:
+            await db.insert_user("fast@email.com", "password123")
+        finally:
+            await db.db_close()
+
+        assert not (tmp_path / "slow_queries.log").exists()
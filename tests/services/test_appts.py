@@ -0,0 +1,96 @@
+import pytest
+from app.schemas import appts as schemas_appts
+from fastapi import HTTPException
+from app.services.appts import service_appt_batch_create, service_appts_get_page
+import datetime
+
+# monday to friday 09:00:00 - 17:00:00
+SERVICE_TEST_DATA = ["Kunal Biz", "47 Brick Lnz", "NYC", "NY", "11368", "17187777777", 1, "09:00:00", "17:00:00", 1, "09:00:00", "17:00:00", 1, "09:00:00", "17:00:00", 1, "09:00:00", "17:00:00", 1, "09:00:00", "17:00:00", 0, "09:00:00", "17:00:00", 0, "09:00:00", "17:00:00"]
+
+class TestServiceApptBatchCreate:
+
+    async def setup_service(self, test_db):
+        inserted_user = await test_db.insert_user("bruh@email.com", "password123")
+        host_id = int(inserted_user.get("user_id"))
+        inserted_service = await test_db.insert_service(host_id, *SERVICE_TEST_DATA)
+        service_id = int(inserted_service.get("service_id"))
+        await test_db.insert_appt_type(service_id, "30 Min", 30)
+        await test_db.insert_appt(host_id, service_id, "30 Min", "2024-11-25 12:00:00", "2024-11-25 12:30:00")
+        return host_id, service_id
+
+    @pytest.mark.asyncio
+    async def test_service_appt_batch_create(self, test_db):
+
+        host_id, service_id = await self.setup_service(test_db)
+        batch = schemas_appts.ApptBatchCreateRequest(appts = [
+            {"service_id": service_id, "appt_type_name": "30 Min", "appt_starts_at": "2024-11-25 09:00:00"},
+            {"service_id": service_id, "appt_type_name": "30 Min", "appt_starts_at": "2024-11-25 09:15:00"}, # conflicts with item 0
+            {"service_id": service_id, "appt_type_name": "30 Min", "appt_starts_at": "2024-11-25 12:15:00"}, # conflicts with existing
+            {"service_id": service_id, "appt_type_name": "30 Min", "appt_starts_at": "2024-11-24 09:00:00"}, # sunday
+            {"service_id": service_id, "appt_type_name": "Fake Min", "appt_starts_at": "2024-11-25 09:00:00"},
+            {"service_id": service_id + 999999999, "appt_type_name": "30 Min", "appt_starts_at": "2024-11-25 09:00:00"},
+            {"service_id": service_id, "appt_type_name": "30 Min", "appt_starts_at": "2024-11-25 09:30:00"}, # adjacent to item 0
+        ])
+
+        response = await service_appt_batch_create(batch, test_db, host_id)
+
+        assert [item.status_code for item in response.appts] == [201, 409, 409, 400, 404, 404, 201]
+        assert [item.index for item in response.appts] == list(range(7))
+        assert response.created_count == 2
+        assert str(response.appts[6].appt.appt_ends_at) == "2024-11-25 10:00:00"
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "appt_starts_at, status_codes",
+        [
+            ("2024-11-25 08:00:00", [424, 400]), # fails validation, so nothing reaches the database
+            ("2024-11-25 12:15:00", [424, 409]), # conflicts with existing, so the insert is rolled back
+        ])
+    async def test_service_appt_batch_create_all_or_nothing(self, test_db, appt_starts_at, status_codes):
+
+        host_id, service_id = await self.setup_service(test_db)
+        batch = schemas_appts.ApptBatchCreateRequest(all_or_nothing = True, appts = [
+            {"service_id": service_id, "appt_type_name": "30 Min", "appt_starts_at": "2024-11-25 09:00:00"},
+            {"service_id": service_id, "appt_type_name": "30 Min", "appt_starts_at": appt_starts_at},
+        ])
+
+        response = await service_appt_batch_create(batch, test_db, host_id)
+
+        assert [item.status_code for item in response.appts] == status_codes
+        assert response.created_count == 0
+        assert await test_db.get_conflicting_appt(service_id, "30 Min", "2024-11-25 09:00:00", "2024-11-25 09:30:00") is None
+
+class TestServiceApptsGet:
+
+    @pytest.mark.asyncio
+    async def test_service_appts_get_page(self, test_db):
+
+        inserted_user = await test_db.insert_user("bruh@email.com", "password123")
+        host_id = int(inserted_user.get("user_id"))
+        inserted_user2 = await test_db.insert_user("bruh2@email.com", "password123")
+        patron_id = int(inserted_user2.get("user_id"))
+        inserted_service = await test_db.insert_service(host_id, *SERVICE_TEST_DATA)
+        service_id = int(inserted_service.get("service_id"))
+        await test_db.insert_appt_type(service_id, "30 Min", 30)
+        await test_db.insert_appt_type(service_id, "60 Min", 60)
+        await test_db.insert_appt(host_id, service_id, "30 Min", "2024-11-25 12:00:00", "2024-11-25 12:30:00")
+        await test_db.insert_appt(patron_id, service_id, "30 Min", "2024-11-25 09:00:00", "2024-11-25 09:30:00")
+        await test_db.insert_appt(patron_id, service_id, "60 Min", "2024-11-25 09:00:00", "2024-11-25 10:00:00") # same start, so appt_id breaks the tie
+        await test_db.insert_appt(patron_id, service_id, "30 Min", "2024-11-26 09:00:00", "2024-11-26 09:30:00")
+
+        got_appts = list()
+        cursor = None
+        while True:
+            appts, cursor = await service_appts_get_page(1, cursor, None, None, test_db, user_id = patron_id)
+            got_appts += appts
+            if cursor is None:
+                break
+        assert [(str(appt["appt_starts_at"]), appt["appt_type_name"]) for appt in got_appts] == [("2024-11-25 09:00:00", "30 Min"), ("2024-11-25 09:00:00", "60 Min"), ("2024-11-26 09:00:00", "30 Min")]
+
+        appts, cursor = await service_appts_get_page(10, None, datetime.datetime(2024, 11, 25, 9, 30), datetime.datetime(2024, 11, 26), test_db, service_id = service_id)
+        assert [appt["user_id"] for appt in appts] == [host_id]
+        assert cursor is None
+
+        with pytest.raises(HTTPException) as e:
+            await service_appts_get_page(10, "not-a-cursor", None, None, test_db, user_id = patron_id)
+        assert e.value.status_code == 400
@@ -0,0 +1,66 @@
+import pytest
+import json
+from fastapi import HTTPException
+from app.services.services import service_services_get_page, service_services_stream
+
+SERVICE_TEST_DATA = ["Kunal Biz", "47 Brick Lnz", "NYC", "NY", "11368", "17187777777", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59", 1, "00:00:00", "23:59:59"]
+
+async def setup_services(test_db, count: int):
+    inserted_user = await test_db.insert_user("bruh@email.com", "password123")
+    host_id = int(inserted_user.get("user_id"))
+    inserted_user2 = await test_db.insert_user("bruh2@email.com", "password123")
+    await test_db.insert_service(int(inserted_user2.get("user_id")), *SERVICE_TEST_DATA) # of another host
+    service_ids = list()
+    for i in range(count):
+        test_data = list(SERVICE_TEST_DATA)
+        test_data[5] = str(17180000000 + i) # phone_number
+        inserted_service = await test_db.insert_service(host_id, *test_data)
+        service_ids.append(inserted_service["service_id"])
+    return host_id, service_ids
+
+class TestServiceServicesGet:
+
+    @pytest.mark.asyncio
+    async def test_service_services_get_page(self, test_db):
+
+        host_id, service_ids = await setup_services(test_db, 5)
+
+        got_service_ids = list()
+        cursor = None
+        page_count = 0
+        while True:
+            services, cursor = await service_services_get_page(2, cursor, test_db, host_id)
+            got_service_ids += [service["service_id"] for service in services]
+            page_count += 1
+            if cursor is None:
+                break
+
+        assert got_service_ids == service_ids
+        assert page_count == 3
+
+        with pytest.raises(HTTPException) as e:
+            await service_services_get_page(2, "not-a-cursor", test_db, host_id)
+        assert e.value.status_code == 400
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("count", [0, 1, 7])
+    async def test_service_services_stream(self, test_db, count):
+
+        host_id, service_ids = await setup_services(test_db, count)
+
+        body = b"".join([chunk async for chunk in service_services_stream(None, test_db, host_id)])
+        services = json.loads(body)
+
+        assert [service["service_id"] for service in services] == service_ids
+        if count:
+            assert services[0]["phone_number"] == "17180000000"
+
+    @pytest.mark.asyncio
+    async def test_service_services_stream_after_cursor(self, test_db):
+
+        host_id, service_ids = await setup_services(test_db, 4)
+        _, cursor = await service_services_get_page(1, None, test_db, host_id)
+
+        body = b"".join([chunk async for chunk in service_services_stream(cursor, test_db, host_id)])
+
+        assert [service["service_id"] for service in json.loads(body)] == service_ids[1:]
@@ -0,0 +1,31 @@
+import pytest
+from app.core.config import CONFIG
+from app.server import get_available_connections, get_worker_pool_sizes
+
+class TestServer:
+
+    def test_get_worker_pool_sizes(self):
+
+        assert get_worker_pool_sizes(5, 10, 1) == (5, 10)
+        assert get_worker_pool_sizes(8, 40, 4) == (2, 10)
+        assert get_worker_pool_sizes(2, 40, 4) == (0, 10) # connections are opened on demand
+        assert get_worker_pool_sizes(8, 400, 4, available_connections = 100, reserved_connections = 5) == (2, 23) # 4 * 23 <= 100 - 5
+        assert get_worker_pool_sizes(400, 400, 4, available_connections = 100) == (25, 25)
+
+        with pytest.raises(ValueError):
+            get_worker_pool_sizes(1, 3, 4)
+        with pytest.raises(ValueError):
+            get_worker_pool_sizes(8, 40, 4, available_connections = 8, reserved_connections = 5)
+
+    def test_get_available_connections(self, test_db):
+
+        available_connections = get_available_connections(
+            dbname = CONFIG.DATABASE_TEST_DB_NAME,
+            user = CONFIG.DATABASE_TEST_DB_USERNAME,
+            password = CONFIG.DATABASE_TEST_DB_PASSWORD,
+            host = CONFIG.DATABASE_TEST_DB_HOSTNAME,
+            port = CONFIG.DATABASE_TEST_DB_PORT
+        )
+
+        assert 0 < available_connections < 100000
+        assert get_available_connections(port = 1) is None # nothing listens on port 1
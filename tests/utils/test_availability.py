@@ -0,0 +1,50 @@
+import pytest
+import datetime
+from app.utils.availability import get_available_slots
+
+SERVICE = {
+    "is_open_mo": 1, "open_time_mo": "09:00:00", "close_time_mo": "12:00:00",
+    "is_open_tu": 1, "open_time_tu": "09:00:00", "close_time_tu": "10:00:00",
+    "is_open_we": 0, "open_time_we": "00:00:00", "close_time_we": "23:59:59",
+    "is_open_th": 0, "open_time_th": "00:00:00", "close_time_th": "23:59:59",
+    "is_open_fr": 0, "open_time_fr": "00:00:00", "close_time_fr": "23:59:59",
+    "is_open_sa": 0, "open_time_sa": "00:00:00", "close_time_sa": "23:59:59",
+    "is_open_su": 1, "open_time_su": "00:00:00", "close_time_su": "23:59:59",
+}
+
+class TestAvailability:
+
+    def test_get_available_slots_no_appts(self):
+
+        slots = get_available_slots(SERVICE, 60, [], datetime.date(2024, 11, 25), datetime.date(2024, 11, 25)) # monday
+
+        assert [str(slot["appt_starts_at"]) for slot in slots] == ["2024-11-25 09:00:00", "2024-11-25 10:00:00", "2024-11-25 11:00:00"]
+        assert str(slots[-1]["appt_ends_at"]) == "2024-11-25 12:00:00" # can end exactly when service closes
+
+    def test_get_available_slots_with_appts(self):
+
+        booked_appts = [
+            {"appt_starts_at": "2024-11-25 10:00:00", "appt_ends_at": "2024-11-25 10:30:00"},
+        ]
+        slots = get_available_slots(SERVICE, 30, booked_appts, datetime.date(2024, 11, 25), datetime.date(2024, 11, 25))
+
+        assert [str(slot["appt_starts_at"]) for slot in slots] == ["2024-11-25 09:00:00", "2024-11-25 09:30:00", "2024-11-25 10:30:00", "2024-11-25 11:00:00", "2024-11-25 11:30:00"]
+
+    def test_get_available_slots_slot_interval(self):
+
+        booked_appts = [
+            {"appt_starts_at": "2024-11-25 09:00:00", "appt_ends_at": "2024-11-25 09:10:00"},
+        ]
+        slots = get_available_slots(SERVICE, 60, booked_appts, datetime.date(2024, 11, 25), datetime.date(2024, 11, 25), slot_interval_minutes = 15)
+
+        # 09:15 is the first grid point after the booked appt; last slot must end by 12:00
+        assert [str(slot["appt_starts_at"]) for slot in slots] == ["2024-11-25 09:15:00", "2024-11-25 09:30:00", "2024-11-25 09:45:00", "2024-11-25 10:00:00", "2024-11-25 10:15:00", "2024-11-25 10:30:00", "2024-11-25 10:45:00", "2024-11-25 11:00:00"]
+
+    def test_get_available_slots_closed_days_and_multi_day_appts(self):
+
+        booked_appts = [
+            {"appt_starts_at": "2024-11-24 23:00:00", "appt_ends_at": "2024-11-25 09:30:00"}, # sunday into monday
+        ]
+        slots = get_available_slots(SERVICE, 60, booked_appts, datetime.date(2024, 11, 25), datetime.date(2024, 11, 28)) # monday to thursday
+
+        assert [str(slot["appt_starts_at"]) for slot in slots] == ["2024-11-25 10:00:00", "2024-11-25 11:00:00", "2024-11-26 09:00:00"]
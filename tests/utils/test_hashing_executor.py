@@ -0,0 +1,71 @@
+import pytest
+import asyncio
+import threading
+from app.utils.hashing_executor import HashingExecutor, HashingExecutorSaturatedError
+from app.utils.util_funcs import get_hashed_salted_password, is_correct_password
+
+class TestHashingExecutor:
+
+    @pytest.mark.asyncio
+    async def test_run(self):
+
+        hashing_executor = HashingExecutor(max_workers = 2, max_queue_depth = 2)
+        try:
+            hashed_salted_password = await hashing_executor.run(get_hashed_salted_password, "password123")
+            assert await hashing_executor.run(is_correct_password, "password123", hashed_salted_password)
+            assert not await hashing_executor.run(is_correct_password, "password1234", hashed_salted_password)
+
+            stats = hashing_executor.get_stats()
+            assert stats["calls"] == 3
+            assert stats["in_flight"] == 0
+            assert stats["hash_seconds_total"] > 0
+        finally:
+            hashing_executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_run_saturated(self):
+
+        hashing_executor = HashingExecutor(max_workers = 1, max_queue_depth = 1)
+        release = threading.Event()
+        try:
+            running = asyncio.ensure_future(hashing_executor.run(release.wait))
+            queued = asyncio.ensure_future(hashing_executor.run(release.wait))
+            await asyncio.sleep(0) # let both get submitted
+
+            with pytest.raises(HashingExecutorSaturatedError):
+                await hashing_executor.run(release.wait)
+
+            release.set()
+            await asyncio.gather(running, queued)
+
+            stats = hashing_executor.get_stats()
+            assert stats["calls"] == 2
+            assert stats["rejected"] == 1
+            assert stats["queue_wait_seconds_max"] > 0
+        finally:
+            release.set()
+            hashing_executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_run_cancelled(self):
+
+        hashing_executor = HashingExecutor(max_workers = 1, max_queue_depth = 1)
+        release = threading.Event()
+        try:
+            running = asyncio.ensure_future(hashing_executor.run(release.wait))
+            await asyncio.sleep(0)
+            running.cancel() # e.g. the client disconnected
+            with pytest.raises(asyncio.CancelledError):
+                await running
+
+            assert hashing_executor.get_stats()["in_flight"] == 1 # the call still holds its worker
+
+            release.set()
+            for _ in range(100):
+                if hashing_executor.get_stats()["in_flight"] == 0:
+                    break
+                await asyncio.sleep(0.01)
+            assert hashing_executor.get_stats()["in_flight"] == 0
+        finally:
+            release.set()
+            hashing_executor.shutdown()
@@ -0,0 +1,122 @@
+import asyncio
+import pytest
+import orjson
+from fastapi import HTTPException, status
+from app.utils.idempotency import IdempotencyStore, IDEMPOTENT_REPLAYED_HEADER
+from app.utils.responses import FastJSONResponse
+
+def get_store() -> IdempotencyStore:
+    return IdempotencyStore(cache_max_size = 100, ttl_seconds = 3600, in_progress_timeout_seconds = 60, wait_timeout_seconds = 5, poll_interval_seconds = 0.01, purge_interval_seconds = 3600)
+
+class CountingHandler:
+    """
+    Handler of a create request that counts its runs, optionally taking delay_seconds or raising exception.
+    """
+
+    def __init__(self, delay_seconds: float = 0, exception: Exception | None = None):
+        self.delay_seconds = delay_seconds
+        self.exception = exception
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay_seconds)
+        if self.exception is not None:
+            raise self.exception
+        return FastJSONResponse({"appt_id": self.calls}, status_code = status.HTTP_201_CREATED)
+
+class TestIdempotencyStore:
+
+    async def get_user_id(self, test_db) -> int:
+        inserted_user = await test_db.insert_user("bruh@email.com", "password123")
+        return int(inserted_user.get("user_id"))
+
+    @pytest.mark.asyncio
+    async def test_retry_gets_stored_response(self, test_db):
+
+        user_id = await self.get_user_id(test_db)
+        store = get_store()
+        handler = CountingHandler()
+
+        response = await store.run(test_db, user_id, "key-1", "POST /appts", "hash-1", handler)
+        retry = await store.run(test_db, user_id, "key-1", "POST /appts", "hash-1", handler)
+        store.clear() # as a retry to another worker, which reads the stored response from the database
+        retry_from_db = await store.run(test_db, user_id, "key-1", "POST /appts", "hash-1", handler)
+
+        assert handler.calls == 1
+        assert response.status_code == retry.status_code == retry_from_db.status_code == 201
+        assert orjson.loads(response.body) == orjson.loads(retry.body) == orjson.loads(retry_from_db.body) == {"appt_id": 1}
+        assert IDEMPOTENT_REPLAYED_HEADER.lower() not in response.headers
+        assert retry.headers[IDEMPOTENT_REPLAYED_HEADER] == retry_from_db.headers[IDEMPOTENT_REPLAYED_HEADER] == "true"
+
+        await store.run(test_db, user_id, None, "POST /appts", "hash-1", handler) # no key, so it always runs
+        await store.run(test_db, user_id, "key-2", "POST /appts", "hash-1", handler)
+        assert handler.calls == 3
+
+    @pytest.mark.asyncio
+    async def test_key_reused_for_another_request(self, test_db):
+
+        user_id = await self.get_user_id(test_db)
+        store = get_store()
+        handler = CountingHandler()
+        await store.run(test_db, user_id, "key-1", "POST /appts", "hash-1", handler)
+
+        for (route, request_hash) in (("POST /appts", "hash-2"), ("POST /services", "hash-1")):
+            with pytest.raises(HTTPException) as e:
+                await store.run(test_db, user_id, "key-1", route, request_hash, handler)
+            assert e.value.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+            store.clear()
+        assert handler.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_duplicates_wait(self, test_db):
+
+        user_id = await self.get_user_id(test_db)
+        store = get_store()
+        other_worker_store = get_store()
+        handler = CountingHandler(delay_seconds = 0.1)
+
+        responses = await asyncio.gather(
+            store.run(test_db, user_id, "key-1", "POST /appts", "hash-1", handler),
+            store.run(test_db, user_id, "key-1", "POST /appts", "hash-1", handler), # waits on the first in this worker
+            other_worker_store.run(test_db, user_id, "key-1", "POST /appts", "hash-1", handler), # polls the key in the database
+        )
+
+        assert handler.calls == 1
+        assert [orjson.loads(response.body) for response in responses] == [{"appt_id": 1}] * 3
+
+    @pytest.mark.asyncio
+    async def test_wait_timeout(self, test_db):
+
+        user_id = await self.get_user_id(test_db)
+        store = get_store()
+        store.wait_timeout_seconds = 0.05
+        handler = CountingHandler(delay_seconds = 0.3)
+
+        first = asyncio.create_task(store.run(test_db, user_id, "key-1", "POST /appts", "hash-1", handler))
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as e:
+            await store.run(test_db, user_id, "key-1", "POST /appts", "hash-1", handler)
+        assert e.value.status_code == status.HTTP_409_CONFLICT
+        assert (await first).status_code == 201
+
+    @pytest.mark.asyncio
+    async def test_errors(self, test_db):
+
+        user_id = await self.get_user_id(test_db)
+        store = get_store()
+
+        # a client error is the response of the request, so it is stored
+        handler = CountingHandler(exception = HTTPException(status_code = status.HTTP_409_CONFLICT, detail = "conflict"))
+        responses = [await store.run(test_db, user_id, "key-1", "POST /appts", "hash-1", handler) for _ in range(2)]
+        assert handler.calls == 1
+        assert [(response.status_code, orjson.loads(response.body)) for response in responses] == [(409, {"detail": "conflict"})] * 2
+
+        # a server error is not, so a retry runs again
+        handler = CountingHandler(exception = HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = "Database issue occurred"))
+        for _ in range(2):
+            with pytest.raises(HTTPException):
+                await store.run(test_db, user_id, "key-2", "POST /appts", "hash-1", handler)
+        assert handler.calls == 2
+        handler.exception = None
+        assert (await store.run(test_db, user_id, "key-2", "POST /appts", "hash-1", handler)).status_code == 201
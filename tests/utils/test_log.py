@@ -0,0 +1,89 @@
+import io
+import sys
+import logging
+import pytest
+import httpx
+import orjson
+from fastapi import FastAPI
+from app.utils.log import REQUEST_ID, ErrorDedupFilter, JsonFormatter, RequestIdMiddleware, get_logger, setup_logging, shutdown_logging
+
+def make_error_record(msg: str = "insert_user failed", exc_type: type = ValueError) -> logging.LogRecord:
+    try:
+        raise exc_type("fail")
+    except exc_type:
+        return logging.LogRecord("app.database.db", logging.ERROR, __file__, 0, msg, None, sys.exc_info())
+
+class TestLog:
+
+    def test_json_formatter(self):
+
+        record = make_error_record()
+        record.request_id = "abc"
+        record.service_id = 7 # as from extra = {"service_id": 7}
+
+        entry = orjson.loads(JsonFormatter().format(record))
+
+        assert (entry["level"], entry["logger"], entry["message"], entry["request_id"], entry["service_id"]) == ("ERROR", "app.database.db", "insert_user failed", "abc", 7)
+        assert entry["exc_type"] == "ValueError"
+        assert entry["exc"].startswith("Traceback") and entry["exc"].endswith("ValueError: fail")
+
+    def test_error_dedup_filter(self):
+
+        dedup_filter = ErrorDedupFilter(window_seconds = 60, max_per_window = 2, sample_rate = 0.0)
+
+        assert [dedup_filter.filter(make_error_record()) for _ in range(5)] == [True, True, False, False, False]
+        assert dedup_filter.filter(make_error_record(exc_type = KeyError)) # another kind of error
+        assert dedup_filter.filter(make_error_record(msg = "get_user_by_email failed"))
+        assert dedup_filter.filter(logging.LogRecord("app.database.db", logging.WARNING, __file__, 0, "insert_user failed", None, None)) # only errors are deduplicated
+
+        dedup_filter.window_seconds = 0 # the next record starts a new window, and carries the count of those suppressed
+        record = make_error_record()
+        assert dedup_filter.filter(record)
+        assert record.suppressed == 3
+
+    def test_setup_logging(self):
+
+        stream = io.StringIO()
+        setup_logging(level = "INFO", log_format = "json", handler = logging.StreamHandler(stream))
+        try:
+            logger = get_logger("tests.log")
+            token = REQUEST_ID.set("req-1")
+            try:
+                logger.info("booked %s", "appt", extra = {"service_id": 7})
+                logger.debug("not logged")
+                try:
+                    raise ValueError("fail")
+                except ValueError:
+                    logger.exception("booking failed")
+            finally:
+                REQUEST_ID.reset(token)
+        finally:
+            shutdown_logging() # writes out the queued records
+
+        entries = [orjson.loads(line) for line in stream.getvalue().splitlines()]
+
+        assert [(entry["message"], entry["request_id"]) for entry in entries] == [("booked appt", "req-1"), ("booking failed", "req-1")]
+        assert entries[0]["logger"] == "app.tests.log"
+        assert entries[0]["service_id"] == 7
+        assert entries[1]["exc_type"] == "ValueError"
+
+    @pytest.mark.asyncio
+    async def test_request_id_middleware(self):
+
+        app = FastAPI()
+        app.add_middleware(RequestIdMiddleware)
+
+        @app.get("/request_id")
+        async def get_request_id():
+            return {"request_id": REQUEST_ID.get()}
+
+        async with httpx.AsyncClient(transport = httpx.ASGITransport(app = app), base_url = "http://test") as client:
+            response = await client.get("/request_id", headers = {"X-Request-ID": "lb-123"})
+            assert response.json()["request_id"] == response.headers["x-request-id"] == "lb-123"
+
+            response = await client.get("/request_id", headers = {"X-Request-ID": "not valid\\"})
+            assert response.json()["request_id"] == response.headers["x-request-id"] != "not valid\\" # replaced by a new one
+
+            response = await client.get("/request_id")
+            assert len(response.headers["x-request-id"]) == 32
+        assert REQUEST_ID.get() is None
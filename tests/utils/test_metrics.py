@@ -0,0 +1,100 @@
+import pytest
+import httpx
+from fastapi import FastAPI, HTTPException
+from app.utils.metrics import Metrics, MetricsMiddleware, LatencySeries, instrument_methods, LATENCY_BUCKETS_SECONDS
+
+def get_metric_lines(text: str, name: str) -> list:
+    return [line for line in text.splitlines() if line.startswith(name)]
+
+class TestMetrics:
+
+    def test_latency_series(self):
+
+        series = LatencySeries()
+        series.observe(0.0001, row_count = 2)
+        series.observe(LATENCY_BUCKETS_SECONDS[0]) # upper bounds are inclusive
+        series.observe(100.0, is_error = True)
+
+        assert series.bucket_counts[0] == 2
+        assert series.bucket_counts[-1] == 1
+        assert (series.count, series.row_count, series.error_count) == (3, 2, 1)
+
+    @pytest.mark.asyncio
+    async def test_instrument_methods(self):
+
+        metrics = Metrics()
+
+        @instrument_methods(metrics)
+        class Fake:
+            async def get_rows(self, count: int) -> list:
+                return [{"i": i} for i in range(count)]
+
+            async def fail(self) -> None:
+                raise ValueError("fail")
+
+            async def stream_rows(self, count: int):
+                for i in range(count):
+                    yield {"i": i}
+
+            async def _private(self) -> None:
+                pass
+
+        fake = Fake()
+        await fake.get_rows(3)
+        await fake.get_rows(0)
+        with pytest.raises(ValueError):
+            await fake.fail()
+        assert [row async for row in fake.stream_rows(4)] == [{"i": i} for i in range(4)]
+        rows = fake.stream_rows(10)
+        await rows.__anext__()
+        await rows.aclose() # stopped early, not an error
+
+        assert (metrics.db_series["get_rows"].count, metrics.db_series["get_rows"].row_count) == (2, 3)
+        assert metrics.db_series["fail"].error_count == 1
+        assert (metrics.db_series["stream_rows"].count, metrics.db_series["stream_rows"].row_count, metrics.db_series["stream_rows"].error_count) == (2, 5, 0)
+        assert "_private" not in metrics.db_series
+
+        hashing_stats = {"calls": 3, "rejected": 1, "queue_wait_seconds_total": 0.5, "queue_wait_seconds_max": 0.25, "hash_seconds_total": 0.75, "hash_seconds_max": 0.3, "in_flight": 2, "queue_depth": 0, "max_workers": 4, "max_queue_depth": 16}
+        text = metrics.render({"primary": {"pool_size": 5, "requests_wait_ms_mean": 1.5}, "replica": {"pool_size": 2, "is_healthy": True, "error": None}}, hashing_stats)
+
+        assert get_metric_lines(text, 'appt_db_query_duration_seconds_bucket{method="get_rows",le="+Inf"}') == ['appt_db_query_duration_seconds_bucket{method="get_rows",le="+Inf"} 2']
+        assert get_metric_lines(text, "appt_db_query_rows_total") == ['appt_db_query_rows_total{method="fail"} 0', 'appt_db_query_rows_total{method="get_rows"} 3', 'appt_db_query_rows_total{method="stream_rows"} 5']
+        assert get_metric_lines(text, "appt_db_pool_pool_size") == ['appt_db_pool_pool_size{pool="primary"} 5', 'appt_db_pool_pool_size{pool="replica"} 2']
+        assert text.count("# TYPE appt_db_pool_pool_size gauge") == 1
+        assert "is_healthy" not in text
+        assert get_metric_lines(text, "appt_password_hashing_calls_total") == ["appt_password_hashing_calls_total 3"]
+        assert get_metric_lines(text, "appt_password_hashing_seconds_total") == ["appt_password_hashing_seconds_total 0.75"]
+        assert get_metric_lines(text, "appt_password_hashing_in_flight") == ["appt_password_hashing_in_flight 2"]
+        assert "# TYPE appt_password_hashing_queue_wait_seconds_total counter" in text
+        assert "# TYPE appt_password_hashing_queue_wait_seconds_max gauge" in text
+
+    @pytest.mark.asyncio
+    async def test_metrics_middleware(self):
+
+        metrics = Metrics()
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware, metrics = metrics)
+
+        @app.get("/items/{item_id}")
+        async def item_get(item_id: int):
+            if item_id == 0:
+                raise HTTPException(status_code = 503, detail = "unavailable")
+            return {"item_id": item_id}
+
+        async with httpx.AsyncClient(transport = httpx.ASGITransport(app = app), base_url = "http://test") as client:
+            await client.get("/items/1")
+            await client.get("/items/2")
+            await client.get("/items/0")
+            await client.get("/other")
+
+        text = metrics.render()
+
+        assert get_metric_lines(text, "appt_http_responses_total") == [
+            'appt_http_responses_total{method="GET",route="/items/{item_id}",status="200"} 2',
+            'appt_http_responses_total{method="GET",route="/items/{item_id}",status="503"} 1',
+            'appt_http_responses_total{method="GET",route="unmatched",status="404"} 1',
+        ]
+        assert get_metric_lines(text, "appt_http_request_errors_total") == [
+            'appt_http_request_errors_total{method="GET",route="/items/{item_id}"} 1',
+            'appt_http_request_errors_total{method="GET",route="unmatched"} 0',
+        ]
@@ -0,0 +1,54 @@
+import pytest
+import datetime
+import orjson
+import pydantic
+from app.schemas import services as schemas_services
+from app.schemas import appts as schemas_appts
+from app.utils.responses import FastJSONResponse, encode_rows, rows_response
+
+NOW = datetime.datetime(2024, 11, 25, 1, 15, 0, 123456)
+
+def get_service_row(service_id: int, has_extra_column: bool = True) -> dict:
+    row = {field_name: field.get_default(call_default_factory = True) for (field_name, field) in schemas_services.ServiceGetResponse.model_fields.items() if not field.is_required()}
+    row.update(service_id = service_id, service_name = "Kunal Biz", street_address = "47 Brick Lnz", city = "NYC", state = "NY", zip_code = "11368", phone_number = str(17180000000 + service_id), host_id = 1, created_at = NOW, updated_at = NOW)
+    if has_extra_column:
+        row["extra_column"] = "not in the model"
+    return row
+
+class TestResponses:
+
+    @pytest.mark.parametrize("validate", [False, True])
+    @pytest.mark.parametrize("has_extra_column", [False, True])
+    def test_encode_rows(self, validate, has_extra_column):
+
+        rows = [get_service_row(i, has_extra_column) for i in range(3)]
+
+        encoded = encode_rows(schemas_services.ServiceGetResponse, rows, validate)
+
+        expected = [schemas_services.ServiceGetResponse(**row).model_dump(mode = "json") for row in rows]
+        assert orjson.loads(encoded) == expected
+
+    def test_encode_rows_validate(self):
+
+        rows = [get_service_row(1)]
+        rows[0]["service_id"] = "not an int"
+
+        with pytest.raises(pydantic.ValidationError):
+            encode_rows(schemas_services.ServiceGetResponse, rows, validate = True)
+
+    def test_rows_response(self):
+
+        response = rows_response(schemas_appts.ApptGetResponse, list(), headers = {"X-Next-Cursor": "abc"})
+
+        assert response.body == b"[]"
+        assert response.headers["X-Next-Cursor"] == "abc"
+        assert response.media_type == "application/json"
+
+    def test_fast_json_response(self):
+
+        appt = schemas_appts.ApptCreateResponse(appt_id = 1, user_id = 1, service_id = 1, appt_type_name = "30 Min", appt_starts_at = NOW, appt_ends_at = NOW, created_at = NOW, updated_at = NOW)
+
+        response = FastJSONResponse(appt, status_code = 201)
+
+        assert response.status_code == 201
+        assert orjson.loads(response.body) == orjson.loads(appt.model_dump_json())
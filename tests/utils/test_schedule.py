@@ -0,0 +1,53 @@
+import pytest
+import datetime
+from app.utils.schedule import WeeklySchedule, get_weekly_schedule, get_schedule_cache
+
+SERVICE = {
+    "is_open_mo": 1, "open_time_mo": "09:00:00", "close_time_mo": "17:00:00",
+    "is_open_tu": 1, "open_time_tu": "00:00:00", "close_time_tu": "23:59:59",
+    "is_open_we": 1, "open_time_we": "00:00:00", "close_time_we": "23:59:59",
+    "is_open_th": 1, "open_time_th": "00:00:00", "close_time_th": "12:00:00",
+    "is_open_fr": 0, "open_time_fr": "00:00:00", "close_time_fr": "23:59:59",
+    "is_open_sa": 1, "open_time_sa": "00:00:00", "close_time_sa": "23:59:59",
+    "is_open_su": 1, "open_time_su": "00:00:00", "close_time_su": "23:59:59",
+}
+
+class TestWeeklySchedule:
+
+    @pytest.mark.parametrize(
+        "appt_starts_at, appt_ends_at, is_within_hours",
+        [
+            ("2024-11-25 09:00:00", "2024-11-25 17:00:00", True), # monday, exactly the opening hours
+            ("2024-11-25 08:59:59", "2024-11-25 10:00:00", False), # starts before service opens
+            ("2024-11-25 16:30:00", "2024-11-25 17:30:00", False), # ends after service closes
+            ("2024-11-25 16:00:00", "2024-11-28 11:00:00", True), # monday to thursday, tuesday and wednesday open the whole day
+            ("2024-11-25 16:00:00", "2024-11-29 11:00:00", False), # ends on friday, which is closed
+            ("2024-11-26 10:00:00", "2024-11-29 10:00:00", False), # thursday inbetween is not open the whole day
+            ("2024-11-30 10:00:00", "2024-12-03 10:00:00", False), # saturday to tuesday, monday inbetween is not open the whole day
+            ("2024-11-30 10:00:00", "2024-12-02 10:00:00", True), # saturday to monday, sunday inbetween is open the whole day
+            ("2024-11-26 10:00:00", "2025-01-01 10:00:00", False), # spans more than a week
+        ])
+    def test_is_within_hours(self, appt_starts_at, appt_ends_at, is_within_hours):
+
+        schedule = WeeklySchedule.from_service(SERVICE)
+
+        assert schedule.is_within_hours(datetime.datetime.fromisoformat(appt_starts_at), datetime.datetime.fromisoformat(appt_ends_at)) == is_within_hours
+
+    def test_is_within_hours_open_every_day(self):
+
+        service = {key: (1 if key.startswith("is_open") else ("00:00:00" if key.startswith("open_time") else "23:59:59")) for key in SERVICE}
+        schedule = WeeklySchedule.from_service(service)
+
+        assert schedule.is_within_hours(datetime.datetime(2024, 11, 25, 10), datetime.datetime(2025, 11, 25, 10))
+        assert schedule.get_open_interval(5) == (0, 86399)
+
+    def test_get_weekly_schedule_reused(self):
+
+        get_schedule_cache().clear()
+        service = dict(SERVICE, service_id = 1, updated_at = "2024-11-25 00:00:00")
+
+        schedule = get_weekly_schedule(service)
+        assert get_weekly_schedule(dict(service)) is schedule
+        assert get_weekly_schedule(dict(service, updated_at = "2024-11-26 00:00:00")) is not schedule # updated service gets a new schedule
+        assert schedule.get_open_interval(1) == (9 * 3600, 17 * 3600)
+        assert schedule.get_open_interval(5) is None
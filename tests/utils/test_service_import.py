@@ -0,0 +1,70 @@
+import pytest
+import json
+from app.utils.service_import import import_services, iter_lines
+
+CSV_LINES = [
+    "service_name,street_address,city,state,zip_code,phone_number,is_open_mo,open_time_mo,close_time_mo,appt_types",
+    'Kunal Biz,47 Brick Lnz,NYC,NY,11368,17187777777,1,09:00:00,17:00:00,"[{""appt_type_name"": ""30 Min"", ""appt_duration_minutes"": 30}, {""appt_type_name"": ""60 Min"", ""appt_duration_minutes"": 60}]"',
+    "Kunal Biz 2,48 Brick Lnz,NYC,NY,11368,17187777778,,,,",
+    "Kunal Biz 3,49 Brick Lnz,NYC,NY,11368,17187777777,,,,", # duplicate of line 2
+    "Kunal Biz 4,50 Brick Lnz,NYC,NY,11368,17187777779,2,,,", # is_open_mo must be 0 or 1
+    "Kunal Biz 5,51 Brick Lnz,NYC,NY,11368",
+    "",
+    "Kunal Biz 6,52 Brick Lnz,NYC,NY,11368,17187777780,,,,",
+    "Kunal Biz 7,53 Brick Lnz,NYC,NY,11368,17187777781,1,9am,5pm,", # times must be HH:MM:SS
+]
+
+async def iter_list(items):
+    for item in items:
+        yield item
+
+class TestServiceImport:
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("batch_size", [1, 100])
+    async def test_import_services_csv(self, test_db, batch_size):
+
+        inserted_user = await test_db.insert_user("bruh@email.com", "password123")
+        host_id = int(inserted_user.get("user_id"))
+
+        result = await import_services(test_db, host_id, iter_list(CSV_LINES), "csv", batch_size)
+
+        assert result.imported_count == 3
+        assert result.appt_types_imported_count == 2
+        assert [error.line_number for error in result.errors] == [4, 5, 6, 9]
+        assert "also on line 2" in result.errors[0].detail
+        assert "is_open_mo" in result.errors[1].detail
+        assert "open_time_mo" in result.errors[3].detail
+
+        services = await test_db.get_services_by_host_id(host_id)
+        service = next(service for service in services if service["phone_number"] == "17187777777")
+        assert service["is_open_mo"] == 1
+        assert str(service["open_time_mo"]) == "09:00:00"
+        assert (await test_db.get_appt_type_by_service_id_and_appt_type_name(service["service_id"], "60 Min"))["appt_duration_minutes"] == 60
+
+    @pytest.mark.asyncio
+    async def test_import_services_ndjson_existing_phone_number(self, test_db):
+
+        inserted_user = await test_db.insert_user("bruh@email.com", "password123")
+        host_id = int(inserted_user.get("user_id"))
+        service = {"service_name": "Kunal Biz", "street_address": "47 Brick Lnz", "city": "NYC", "state": "NY", "zip_code": "11368", "phone_number": "17187777777"}
+        lines = [
+            json.dumps(service),
+            json.dumps(dict(service, phone_number = "17187777778", appt_types = [{"appt_type_name": "30 Min", "appt_duration_minutes": 0}])),
+            "{not json",
+        ]
+
+        result = await import_services(test_db, host_id, iter_list(lines), "ndjson")
+        result2 = await import_services(test_db, host_id, iter_list(lines[:1]), "ndjson")
+
+        assert result.imported_count == 1
+        assert [error.line_number for error in result.errors] == [2, 3]
+        assert result2.imported_count == 0
+        assert result2.errors[0].detail == "Duplicate phone_number 17187777777 (already exists)"
+
+    @pytest.mark.asyncio
+    async def test_iter_lines(self):
+
+        chunks = ["a,b\r\n".encode("utf-8-sig"), "ü".encode("utf-8")[:1], "ü".encode("utf-8")[1:] + b"\n", b"last"]
+
+        assert [line async for line in iter_lines(iter_list(chunks))] == ["a,b", "ü", "last"]